@@ -0,0 +1,224 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+# Almacen de inventario en memoria con indices secundarios
+# Se carga una sola vez desde inventario.json; los articulos se guardan en objetos con
+# __slots__ y se mantienen indices por categoria, por precio y por existencias en cada
+# sucursal (InvN), para contestar consultas sin recorrer todo el inventario
+
+NUM_SUCURSALES = 5
+COLUMNAS = tuple(f"Inv{n}" for n in range(1, NUM_SUCURSALES + 1))
+CAMPO_ITEM = 'item'
+CAMPOS_ITEM = ('articulo', 'categoria', 'precio', 'cantidad')
+
+
+def columna(sucursal):
+    return f"Inv{sucursal}"
+
+
+def sucursal_de_columna(nombre):
+    return int(nombre[3:])
+
+
+class Articulo:
+    __slots__ = ('id', 'articulo', 'categoria', 'precio', 'cantidad', 'inv', 'versiones')
+
+    def __init__(self, item_id, registro):
+        self.id = item_id
+        self.articulo = registro.get('articulo', '')
+        self.categoria = registro.get('categoria', '')
+        self.precio = registro.get('precio', 0)
+        self.cantidad = registro.get('cantidad', 0)
+        self.inv = [registro.get(c, 0) for c in COLUMNAS]
+        self.versiones = dict(registro.get('versiones', {}))
+
+    def a_dict(self):
+        # Mismo formato que los registros de inventario.json
+        registro = {
+            'articulo': self.articulo,
+            'categoria': self.categoria,
+            'precio': self.precio,
+            'cantidad': self.cantidad,
+        }
+        for i, c in enumerate(COLUMNAS):
+            registro[c] = self.inv[i]
+        if self.versiones:
+            registro['versiones'] = dict(self.versiones)
+        return registro
+
+
+class AlmacenInventario:
+    def __init__(self, inventario=None):
+        self.articulos = {}
+        self.por_categoria = {}  # categoria -> set de ids
+        self.precios = []        # lista ordenada de (precio, id)
+        self.con_existencias = [set() for _ in range(NUM_SUCURSALES)]  # ids con InvN > 0
+        self.lock = threading.RLock()
+        for item_id, registro in (inventario or {}).items():
+            if not item_id.startswith('_'):  # Llaves de control del archivo (ej. _lsn)
+                self.agregar_articulo(item_id, registro)
+
+    # --- Interfaz de lectura parecida a un diccionario (la usan fragmentos y sincronizacion)
+
+    def __len__(self):
+        return len(self.articulos)
+
+    def __contains__(self, item_id):
+        return item_id in self.articulos
+
+    def __iter__(self):
+        return iter(list(self.articulos))
+
+    def get(self, item_id, default=None):
+        articulo = self.articulos.get(item_id)
+        return articulo.a_dict() if articulo is not None else default
+
+    def items(self):
+        with self.lock:
+            return [(item_id, a.a_dict()) for item_id, a in self.articulos.items()]
+
+    def a_dict(self):
+        return dict(self.items())
+
+    # --- Indices
+
+    def _indexar(self, a):
+        self.por_categoria.setdefault(a.categoria, set()).add(a.id)
+        insort(self.precios, (a.precio, a.id))
+        for i, existencia in enumerate(a.inv):
+            if existencia > 0:
+                self.con_existencias[i].add(a.id)
+
+    def _desindexar(self, a):
+        ids = self.por_categoria.get(a.categoria)
+        if ids is not None:
+            ids.discard(a.id)
+            if not ids:
+                del self.por_categoria[a.categoria]
+        i = bisect_left(self.precios, (a.precio, a.id))
+        if i < len(self.precios) and self.precios[i] == (a.precio, a.id):
+            del self.precios[i]
+        for ids in self.con_existencias:
+            ids.discard(a.id)
+
+    # --- Escritura
+
+    def agregar_articulo(self, item_id, registro):
+        with self.lock:
+            anterior = self.articulos.get(item_id)
+            if anterior is not None:
+                self._desindexar(anterior)
+            a = Articulo(item_id, registro)
+            self.articulos[item_id] = a
+            self._indexar(a)
+            return a
+
+    def _obtener_o_crear(self, item_id):
+        a = self.articulos.get(item_id)
+        if a is None:
+            a = self.agregar_articulo(item_id, {})
+        return a
+
+    def poner(self, item_id, campo, valor):
+        # campo es 'item' (valor = dict con datos del articulo) o una columna InvN
+        with self.lock:
+            a = self._obtener_o_crear(item_id)
+            if campo == CAMPO_ITEM:
+                if 'categoria' in valor and valor['categoria'] != a.categoria:
+                    ids = self.por_categoria.get(a.categoria)
+                    if ids is not None:
+                        ids.discard(item_id)
+                    a.categoria = valor['categoria']
+                    self.por_categoria.setdefault(a.categoria, set()).add(item_id)
+                if 'precio' in valor and valor['precio'] != a.precio:
+                    i = bisect_left(self.precios, (a.precio, item_id))
+                    if i < len(self.precios) and self.precios[i] == (a.precio, item_id):
+                        del self.precios[i]
+                    a.precio = valor['precio']
+                    insort(self.precios, (a.precio, item_id))
+                if 'articulo' in valor:
+                    a.articulo = valor['articulo']
+                if 'cantidad' in valor:
+                    a.cantidad = valor['cantidad']
+            else:
+                i = sucursal_de_columna(campo) - 1
+                a.inv[i] = valor
+                if valor > 0:
+                    self.con_existencias[i].add(item_id)
+                else:
+                    self.con_existencias[i].discard(item_id)
+
+    def valor(self, item_id, campo):
+        with self.lock:
+            a = self.articulos.get(item_id)
+            if a is None:
+                return None
+            if campo == CAMPO_ITEM:
+                return {c: getattr(a, c) for c in CAMPOS_ITEM}
+            return a.inv[sucursal_de_columna(campo) - 1]
+
+    def existencia(self, item_id, sucursal):
+        a = self.articulos.get(item_id)
+        return a.inv[sucursal - 1] if a is not None else 0
+
+    def poner_version(self, item_id, campo, version):
+        with self.lock:
+            self._obtener_o_crear(item_id).versiones[campo] = version
+
+    def versiones_guardadas(self, item_id):
+        a = self.articulos.get(item_id)
+        return dict(a.versiones) if a is not None else {}
+
+    # --- Consultas
+
+    def ocupacion(self):
+        # Unidades que tiene cada sucursal sumando todo el catalogo
+        with self.lock:
+            totales = [0] * NUM_SUCURSALES
+            for a in self.articulos.values():
+                for i, existencia in enumerate(a.inv):
+                    totales[i] += existencia
+            return totales
+
+    def sin_asignar(self, ids):
+        # Por articulo: cantidad que todavia no esta en ninguna columna InvN
+        with self.lock:
+            return [max(0, a.cantidad - sum(a.inv)) if a is not None else 0
+                    for a in (self.articulos.get(item_id) for item_id in ids)]
+
+    def buscar(self, categoria=None, precio_min=None, precio_max=None, sucursal=None):
+        # Se parte del indice mas selectivo y el resto de los filtros se revisan por articulo
+        with self.lock:
+            candidatos = []
+            if categoria is not None:
+                ids = self.por_categoria.get(categoria, set())
+                candidatos.append((len(ids), ids))
+            if sucursal is not None:
+                ids = self.con_existencias[sucursal - 1]
+                candidatos.append((len(ids), ids))
+            if precio_min is not None or precio_max is not None:
+                inicio = 0 if precio_min is None else bisect_left(self.precios, (precio_min, ''))
+                fin = len(self.precios) if precio_max is None else bisect_right(self.precios, (precio_max, '\uffff'))
+                candidatos.append((max(fin - inicio, 0), (inicio, fin)))
+            if not candidatos:
+                base = list(self.articulos)
+            else:
+                base = min(candidatos, key=lambda c: c[0])[1]
+                if isinstance(base, tuple):
+                    # El rango de precios solo se materializa si es el indice elegido
+                    base = [item_id for _, item_id in self.precios[base[0]:base[1]]]
+
+            resultado = []
+            for item_id in base:
+                a = self.articulos[item_id]
+                if categoria is not None and a.categoria != categoria:
+                    continue
+                if precio_min is not None and a.precio < precio_min:
+                    continue
+                if precio_max is not None and a.precio > precio_max:
+                    continue
+                if sucursal is not None and a.inv[sucursal - 1] <= 0:
+                    continue
+                resultado.append(a)
+            resultado.sort(key=lambda a: a.id)
+            return resultado
@@ -0,0 +1,197 @@
+import threading
+import time
+
+# Exclusion mutua por anillo (token ring), alternativa al acceso que concede el maestro
+# Un solo token da la vuelta por las sucursales vivas en orden de id (1 -> 2 -> ... -> 5 -> 1,
+# saltando las caidas). Solo quien lo tiene puede escribir: al recibirlo aplica de una vez
+# hasta LOTE_ANILLO ventas de su cola y lo pasa al siguiente. No hay maestro de por medio,
+# asi que tampoco se detiene durante una eleccion
+#
+# El token lleva los cambios que hicieron los titulares en la ultima vuelta (mismo formato
+# que la sincronizacion, mas 'de' con la sucursal que lo hizo). Cada nodo los aplica antes de
+# escribir, asi siempre parte del valor mas nuevo; cuando un cambio regresa a quien lo hizo
+# ya lo vieron todos y se quita del token. Hasta entonces quien lo hizo lo guarda y lo vuelve
+# a poner en el token, asi no se pierde si se pierde el token
+#
+# Perdida: si el token no pasa por el nodo de id mas bajo en ESPERA_TOKEN segundos (se cayo
+# su titular o se perdio el mensaje), ese nodo genera uno nuevo con generacion + 1. Los tokens
+# de una generacion vieja se descartan donde lleguen. Durante un cambio de membresia dos
+# nodos pueden creerse el de id mas bajo; el par (generacion, quien lo genero) desempata y el
+# token perdedor muere en el primer nodo que ya vio al ganador
+
+LOTE_ANILLO = 64       # Ventas que aplica un titular por vuelta
+PAUSA_VACIA = 0.005    # Segundos que se retiene el token si nadie tenia nada, para no girar en vacio
+ESPERA_TOKEN = 2.0     # Segundos sin ver el token antes de regenerarlo
+ESPERA_VENTA = 10.0    # Segundos que espera una venta encolada antes de rendirse
+
+
+class VentaEncolada:
+    __slots__ = ('item', 'delta', 'encolada', 'listo', 'resultado')
+
+    def __init__(self, item_id, delta):
+        self.item = item_id
+        self.delta = delta
+        self.encolada = time.monotonic()
+        self.listo = threading.Event()
+        self.resultado = None
+
+
+class AnilloToken:
+    def __init__(self, node_id, anillo, enviar, aplicar_ventas, aplicar_cambios, lote=LOTE_ANILLO):
+        self.node_id = node_id
+        self.anillo = anillo                  # funcion que regresa los ids vivos (incluido este nodo)
+        self.enviar = enviar                  # funcion (node_id, mensaje)
+        self.aplicar_ventas = aplicar_ventas  # funcion ([(item, delta)]) -> (resultados, cambios)
+        self.aplicar_cambios = aplicar_cambios  # funcion (cambios) con los de otros titulares
+        self.lote = lote
+        self.pendientes = []
+        self.propios = []                     # Cambios propios que aun no dan la vuelta completa
+        self.token = None                     # El token, mientras este nodo lo tiene
+        self.mayor = (0, 0)                   # (generacion, quien la genero) mas alta vista
+        self.visto = time.monotonic()
+        self.cond = threading.Condition()
+        # Metricas
+        self.vueltas = 0
+        self.pases = 0
+        self.regenerados = 0
+        self.descartados = 0
+        self.ventas = 0
+        self.retenciones = 0
+        self.esperas = []
+
+    def siguiente(self):
+        vivos = sorted(set(self.anillo()) | {self.node_id})
+        return vivos[(vivos.index(self.node_id) + 1) % len(vivos)]
+
+    def es_regenerador(self):
+        return min(set(self.anillo()) | {self.node_id}) == self.node_id
+
+    # --- Ventas
+
+    def ajustar(self, item_id, delta, timeout=ESPERA_VENTA):
+        # Encola la venta y espera a que este nodo tenga el token. Regresa el resultado de
+        # aplicar_ventas o None si no paso el token a tiempo
+        venta = VentaEncolada(item_id, delta)
+        with self.cond:
+            self.pendientes.append(venta)
+            self.cond.notify()
+        if not venta.listo.wait(timeout):
+            with self.cond:
+                if venta in self.pendientes:
+                    self.pendientes.remove(venta)
+                    return None
+            # Ya esta en el lote del titular: se le da otro plazo, no se espera para siempre
+            venta.listo.wait(timeout)
+        return venta.resultado
+
+    # --- Token
+
+    def recibir(self, mensaje):
+        llave = (mensaje.get('generacion', 0), mensaje.get('generador', 0))
+        with self.cond:
+            if llave < self.mayor or self.token is not None:
+                # De una generacion vieja, o un duplicado mientras ya tenemos uno
+                self.descartados += 1
+                return
+            self.mayor = llave
+            self.visto = time.monotonic()
+            self.token = mensaje
+            self.cond.notify()
+
+    def _regenerar(self):
+        # Llamar con self.cond tomado
+        generacion = self.mayor[0] + 1
+        self.mayor = (generacion, self.node_id)
+        self.token = {'action': 'ring_token', 'generacion': generacion, 'generador': self.node_id, 'cambios': []}
+        self.visto = time.monotonic()
+        self.regenerados += 1
+        print(f"Token del anillo regenerado (generacion {generacion})")
+
+    def correr(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.token is not None, ESPERA_TOKEN / 4)
+                if self.token is None:
+                    if self.es_regenerador() and time.monotonic() - self.visto > ESPERA_TOKEN:
+                        self._regenerar()
+                    else:
+                        continue
+                token = self.token
+                if not token['cambios'] and not self.pendientes:
+                    # Nadie escribio en la ultima vuelta: se retiene un momento por si llega algo
+                    self.cond.wait_for(lambda: self.pendientes, PAUSA_VACIA)
+                lote = self.pendientes[:self.lote]
+                del self.pendientes[:self.lote]
+            try:
+                self._retener(token, lote)
+            except Exception as e:
+                print(f"Error con el token del anillo: {e}")
+            finally:
+                self._completar(lote)
+            with self.cond:
+                self.token = None
+            self._pasar(token)
+
+    def _completar(self, lote):
+        # Las ventas del lote que no recibieron resultado (fallo aplicar_ventas) se liberan
+        # con None para que quien espera no se quede colgado
+        for venta in lote:
+            if not venta.listo.is_set():
+                venta.resultado = None
+                venta.listo.set()
+
+    def _retener(self, token, lote):
+        vivos = set(self.anillo()) | {self.node_id}
+        # Lo que hizo este nodo ya dio la vuelta completa; lo de nodos caidos ya no se espera
+        ajenos = [c for c in token['cambios'] if c.get('de') != self.node_id and c.get('de') in vivos]
+        vistos = {(c['item'], c['campo'], c['version']) for c in token['cambios'] if c.get('de') == self.node_id}
+        self.propios = [c for c in self.propios if (c['item'], c['campo'], c['version']) not in vistos]
+        if ajenos:
+            self.aplicar_cambios(ajenos)
+        cambios = []
+        if lote:
+            ahora = time.monotonic()
+            resultados, cambios = self.aplicar_ventas([(v.item, v.delta) for v in lote])
+            for venta, resultado in zip(lote, resultados):
+                venta.resultado = resultado
+                venta.listo.set()
+            self.retenciones += 1
+            self.ventas += len(lote)
+            self.esperas.extend(ahora - v.encolada for v in lote)
+            del self.esperas[:-10000]
+        self.propios.extend(dict(c, de=self.node_id) for c in cambios)
+        token['cambios'] = ajenos + self.propios
+        if self.es_regenerador():
+            self.vueltas += 1
+
+    def _pasar(self, token):
+        destino = self.siguiente()
+        self.pases += 1
+        if destino == self.node_id:
+            # Unico nodo vivo: el token se queda aqui
+            self.recibir(token)
+            return
+        mensaje = {'action': 'ring_token', 'generacion': token['generacion'], 'generador': token['generador'],
+                   'cambios': token['cambios']}
+        try:
+            self.enviar(destino, mensaje)
+        except OSError as e:
+            print(f"Error al pasar el token a la sucursal {destino}: {e}")
+
+    def metricas(self):
+        with self.cond:
+            esperas = sorted(self.esperas)
+            pendientes = len(self.pendientes)
+        percentil = lambda p: esperas[min(len(esperas) - 1, int(p / 100 * len(esperas)))] * 1000 if esperas else 0.0
+        return {
+            'generacion': self.mayor[0],
+            'vueltas': self.vueltas,
+            'pases': self.pases,
+            'regenerados': self.regenerados,
+            'descartados': self.descartados,
+            'ventas': self.ventas,
+            'ventas_por_retencion': self.ventas / self.retenciones if self.retenciones else 0.0,
+            'pendientes': pendientes,
+            'espera_p50_ms': percentil(50),
+            'espera_p99_ms': percentil(99),
+        }
@@ -0,0 +1,542 @@
+import heapq
+import itertools
+import json
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+import codec
+from almacen import AlmacenInventario, columna
+from anillo import AnilloToken
+from bitacora import BitacoraEscritura, aplicar_entradas
+import distribucion
+from coalescedor import Coalescedor, resolver_compras
+from enviador import Enviador
+from gestor_tokens import GestorTokens, Cerca
+from optimista import OK, VENCIDO
+from planificador import Planificador, CLASE_VENTA, CLASE_REABASTO
+from sincronizacion import VersionesInventario
+from registro_mensajes import RegistroMensajes
+from ricart import RicartAgrawala
+
+# Mediciones de rendimiento de los componentes del nodo
+# Uso: python benchmarks.py [nombre]   (sin nombre corre todas)
+
+
+def medir(funcion, repeticiones):
+    # Regresa microsegundos por llamada
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+
+def cargar_inventario(file_path="inventario.json"):
+    with open(file_path, "r") as file:
+        return json.load(file)
+
+
+def bench_codec(repeticiones=20000):
+    inventario = cargar_inventario()
+    mensajes = {
+        'token': {'action': 'token', 'token': f'Token-{time.time()}'},
+        'request_access': {'action': 'request_access', 'node_id': 3},
+        'heartbeat': {'action': 'heartbeat', 'node_id': 2, 'master': False},
+        'send_inventory': {'action': 'send_inventory', 'inventory': inventario},
+    }
+    # 'acordado' es lo que manda un nodo que negocio el binario (ACCIONES_JSON siguen en JSON)
+    acordado = codec.Codec(1)
+    acordado.acordar('peer', list(codec.VERSIONES_SOPORTADAS))
+    print(f"{'mensaje':<16}{'formato':<9}{'bytes':>8}{'codif us':>12}{'decodif us':>12}")
+    for nombre, mensaje in mensajes.items():
+        n = repeticiones if nombre != 'send_inventory' else repeticiones // 50
+        datos_json = codec.codificar_json(mensaje)
+        datos_bin = codec.codificar_binario(mensaje, 1, 1)
+        datos_acordado = acordado.codificar(mensaje, 'peer')
+        assert codec.decodificar(datos_bin)['action'] == mensaje['action']
+        filas = (
+            ('json', datos_json, lambda: codec.codificar_json(mensaje), lambda: json.loads(datos_json.decode('utf-8'))),
+            ('bin', datos_bin, lambda: codec.codificar_binario(mensaje, 1, 1), lambda: codec.decodificar_binario(datos_bin)),
+            ('acordado', datos_acordado, lambda: acordado.codificar(mensaje, 'peer'),
+             lambda: codec.decodificar(datos_acordado)),
+        )
+        for formato, datos, codificar, decodificar in filas:
+            print(f"{nombre:<16}{formato:<9}{len(datos):>8}{medir(codificar, n):>12.2f}{medir(decodificar, n):>12.2f}")
+
+
+def bench_registro(productores=8, por_productor=5000):
+    carpeta = tempfile.mkdtemp()
+    linea = "2024-01-01 12:00:00 - Mensaje RECIBIDO de ('192.168.253.130', 5000): {'action': 'buy_item'}"
+
+    # Forma anterior: lista compartida con pop(0) y abrir el archivo por cada linea (sin el sleep de 1 s)
+    pendientes = [linea] * (productores * por_productor // 4)
+    ruta = os.path.join(carpeta, "anterior.txt")
+    inicio = time.perf_counter()
+    while pendientes:
+        mensaje = pendientes.pop(0)
+        with open(ruta, "a") as log_file:
+            log_file.write(mensaje + "\n")
+    anterior = (productores * por_productor // 4) / (time.perf_counter() - inicio)
+
+    registro = RegistroMensajes(os.path.join(carpeta, "logMensajes.txt"), max_bytes=8 * 1024 * 1024).iniciar()
+
+    def producir():
+        for _ in range(por_productor):
+            registro.registrar(linea)
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=producir) for _ in range(productores)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    registro.detener()
+    nuevo = registro.escritos / (time.perf_counter() - inicio)
+
+    m = registro.metricas()
+    print(f"anterior (pop(0) + open por linea): {anterior:>12.0f} lineas/s")
+    print(f"por lotes ({productores} productores):      {nuevo:>12.0f} lineas/s")
+    print(f"lotes={m['lotes']} lineas/lote={m['escritos'] / max(m['lotes'], 1):.1f} "
+          f"descartados={m['descartados']} rotaciones={m['rotaciones']}")
+    shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_tokens(clientes=8, duracion=2.0, seccion=0.001):
+    # Cada cliente pide el acceso, pasa `seccion` segundos en la seccion critica y lo libera,
+    # sin red de por medio: mide lo que aguanta el gestor. El token_handler anterior daba
+    # uno por segundo. Se compara todos vendiendo el mismo articulo contra uno distinto cada uno
+    articulos = sorted(cargar_inventario())
+    escenarios = (
+        ('mismo articulo', lambda n: [articulos[0]]),
+        ('articulos distintos', lambda n: [articulos[n]]),
+        ('sin articulos (global)', lambda n: None),
+    )
+    for nombre, items_de in escenarios:
+        concedidos = {}
+        eventos = {n: threading.Event() for n in range(1, clientes + 1)}
+
+        def conceder(node_id, token, lease, solicitud):
+            concedidos[node_id] = token
+            eventos[node_id].set()
+
+        gestor = GestorTokens(conceder)
+        fin = time.monotonic() + duracion
+
+        def cliente(node_id):
+            n = 0
+            while time.monotonic() < fin:
+                n += 1
+                eventos[node_id].clear()
+                gestor.solicitar(node_id, items_de(node_id), n)
+                eventos[node_id].wait()
+                time.sleep(seccion)
+                gestor.liberar(node_id, concedidos[node_id])
+
+        hilos = [threading.Thread(target=cliente, args=(n,)) for n in eventos]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        m = gestor.metricas()
+        print(f"{nombre:<24}{clientes} clientes: {m['concedidos'] / duracion:>8.0f} concesiones/s "
+              f"simultaneos={m['max_simultaneos']} espera p50={m['espera_p50_ms']:.2f} ms p99={m['espera_p99_ms']:.2f} ms")
+
+
+def bench_planificador(duracion=2.0, reabastos=4, vendedores=4):
+    # La sucursal 1 reabastece en varios hilos (8 articulos por acceso, 5 ms dentro) mientras
+    # las sucursales 2..N venden un articulo de esos (1 ms dentro). Espera maxima 0 es la cola
+    # FIFO de antes (todo urgente, por antiguedad); despues solo turnos por sucursal (todo
+    # como venta) y al final las ventas con prioridad
+    articulos = sorted(cargar_inventario())[:8]
+    escenarios = (
+        ('FIFO', CLASE_VENTA, lambda: Planificador(espera_maxima=0)),
+        ('sin clases', CLASE_VENTA, Planificador),
+        ('ventas primero', CLASE_REABASTO, Planificador),
+    )
+    for nombre, clase_reabasto, planificador in escenarios:
+        eventos = {}
+        concedidos = {}
+
+        def conceder(node_id, token, lease, solicitud):
+            concedidos[solicitud] = token
+            eventos[solicitud].set()
+
+        gestor = GestorTokens(conceder, planificador=planificador())
+        fin = time.monotonic() + duracion
+        siguiente = [0]
+        lock = threading.Lock()
+
+        def cliente(node_id, items, clase, seccion):
+            while time.monotonic() < fin:
+                with lock:
+                    siguiente[0] += 1
+                    solicitud = siguiente[0]
+                    eventos[solicitud] = threading.Event()
+                gestor.solicitar(node_id, items, solicitud, clase)
+                eventos[solicitud].wait()
+                time.sleep(seccion)
+                gestor.liberar(node_id, concedidos[solicitud])
+
+        hilos = [threading.Thread(target=cliente, args=(1, articulos, clase_reabasto, 0.005)) for _ in range(reabastos)]
+        hilos += [threading.Thread(target=cliente, args=(n + 2, [articulos[n % len(articulos)]], CLASE_VENTA, 0.001))
+                  for n in range(vendedores)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        m = gestor.metricas()
+        print(f"{nombre}:")
+        for node_id, p in sorted(m['por_sucursal'].items()):
+            print(f"  sucursal {node_id}: {p['concedidos']:>6} concesiones espera p50={p['espera_p50_ms']:>7.2f} ms "
+                  f"p99={p['espera_p99_ms']:>7.2f} ms")
+
+
+def bench_lotes(compras=20000, ventana=0.002):
+    # Compras optimistas sobre pocos articulos que entran por el hilo del servidor, como en
+    # start_server. Una por una (ventana 0: el servidor aplica y espera el fsync de cada
+    # compra) contra agrupadas: el servidor solo las encola y se aplican por lotes
+    carpeta = tempfile.mkdtemp()
+    inventario = cargar_inventario()
+    for registro in inventario.values():
+        registro['Inv1'] = 10 ** 9
+    articulos = sorted(inventario)[:4]
+    for nombre, v in (('una por una', 0), (f'lotes de {ventana * 1000:.0f} ms', ventana)):
+        almacen = AlmacenInventario(json.loads(json.dumps(inventario)))
+        versiones = VersionesInventario(almacen, 1)
+        bitacora = BitacoraEscritura(almacen.a_dict, 0, ruta_bitacora=os.path.join(carpeta, f"{v}.wal"),
+                                     ruta_snapshot=os.path.join(carpeta, f"{v}.json"))
+        gestor = GestorTokens(lambda *args: None)
+        cerca = Cerca()
+        terminadas = threading.Semaphore(0)
+
+        def procesar(lote):
+            # Como el maestro sin seguidores: se decide el lote y se aplica con un solo fsync
+            entradas, _ = resolver_compras(lote, almacen, versiones, gestor, cerca)
+            aplicar_entradas(entradas, almacen, versiones, bitacora)
+            for _ in lote:
+                terminadas.release()
+
+        coalescedor = Coalescedor(procesar, v).iniciar()
+        inicio = time.perf_counter()
+        for i in range(compras):
+            coalescedor.agregar({'item': articulos[i % len(articulos)], 'sucursal': 1, 'delta': -1})
+        for _ in range(compras):
+            terminadas.acquire()
+        transcurrido = time.perf_counter() - inicio
+        m = coalescedor.metricas()
+        print(f"{nombre:<18}{compras / transcurrido:>10.0f} compras/s "
+              f"lotes={m['lotes']} por lote={m['por_lote']:.1f} fsyncs={bitacora.grupos}")
+    shutil.rmtree(carpeta)
+
+
+def bench_distribucion(tamanos=(10000, 50000, 200000), repeticiones=3):
+    # Reparto de todo el catalogo entre 5 sucursales. Vectorizado (numpy) contra la version en
+    # Python puro que se usa cuando numpy no esta instalado
+    generador = random.Random(1)
+    for skus in tamanos:
+        pendientes = [generador.randint(0, 200) for _ in range(skus)]
+        capacidades = [skus * 20, skus * 25, skus * 30, skus * 15, 0]  # Una sucursal caida
+        ocupado = [skus * 5] * 5
+        libre = [max(0, c - o) for c, o in zip(capacidades, ocupado)]
+        python = min(medir(lambda: distribucion._repartir_python(pendientes, libre), 1) for _ in range(repeticiones))
+        linea = f"{skus:>7} SKUs  python {python / 1000:>8.1f} ms"
+        if distribucion.np is not None:
+            vectorizado = min(medir(lambda: distribucion._repartir_numpy(pendientes, libre), 1) for _ in range(repeticiones))
+            linea += f"  numpy {vectorizado / 1000:>8.1f} ms"
+        else:
+            linea += "  (numpy no instalado)"
+        print(linea)
+
+
+def bench_envio(mensajes=20000, productores=4):
+    # Envio de mensajes chicos a otro nodo (aqui en 127.0.0.1): un socket nuevo por mensaje,
+    # como antes, contra el socket compartido del Enviador que junta mensajes por destino
+    receptor = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receptor.bind(("127.0.0.1", 0))
+    receptor.settimeout(0.5)
+    destino = receptor.getsockname()
+    datos = codec.codificar_binario({'action': 'buy_item', 'item': '101', 'sucursal': 2, 'delta': -1}, 2, 1)
+
+    def drenar():
+        try:
+            while True:
+                receptor.recvfrom(65535)
+        except socket.timeout:
+            pass
+
+    def medir_envios(enviar):
+        hilo = threading.Thread(target=drenar)
+        hilo.start()
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=lambda: [enviar() for _ in range(mensajes // productores)])
+                 for _ in range(productores)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        return inicio, hilo
+
+    def socket_nuevo():
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.sendto(datos, destino)
+
+    inicio, hilo = medir_envios(socket_nuevo)
+    anterior = mensajes / (time.perf_counter() - inicio)
+    hilo.join()
+
+    compartido = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    compartido.bind(("127.0.0.1", 0))
+    enviador = Enviador(compartido)
+    threading.Thread(target=enviador.correr, daemon=True).start()
+    inicio, hilo = medir_envios(lambda: enviador.enviar(datos, destino))
+    while enviador.mensajes < mensajes:
+        time.sleep(0.001)
+    nuevo = mensajes / (time.perf_counter() - inicio)
+    hilo.join()
+    m = enviador.metricas()
+    print(f"socket por mensaje: {anterior:>10.0f} mensajes/s")
+    print(f"socket compartido:  {nuevo:>10.0f} mensajes/s  ({m['mensajes_por_datagrama']:.1f} mensajes por datagrama)")
+    receptor.close()
+    compartido.close()
+
+
+def _percentiles(valores):
+    valores = sorted(valores)
+    if not valores:
+        return 0.0, 0.0
+    return (valores[len(valores) // 2] * 1000, valores[min(len(valores) - 1, int(len(valores) * 0.99))] * 1000)
+
+
+def _llegadas(tasa, nodos, duracion, generador):
+    # Ventas por nodo con llegadas de Poisson, tasa total repartida entre los nodos
+    llegadas = []
+    for _ in range(nodos):
+        t, lista = 0.0, []
+        while True:
+            t += generador.expovariate(tasa / nodos)
+            if t > duracion:
+                break
+            lista.append(t)
+        llegadas.append(lista)
+    return llegadas
+
+
+class RedLocal:
+    # Transporte en proceso para bench_exclusion: cada nodo tiene su hilo receptor (como el
+    # ciclo del servidor) y cada mensaje le llega `latencia` segundos despues de mandarlo
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.buzones = {}   # node_id -> [heap de (llegada, n, de, mensaje), condicion, receptor]
+        self.contador = 0
+        self.mensajes = 0
+        self.ocupado = {}   # node_id -> segundos dentro del receptor
+        self.abierta = True
+        self.lock = threading.Lock()
+
+    def conectar(self, node_id, recibir):
+        # recibir(mensaje, de)
+        self.buzones[node_id] = [[], threading.Condition(), recibir]
+        self.ocupado[node_id] = 0.0
+        threading.Thread(target=self._entregar, args=(node_id,), daemon=True).start()
+
+    def enviar(self, de, a, mensaje):
+        if not self.abierta:
+            return
+        with self.lock:
+            self.contador += 1
+            self.mensajes += 1
+            n = self.contador
+        cola, cond, _ = self.buzones[a]
+        with cond:
+            heapq.heappush(cola, (time.monotonic() + self.latencia, n, de, mensaje))
+            cond.notify()
+
+    def _entregar(self, node_id):
+        cola, cond, recibir = self.buzones[node_id]
+        while self.abierta:
+            with cond:
+                ahora = time.monotonic()
+                if not cola or cola[0][0] > ahora:
+                    cond.wait(cola[0][0] - ahora if cola else 0.1)
+                    continue
+                _, _, de, mensaje = heapq.heappop(cola)
+            inicio = time.perf_counter()
+            recibir(mensaje, de)
+            self.ocupado[node_id] += time.perf_counter() - inicio
+
+    def cerrar(self):
+        # Lo que siga mandando el anillo (o un token regenerado) ya no se entrega
+        self.abierta = False
+
+
+def _aplicador(inventario, node_id):
+    # aplicar_ventas y aplicar_cambios de un nodo, como aplicar_ventas_propias sin la bitacora
+    almacen = AlmacenInventario(json.loads(json.dumps(inventario)))
+    versiones = VersionesInventario(almacen, node_id)
+    campo = columna(node_id)
+
+    def aplicar_ventas(ventas):
+        resultados, cambios = [], []
+        for item_id, delta in ventas:
+            actual = almacen.valor(item_id, campo) or 0
+            entrada = {'item': item_id, 'campo': campo, 'valor': actual + delta,
+                       'version': versiones.actualizar(item_id, campo, actual + delta)}
+            cambios.append(entrada)
+            resultados.append({'resultado': OK, 'entrada': entrada})
+        return resultados, cambios
+
+    return aplicar_ventas, versiones.aplicar
+
+
+def _exclusion_maestro(red, inventario, nodos):
+    # El maestro (id 0) con el GestorTokens de verdad: request_access -> access_granted ->
+    # buy_item -> buy_result, y release_access sin respuesta. Regresa ajustar(node_id, item, delta)
+    aplicar_ventas, _ = _aplicador(inventario, 0)
+    gestor = GestorTokens(lambda node_id, token, lease, solicitud: red.enviar(
+        0, node_id, {'action': 'access_granted', 'token': token, 'solicitud': solicitud}))
+    esperas = {}  # solicitud -> [evento, respuesta]
+    siguiente = itertools.count(1)
+
+    def maestro(mensaje, de):
+        accion = mensaje['action']
+        if accion == 'request_access':
+            gestor.solicitar(de, [mensaje['item']], mensaje['solicitud'])
+        elif accion == 'buy_item':
+            if gestor.vigente(mensaje['token']):
+                resultado = aplicar_ventas([(mensaje['item'], mensaje['delta'])])[0][0]
+            else:
+                resultado = {'resultado': VENCIDO}
+            red.enviar(0, de, dict(resultado, action='buy_result', solicitud=mensaje['solicitud']))
+        elif accion == 'release_access':
+            gestor.liberar(de, mensaje['token'])
+
+    def sucursal(mensaje, de):
+        espera = esperas.get(mensaje['solicitud'])
+        if espera is not None:
+            espera[1] = mensaje
+            espera[0].set()
+
+    def pedir(node_id, mensaje):
+        espera = esperas[mensaje['solicitud']] = [threading.Event(), None]
+        red.enviar(node_id, 0, mensaje)
+        espera[0].wait()
+        del esperas[mensaje['solicitud']]
+        return espera[1]
+
+    def ajustar(node_id, item_id, delta):
+        solicitud = next(siguiente)
+        concedido = pedir(node_id, {'action': 'request_access', 'item': item_id, 'solicitud': solicitud})
+        solicitud = next(siguiente)
+        respuesta = pedir(node_id, {'action': 'buy_item', 'item': item_id, 'delta': delta,
+                                    'token': concedido['token'], 'solicitud': solicitud})
+        red.enviar(node_id, 0, {'action': 'release_access', 'token': concedido['token']})
+        return respuesta
+
+    red.conectar(0, maestro)
+    for node_id in range(1, nodos + 1):
+        red.conectar(node_id, sucursal)
+    return ajustar
+
+
+def _exclusion_anillo(red, inventario, nodos):
+    ids = list(range(1, nodos + 1))
+    # Con la red cerrada se reporta viva una sucursal 0 que no existe: nadie es el de id mas
+    # bajo y el anillo de esta medicion ya no regenera el token
+    vivos = lambda: ids if red.abierta else [0]
+    anillos = {}
+    for node_id in ids:
+        aplicar_ventas, aplicar_cambios = _aplicador(inventario, node_id)
+        anillos[node_id] = AnilloToken(node_id, vivos, lambda a, m, de=node_id: red.enviar(de, a, m),
+                                       aplicar_ventas, aplicar_cambios)
+        red.conectar(node_id, lambda m, de, a=anillos[node_id]: a.recibir(m))
+        threading.Thread(target=anillos[node_id].correr, daemon=True).start()
+    # El primer token lo pone la sucursal 1, sin esperar ESPERA_TOKEN
+    anillos[1].recibir({'action': 'ring_token', 'generacion': 1, 'generador': 1, 'cambios': []})
+    return lambda node_id, item_id, delta: anillos[node_id].ajustar(item_id, delta)
+
+
+def _exclusion_ricart(red, inventario, nodos):
+    ids = list(range(1, nodos + 1))
+    ricarts = {}
+    for node_id in ids:
+        aplicar_ventas, aplicar_cambios = _aplicador(inventario, node_id)
+        ricarts[node_id] = RicartAgrawala(node_id, lambda: ids, lambda a, m, de=node_id: red.enviar(de, a, m),
+                                          aplicar_ventas, aplicar_cambios)
+        red.conectar(node_id, ricarts[node_id].recibir)
+        threading.Thread(target=ricarts[node_id].correr, daemon=True).start()
+    return lambda node_id, item_id, delta: ricarts[node_id].ajustar(item_id, delta)
+
+
+def bench_exclusion(tasas=(200, 1000, 5000), nodos=5, latencia=0.0002, duracion=2.0, hilos_por_nodo=32):
+    # Exclusion con el maestro contra el token en anillo y Ricart-Agrawala a varias tasas de
+    # ventas, con las clases de verdad sobre RedLocal (sin sockets). La latencia se mide desde
+    # que llega la venta; 'maestro ocupado' es la fraccion del tiempo que el receptor del
+    # maestro pasa atendiendo accesos y compras
+    inventario = cargar_inventario()
+    for registro in inventario.values():
+        for n in range(1, nodos + 1):
+            registro[columna(n)] = 10 ** 9
+    articulos = sorted(inventario)[:8]
+    generador = random.Random(1)
+    print(f"{nodos} nodos, red {latencia * 1000:.2f} ms")
+    for tasa in tasas:
+        llegadas = _llegadas(tasa, nodos, duracion, generador)
+        for nombre, armar in (('maestro', _exclusion_maestro), ('anillo', _exclusion_anillo),
+                              ('ricart', _exclusion_ricart)):
+            red = RedLocal(latencia)
+            ajustar = armar(red, inventario, nodos)
+            latencias = []
+            inicio = time.monotonic()
+
+            def cliente(node_id, pendientes):
+                # Toma la siguiente llegada de su nodo, espera a que sea su hora y vende
+                while True:
+                    try:
+                        t = pendientes.popleft()
+                    except IndexError:
+                        return
+                    retraso = inicio + t - time.monotonic()
+                    if retraso > 0:
+                        time.sleep(retraso)
+                    ajustar(node_id, articulos[int(t * 1e6) % len(articulos)], -1)
+                    latencias.append(time.monotonic() - inicio - t)
+
+            clientes = []
+            for node_id, lista in enumerate(llegadas, 1):
+                pendientes = deque(lista)
+                clientes += [threading.Thread(target=cliente, args=(node_id, pendientes))
+                             for _ in range(hilos_por_nodo)]
+            for hilo in clientes:
+                hilo.start()
+            for hilo in clientes:
+                hilo.join()
+            transcurrido = time.monotonic() - inicio
+            red.cerrar()
+            p50, p99 = _percentiles(latencias)
+            print(f"{tasa:>6} ventas/s  {nombre:<8} p50={p50:>8.2f} ms p99={p99:>8.2f} ms "
+                  f"mensajes por venta={red.mensajes / max(1, len(latencias)):>6.2f} "
+                  f"maestro ocupado={red.ocupado.get(0, 0.0) / transcurrido:>5.0%}")
+
+
+BENCHMARKS = {
+    'codec': bench_codec,
+    'registro': bench_registro,
+    'tokens': bench_tokens,
+    'planificador': bench_planificador,
+    'lotes': bench_lotes,
+    'distribucion': bench_distribucion,
+    'envio': bench_envio,
+    'exclusion': bench_exclusion,
+}
+
+if __name__ == "__main__":
+    nombres = sys.argv[1:] or list(BENCHMARKS)
+    for nombre in nombres:
+        print(f"== {nombre} ==")
+        BENCHMARKS[nombre]()
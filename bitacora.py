@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+
+from almacen import CAMPO_ITEM, sucursal_de_columna
+
+# Bitacora de escritura adelantada (write-ahead log) para los cambios de inventario
+# Cada venta o alta se agrega como una linea JSON al final de inventario.wal. Un hilo
+# escritor junta todas las lineas pendientes y hace un solo fsync por grupo (group commit).
+# Cada cierto numero de registros o de segundos se compacta: se escribe un snapshot nuevo
+# (inventario.snap.json) con el numero de secuencia (_lsn) que ya incluye y se vacia la
+# bitacora. Al arrancar se carga el snapshot y se re-aplican las lineas posteriores; la
+# primera vez, sin snapshot, se parte del inventario inicial (inventario.json), que nunca
+# se reescribe
+
+ARCHIVO_BITACORA = "inventario.wal"
+ARCHIVO_SNAPSHOT = "inventario.snap.json"
+ARCHIVO_INICIAL = "inventario.json"
+REGISTROS_POR_SNAPSHOT = 5000
+INTERVALO_SNAPSHOT = 300   # Segundos
+
+
+def recuperar(ruta_snapshot=ARCHIVO_SNAPSHOT, ruta_bitacora=ARCHIVO_BITACORA, ruta_inicial=ARCHIVO_INICIAL):
+    # Regresa (inventario, ultimo_lsn) a partir del snapshot (o del inventario inicial) mas la bitacora
+    inventario = {}
+    for ruta in (ruta_snapshot, ruta_inicial):
+        try:
+            with open(ruta, "r") as file:
+                inventario = json.load(file)
+            break
+        except FileNotFoundError:
+            continue
+    lsn_snapshot = inventario.pop('_lsn', 0)
+    ultimo = lsn_snapshot
+
+    try:
+        with open(ruta_bitacora, "r") as file:
+            for linea in file:
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    break  # Ultima linea a medias por una caida durante la escritura
+                if registro['lsn'] <= lsn_snapshot:
+                    continue  # Ya esta incluido en el snapshot
+                aplicar_registro(inventario, registro)
+                ultimo = registro['lsn']
+    except FileNotFoundError:
+        pass
+    return inventario, ultimo
+
+
+def aplicar_registro(inventario, registro):
+    articulo = inventario.setdefault(registro['item'], {})
+    if registro.get('campo') == CAMPO_ITEM:
+        # Datos del articulo (nombre, categoria, precio, cantidad) que llegaron por la sincronizacion
+        columna = CAMPO_ITEM
+        articulo.update(registro['valor'])
+    else:
+        columna = f"Inv{registro['sucursal']}"
+        articulo[columna] = articulo.get(columna, 0) + registro['delta']
+    if registro.get('version') is not None:
+        articulo.setdefault('versiones', {})[columna] = registro['version']
+
+
+def aplicar_entradas(entradas, inventario, versiones, bitacora):
+    # Entradas ya decididas, en el formato de la sincronizacion ({'item', 'campo', 'valor',
+    # 'version'}): las del log comprometido, las que traen el token del anillo y Ricart-Agrawala
+    # y las de sync_delta. Las que ganan se aplican y se anotan (las columnas como un delta),
+    # asi sobreviven a un reinicio igual que un cambio local. Un solo fsync para todas
+    ultimo_lsn = None
+    with bitacora.lock:
+        for entrada in entradas:
+            item_id, campo = entrada['item'], entrada['campo']
+            actual = inventario.valor(item_id, campo) or 0
+            if not versiones.aplicar([entrada]):
+                continue
+            if campo == CAMPO_ITEM:
+                ultimo_lsn = bitacora.anotar_articulo(item_id, entrada['valor'], entrada['version'])
+            else:
+                ultimo_lsn = bitacora.anotar(item_id, sucursal_de_columna(campo), entrada['valor'] - actual, None,
+                                             entrada['version'])
+    if ultimo_lsn is not None:
+        bitacora.esperar(ultimo_lsn)
+
+
+class BitacoraEscritura:
+    def __init__(self, obtener_estado, ultimo_lsn=0, ruta_bitacora=ARCHIVO_BITACORA,
+                 ruta_snapshot=ARCHIVO_SNAPSHOT, registros_por_snapshot=REGISTROS_POR_SNAPSHOT,
+                 intervalo_snapshot=INTERVALO_SNAPSHOT):
+        self.obtener_estado = obtener_estado  # funcion que regresa el inventario completo como dict
+        self.ruta_bitacora = ruta_bitacora
+        self.ruta_snapshot = ruta_snapshot
+        self.registros_por_snapshot = registros_por_snapshot
+        self.intervalo_snapshot = intervalo_snapshot
+
+        # Quien modifica el inventario debe tener este lock mientras aplica el cambio y lo
+        # anota, asi el orden de los lsn es el mismo en que se aplicaron
+        self.lock = threading.RLock()
+        self.cond = threading.Condition(threading.Lock())
+        self.lsn = ultimo_lsn
+        self.lsn_durable = ultimo_lsn
+        self.pendientes = []
+        self.desde_snapshot = 0
+        self.ultimo_snapshot = time.time()
+        # Metricas
+        self.grupos = 0
+        self.registros_escritos = 0
+
+        self.archivo = open(self.ruta_bitacora, "a")
+        self.hilo = threading.Thread(target=self.escritor, daemon=True)
+        self.hilo.start()
+
+    def anotar(self, item_id, sucursal, delta, token=None, version=None):
+        # Llamar con self.lock tomado. Regresa el lsn para esperar a que sea durable
+        return self._agregar({'item': item_id, 'sucursal': sucursal, 'delta': delta, 'token': token,
+                              'version': version})
+
+    def anotar_articulo(self, item_id, datos, version=None):
+        # Como anotar, para los datos del articulo (campo 'item') en lugar de una columna InvN
+        return self._agregar({'item': item_id, 'campo': CAMPO_ITEM, 'valor': datos, 'version': version})
+
+    def _agregar(self, registro):
+        with self.cond:
+            self.lsn += 1
+            registro['lsn'] = self.lsn
+            registro['ts'] = time.time()
+            self.pendientes.append(json.dumps(registro))
+            self.cond.notify()
+            return self.lsn
+
+    def esperar(self, lsn, timeout=None):
+        # Bloquea hasta que el registro este en disco (despues del fsync de su grupo)
+        with self.cond:
+            return self.cond.wait_for(lambda: self.lsn_durable >= lsn, timeout)
+
+    def escritor(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pendientes, timeout=self.intervalo_snapshot)
+                grupo = self.pendientes
+                self.pendientes = []
+                ultimo = self.lsn
+            if grupo:
+                self.archivo.write("\n".join(grupo) + "\n")
+                self.archivo.flush()
+                os.fsync(self.archivo.fileno())
+                self.grupos += 1
+                self.registros_escritos += len(grupo)
+                self.desde_snapshot += len(grupo)
+                with self.cond:
+                    self.lsn_durable = ultimo
+                    self.cond.notify_all()
+            if self.desde_snapshot and (self.desde_snapshot >= self.registros_por_snapshot
+                                        or time.time() - self.ultimo_snapshot >= self.intervalo_snapshot):
+                self.compactar()
+
+    def compactar(self):
+        # Solo lo llama el hilo escritor, asi nadie escribe en la bitacora mientras se vacia
+        with self.lock:
+            estado = self.obtener_estado()
+            with self.cond:
+                lsn = self.lsn
+        estado['_lsn'] = lsn
+        temporal = self.ruta_snapshot + ".tmp"
+        with open(temporal, "w") as file:
+            json.dump(estado, file, indent=2, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporal, self.ruta_snapshot)
+
+        # Todo lo escrito en la bitacora ya tiene lsn <= _lsn; si hay una caida antes de
+        # vaciarla, la recuperacion se salta esas lineas
+        self.archivo.close()
+        self.archivo = open(self.ruta_bitacora, "w")
+        self.desde_snapshot = 0
+        self.ultimo_snapshot = time.time()
+
+    def metricas(self):
+        return {
+            'lsn': self.lsn,
+            'lsn_durable': self.lsn_durable,
+            'grupos': self.grupos,
+            'registros_escritos': self.registros_escritos,
+            'registros_por_grupo': self.registros_escritos / self.grupos if self.grupos else 0.0,
+        }
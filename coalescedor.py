@@ -0,0 +1,142 @@
+import threading
+
+from optimista import OK, CONFLICTO, SIN_EXISTENCIAS, VENCIDO
+
+# Agrupacion de peticiones en el nodo maestro
+# request_access, release_access, buy_item y update_inventory no se atienden uno por uno: se
+# juntan los que llegan dentro de una ventana corta (VENTANA_LOTE) y se procesan de una vez. En las compras,
+# todos los cambios a la misma columna InvN de un articulo se suman en una sola entrada (una
+# version nueva); el lote completo va al log en una propuesta y al final se contesta a todos.
+# Con ventana 0 cada peticion se procesa en cuanto llega, como antes (en el hilo que la
+# recibio, salvo que se pida en_hilo: el procesamiento puede esperar respuestas de la red)
+
+VENTANA_LOTE = 0.002   # Segundos que se espera a que lleguen mas peticiones
+MAX_LOTE = 256
+
+
+class Coalescedor:
+    def __init__(self, procesar, ventana=VENTANA_LOTE, max_lote=MAX_LOTE, en_hilo=False):
+        self.procesar = procesar  # funcion que recibe la lista de peticiones del lote
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self.en_hilo = en_hilo
+        self.pendientes = []
+        self.cond = threading.Condition()
+        self.hilo = None
+        # Metricas
+        self.lotes = 0
+        self.peticiones = 0
+        self.max_visto = 0
+
+    def iniciar(self):
+        if self.ventana > 0 or self.en_hilo:
+            self.hilo = threading.Thread(target=self.correr, daemon=True)
+            self.hilo.start()
+        return self
+
+    def agregar(self, peticion):
+        if self.hilo is None:
+            self._procesar([peticion])
+            return
+        with self.cond:
+            self.pendientes.append(peticion)
+            if len(self.pendientes) == 1 or len(self.pendientes) >= self.max_lote:
+                self.cond.notify()
+
+    def correr(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pendientes)
+                # Se deja abierta la ventana para que se junten mas, salvo que el lote ya este lleno
+                self.cond.wait_for(lambda: len(self.pendientes) >= self.max_lote, self.ventana)
+                lote = self.pendientes[:self.max_lote]
+                del self.pendientes[:self.max_lote]
+            self._procesar(lote)
+
+    def _procesar(self, lote):
+        self.lotes += 1
+        self.peticiones += len(lote)
+        self.max_visto = max(self.max_visto, len(lote))
+        try:
+            self.procesar(lote)
+        except Exception as e:
+            # Un lote con error no debe detener al hilo
+            print(f"Error al procesar un lote de {len(lote)} peticiones: {e}")
+
+    def metricas(self):
+        with self.cond:
+            pendientes = len(self.pendientes)
+        return {
+            'ventana_ms': self.ventana * 1000,
+            'lotes': self.lotes,
+            'peticiones': self.peticiones,
+            'por_lote': self.peticiones / self.lotes if self.lotes else 0.0,
+            'max_lote': self.max_visto,
+            'pendientes': pendientes,
+        }
+
+
+def resolver_compras(compras, inventario, versiones, gestor, cerca, hechas=None):
+    # compras: lista de mensajes buy_item. Decide cada compra contra el inventario actual sin
+    # aplicar nada: regresa (entradas, resultados), una entrada por columna que cambia y un
+    # resultado por compra en el mismo orden. Quien llama aplica las entradas (ver aplicar_entradas)
+    # hechas: id_compra -> resultado de las compras ya aplicadas. Un reintento de una de ellas
+    # (la sucursal se rindio antes de la respuesta) recibe el mismo resultado y no se aplica otra vez
+    hechas = hechas if hechas is not None else {}
+    resultados = [None] * len(compras)
+    entradas = []
+    por_columna = {}  # (item, sucursal) -> indices de las compras, en orden de llegada
+    en_lote = {}      # id_compra -> indice de la primera compra del lote con ese id
+    repetidas = []
+    for i, m in enumerate(compras):
+        item_id = m.get('item')
+        id_compra = m.get('id_compra')
+        if id_compra is not None:
+            if id_compra in hechas:
+                resultados[i] = dict(hechas[id_compra])
+                continue
+            if id_compra in en_lote:
+                repetidas.append((i, en_lote[id_compra]))
+                continue
+            en_lote[id_compra] = i
+        token = m.get('token')
+        if token is not None:
+            if not gestor.vigente(token) or not cerca.aceptar(token, item_id):
+                resultados[i] = {'resultado': VENCIDO}
+                continue
+        elif gestor.ocupado([item_id]):
+            # Alguien tiene (o espera) el candado de ese articulo por la via con token
+            resultados[i] = {'resultado': CONFLICTO}
+            continue
+        por_columna.setdefault((item_id, m.get('sucursal')), []).append(i)
+
+    for (item_id, sucursal), indices in por_columna.items():
+        columna = f"Inv{sucursal}"
+        # Todas las compras del lote vieron el mismo estado: se comparan contra la version
+        # que tenia la columna al empezar el lote
+        version = versiones.version(item_id, columna)
+        actual = inventario.valor(item_id, columna)
+        total = 0
+        aceptadas = []
+        for i in indices:
+            m = compras[i]
+            if m.get('token') is None and m.get('version') is not None and m['version'] != version:
+                resultados[i] = {'resultado': CONFLICTO}
+            elif actual is None or actual + total + m['delta'] < 0:
+                resultados[i] = {'resultado': SIN_EXISTENCIAS}
+            else:
+                total += m['delta']
+                aceptadas.append(i)
+        if not aceptadas:
+            continue
+        entrada = {'item': item_id, 'campo': columna, 'valor': actual + total, 'version': versiones.nueva_version()}
+        ids = [compras[i]['id_compra'] for i in aceptadas if compras[i].get('id_compra') is not None]
+        if ids:
+            # Viajan en el log: cada nodo (y el siguiente maestro) sabe que ya se aplicaron
+            entrada['compras'] = ids
+        entradas.append(entrada)
+        for i in aceptadas:
+            resultados[i] = {'resultado': OK, 'entrada': entrada}
+    for i, primera in repetidas:
+        resultados[i] = dict(resultados[primera])
+    return entradas, resultados
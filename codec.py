@@ -0,0 +1,352 @@
+import json
+import struct
+import threading
+
+# Formato binario compacto para los mensajes entre nodos
+# Cabecera fija:  magia(2) version(1) accion(1) banderas(1) nodo(1) secuencia(4)
+# Cuerpo:         resto de los campos del mensaje en codificacion estilo msgpack
+# El formato se negocia por nodo vecino; mientras no se negocie se sigue usando JSON,
+# que ademas se puede leer a mano para depurar
+
+MAGIA = b"SD"
+VERSION = 1
+VERSIONES_SOPORTADAS = (1,)
+CABECERA = struct.Struct(">2sBBBBI")
+
+FORMATO_JSON = 'json'
+FORMATO_BINARIO = 'bin'
+
+# Codigos de accion de la cabecera. 0 = accion fuera de la tabla, el nombre va en el cuerpo
+CODIGOS_ACCION = {
+    'request_access': 1,
+    'update_inventory': 2,
+    'get_inventory': 3,
+    'buy_item': 4,
+    'send_inventory': 5,
+    'token': 6,
+    'heartbeat': 7,
+    'codec_hola': 8,
+    'codec_acepta': 9,
+    'swim_ping': 10,
+    'swim_ack': 11,
+    'swim_ping_req': 12,
+    'swim_unirse': 13,
+    'swim_miembros': 14,
+    'swim_salir': 15,
+    'pedir_voto': 16,
+    'voto': 17,
+    'latido_maestro': 18,
+    'release_access': 19,
+    'buy_result': 20,
+    'update_result': 21,
+    'capacidad': 22,
+    'ack_confiable': 23,
+    'replicar': 24,
+    'replicado': 25,
+    'read_index': 26,
+    'read_index_result': 27,
+    'ring_token': 28,
+    'ra_request': 29,
+    'ra_reply': 30,
+    'ra_cambios': 31,
+    'instalar': 32,
+}
+ACCIONES_POR_CODIGO = {codigo: nombre for nombre, codigo in CODIGOS_ACCION.items()}
+
+# Inventarios completos y fragmentos: muchas filas con texto, donde json (en C) codifica y
+# decodifica varias veces mas rapido que el empaquetador en Python puro. Van en JSON aunque
+# el formato acordado sea binario; el receptor distingue el formato por la magia
+ACCIONES_JSON = {'send_inventory', 'inventory_chunk'}
+
+# Acciones de mucho trafico que el despachador enruta solo con la cabecera (ver despachador.py).
+# En binario la accion ya viene en la cabecera; en JSON se les antepone la cabecera compacta
+# b"@accion\n", asi el receptor sabe la accion sin decodificar el cuerpo
+ACCIONES_CABECERA = {'ack_confiable', 'swim_ping', 'swim_ack', 'swim_ping_req', 'swim_unirse',
+                     'swim_miembros', 'swim_salir'}
+CABECERA_JSON = b"@"
+
+_F64 = struct.Struct(">d")
+
+
+def _empaquetar(valor, salida):
+    # Codificacion compatible con el subconjunto comun de msgpack
+    if valor is None:
+        salida.append(0xc0)
+    elif valor is True:
+        salida.append(0xc3)
+    elif valor is False:
+        salida.append(0xc2)
+    elif isinstance(valor, int):
+        if 0 <= valor < 0x80:
+            salida.append(valor)
+        elif -32 <= valor < 0:
+            salida.append(valor & 0xff)
+        elif 0 <= valor <= 0xffff:
+            salida += struct.pack(">BH", 0xcd, valor)
+        elif 0 <= valor <= 0xffffffff:
+            salida += struct.pack(">BI", 0xce, valor)
+        elif 0 <= valor <= 0xffffffffffffffff:
+            salida += struct.pack(">BQ", 0xcf, valor)
+        elif -0x80000000 <= valor < 0:
+            salida += struct.pack(">Bi", 0xd2, valor)
+        else:
+            salida += struct.pack(">Bq", 0xd3, valor)
+    elif isinstance(valor, float):
+        salida.append(0xcb)
+        salida += _F64.pack(valor)
+    elif isinstance(valor, str):
+        datos = valor.encode('utf-8')
+        n = len(datos)
+        if n < 32:
+            salida.append(0xa0 | n)
+        elif n <= 0xff:
+            salida += struct.pack(">BB", 0xd9, n)
+        elif n <= 0xffff:
+            salida += struct.pack(">BH", 0xda, n)
+        else:
+            salida += struct.pack(">BI", 0xdb, n)
+        salida += datos
+    elif isinstance(valor, (bytes, bytearray)):
+        n = len(valor)
+        if n <= 0xff:
+            salida += struct.pack(">BB", 0xc4, n)
+        elif n <= 0xffff:
+            salida += struct.pack(">BH", 0xc5, n)
+        else:
+            salida += struct.pack(">BI", 0xc6, n)
+        salida += valor
+    elif isinstance(valor, (list, tuple)):
+        n = len(valor)
+        if n < 16:
+            salida.append(0x90 | n)
+        elif n <= 0xffff:
+            salida += struct.pack(">BH", 0xdc, n)
+        else:
+            salida += struct.pack(">BI", 0xdd, n)
+        for elemento in valor:
+            _empaquetar(elemento, salida)
+    elif isinstance(valor, dict):
+        n = len(valor)
+        if n < 16:
+            salida.append(0x80 | n)
+        elif n <= 0xffff:
+            salida += struct.pack(">BH", 0xde, n)
+        else:
+            salida += struct.pack(">BI", 0xdf, n)
+        for llave, elemento in valor.items():
+            _empaquetar(_llave(llave), salida)
+            _empaquetar(elemento, salida)
+    else:
+        raise TypeError(f"Tipo no soportado por el codec: {type(valor).__name__}")
+
+
+def _llave(llave):
+    # Las llaves salen como texto, igual que en JSON ({1: x} llega como {"1": x}), asi el
+    # receptor ve lo mismo sin importar el formato acordado
+    if isinstance(llave, str):
+        return llave
+    if llave is None or isinstance(llave, (bool, int, float)):
+        return json.dumps(llave)
+    raise TypeError(f"Llave no soportada por el codec: {type(llave).__name__}")
+
+
+def _desempaquetar(datos, i):
+    # Regresa (valor, siguiente_posicion)
+    b = datos[i]
+    i += 1
+    if b < 0x80:
+        return b, i
+    if b >= 0xe0:
+        return b - 0x100, i
+    if 0xa0 <= b <= 0xbf:
+        n = b & 0x1f
+        return datos[i:i + n].decode('utf-8'), i + n
+    if 0x90 <= b <= 0x9f:
+        return _lista(datos, i, b & 0x0f)
+    if 0x80 <= b <= 0x8f:
+        return _mapa(datos, i, b & 0x0f)
+    if b == 0xc0:
+        return None, i
+    if b == 0xc2:
+        return False, i
+    if b == 0xc3:
+        return True, i
+    if b == 0xcb:
+        return _F64.unpack_from(datos, i)[0], i + 8
+    if b == 0xcc:
+        return datos[i], i + 1
+    if b == 0xcd:
+        return struct.unpack_from(">H", datos, i)[0], i + 2
+    if b == 0xce:
+        return struct.unpack_from(">I", datos, i)[0], i + 4
+    if b == 0xcf:
+        return struct.unpack_from(">Q", datos, i)[0], i + 8
+    if b == 0xd2:
+        return struct.unpack_from(">i", datos, i)[0], i + 4
+    if b == 0xd3:
+        return struct.unpack_from(">q", datos, i)[0], i + 8
+    if b in (0xd9, 0xc4):
+        n = datos[i]
+        i += 1
+    elif b in (0xda, 0xc5):
+        n = struct.unpack_from(">H", datos, i)[0]
+        i += 2
+    elif b in (0xdb, 0xc6):
+        n = struct.unpack_from(">I", datos, i)[0]
+        i += 4
+    elif b == 0xdc:
+        return _lista(datos, i + 2, struct.unpack_from(">H", datos, i)[0])
+    elif b == 0xdd:
+        return _lista(datos, i + 4, struct.unpack_from(">I", datos, i)[0])
+    elif b == 0xde:
+        return _mapa(datos, i + 2, struct.unpack_from(">H", datos, i)[0])
+    elif b == 0xdf:
+        return _mapa(datos, i + 4, struct.unpack_from(">I", datos, i)[0])
+    else:
+        raise ValueError(f"Byte de tipo desconocido: {b:#x}")
+    if b in (0xc4, 0xc5, 0xc6):
+        return bytes(datos[i:i + n]), i + n
+    return datos[i:i + n].decode('utf-8'), i + n
+
+
+def _lista(datos, i, n):
+    resultado = []
+    for _ in range(n):
+        valor, i = _desempaquetar(datos, i)
+        resultado.append(valor)
+    return resultado, i
+
+
+def _mapa(datos, i, n):
+    resultado = {}
+    for _ in range(n):
+        llave, i = _desempaquetar(datos, i)
+        valor, i = _desempaquetar(datos, i)
+        resultado[llave] = valor
+    return resultado, i
+
+
+def empaquetar_valor(valor):
+    salida = bytearray()
+    _empaquetar(valor, salida)
+    return bytes(salida)
+
+
+def desempaquetar_valor(datos):
+    valor, _ = _desempaquetar(datos, 0)
+    return valor
+
+
+def es_binario(datos):
+    return datos[:2] == MAGIA
+
+
+def codificar_binario(mensaje, node_id=0, seq=0):
+    cuerpo = dict(mensaje)
+    nombre = cuerpo.pop('action', None)
+    codigo = CODIGOS_ACCION.get(nombre, 0)
+    if codigo == 0 and nombre is not None:
+        cuerpo['action'] = nombre
+    salida = bytearray(CABECERA.pack(MAGIA, VERSION, codigo, 0, node_id & 0xff, seq & 0xffffffff))
+    _empaquetar(cuerpo, salida)
+    return bytes(salida)
+
+
+def leer_cabecera_binaria(datos):
+    # Regresa (accion, nodo, secuencia) sin tocar el cuerpo
+    magia, version, codigo, _, nodo, seq = CABECERA.unpack_from(datos)
+    if version not in VERSIONES_SOPORTADAS:
+        raise ValueError(f"Version de codec no soportada: {version}")
+    return ACCIONES_POR_CODIGO.get(codigo), nodo, seq
+
+
+def decodificar_binario(datos):
+    # Regresa (mensaje, nodo, secuencia). El mensaje queda igual que si hubiera llegado en JSON;
+    # el nodo y la secuencia de la cabecera van aparte
+    nombre, nodo, seq = leer_cabecera_binaria(datos)
+    mensaje, _ = _desempaquetar(datos, CABECERA.size)
+    if nombre is not None:
+        mensaje['action'] = nombre
+    return mensaje, nodo, seq
+
+
+def codificar_json(mensaje, cabecera=False):
+    cuerpo = json.dumps(mensaje).encode('utf-8')
+    if cabecera:
+        return CABECERA_JSON + mensaje['action'].encode('utf-8') + b"\n" + cuerpo
+    return cuerpo
+
+
+def leer_accion(datos):
+    # Accion que nombra la cabecera (binaria o compacta), sin tocar el cuerpo; None si no trae
+    if es_binario(datos):
+        return leer_cabecera_binaria(datos)[0]
+    if datos[:1] == CABECERA_JSON:
+        fin = datos.find(b"\n")
+        if fin == -1:
+            raise ValueError("Cabecera compacta sin fin")
+        return datos[1:fin].decode('utf-8')
+    return None
+
+
+def decodificar_cuerpo(datos, nombre):
+    # Solo el cuerpo, para quien ya leyo la accion con leer_accion
+    if es_binario(datos):
+        mensaje, _ = _desempaquetar(datos, CABECERA.size)
+    else:
+        mensaje = json.loads(datos[datos.find(b"\n") + 1:].decode('utf-8'))
+    mensaje['action'] = nombre
+    return mensaje
+
+
+def decodificar(datos):
+    # Detecta el formato por la magia de la cabecera
+    if es_binario(datos):
+        return decodificar_binario(datos)[0]
+    if datos[:1] == CABECERA_JSON:
+        return decodificar_cuerpo(datos, leer_accion(datos))
+    return json.loads(datos.decode('utf-8'))
+
+
+class Codec:
+    # Guarda el formato acordado con cada nodo vecino (por IP) y el numero de secuencia de salida
+    def __init__(self, node_id, preferido=FORMATO_BINARIO):
+        self.node_id = node_id
+        self.preferido = preferido
+        self.formatos = {}
+        self.secuencias = {}
+        self.lock = threading.Lock()
+
+    def formato(self, peer):
+        with self.lock:
+            return self.formatos.get(peer, FORMATO_JSON)
+
+    def acordar(self, peer, versiones):
+        # Se elige la version mas alta que ambos soportan; si no hay, se queda en JSON.
+        # Con el servidor asyncio dos codec_hola del mismo nodo pueden llegar a la vez
+        comunes = set(versiones) & set(VERSIONES_SOPORTADAS)
+        with self.lock:
+            if self.preferido == FORMATO_BINARIO and comunes:
+                self.formatos[peer] = FORMATO_BINARIO
+                return max(comunes)
+            self.formatos[peer] = FORMATO_JSON
+            return None
+
+    def forzar_json(self, peer):
+        # Para depurar el trafico con un nodo en particular
+        with self.lock:
+            self.formatos[peer] = FORMATO_JSON
+
+    def mensaje_hola(self):
+        return {'action': 'codec_hola', 'node_id': self.node_id, 'versiones': list(VERSIONES_SOPORTADAS)}
+
+    def siguiente_seq(self, peer):
+        with self.lock:
+            seq = self.secuencias.get(peer, 0) + 1
+            self.secuencias[peer] = seq
+            return seq
+
+    def codificar(self, mensaje, peer):
+        if self.formato(peer) == FORMATO_BINARIO and mensaje.get('action') not in ACCIONES_JSON:
+            return codificar_binario(mensaje, self.node_id, self.siguiente_seq(peer))
+        return codificar_json(mensaje, mensaje.get('action') in ACCIONES_CABECERA)
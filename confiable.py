@@ -0,0 +1,249 @@
+import random
+import threading
+import time
+
+from detector_fallas import RuedaTemporizadores
+
+# Entrega confiable sobre UDP para los mensajes que no se pueden perder (tokens, compras...)
+# Cada mensaje lleva un numero de secuencia por nodo destino (rseq) y la epoca del emisor
+# (repoca, cambia cada vez que arranca el proceso). El receptor contesta con un ack_confiable
+# que trae el acumulado (todo lo que llego hasta ahi, sin huecos) y los selectivos (lo que
+# llego despues de un hueco). Lo que no se confirma se reenvia al vencer el RTO, que se
+# calcula con el RTT medido (Jacobson/Karels, sin muestras de reenvios por el algoritmo de
+# Karn) y se duplica en cada reintento del mismo mensaje. Un reenvio que ya se habia recibido
+# no se vuelve a procesar: el receptor guarda el acumulado y los selectivos dentro de
+# VENTANA_DEDUP. Cada mensaje trae tambien la secuencia mas baja que el emisor sigue
+# esperando confirmar (rbase), asi lo que el emisor ya abandono no deja un hueco eterno.
+# Un mensaje puede traer vida: si quien lo mando deja de esperar la respuesta antes de que se
+# agoten los reintentos, no se reenvia despues de ese plazo
+
+RESOLUCION = 0.01        # Segundos por tick de los temporizadores de reenvio
+RTO_INICIAL = 0.5
+RTO_MIN = 0.05
+RTO_MAX = 5.0
+ALFA = 0.125             # Peso de la muestra nueva en el RTT suavizado
+BETA = 0.25              # Peso de la muestra nueva en la variacion
+MAX_REINTENTOS = 8
+VENTANA_DEDUP = 1024     # Secuencias adelante del acumulado que se aceptan
+MAX_SELECTIVOS = 32
+RETRASO_ACK = 0.005      # Se junta en un solo ack lo que llegue en este tiempo
+
+
+class Pendiente:
+    __slots__ = ('seq', 'mensaje', 'enviado', 'intentos', 'limite')
+
+    def __init__(self, seq, mensaje, enviado, limite=None):
+        self.seq = seq
+        self.mensaje = mensaje
+        self.enviado = enviado
+        self.intentos = 0
+        self.limite = limite  # monotonic despues del cual ya no se reenvia (None = solo MAX_REINTENTOS)
+
+
+class Par:
+    # Estado con un nodo: lo que le mandamos (emisor) y lo que nos ha mandado (receptor)
+    __slots__ = ('siguiente', 'pendientes', 'srtt', 'rttvar', 'rto',
+                 'epoca_remota', 'acumulado', 'fuera_de_orden', 'ack_programado')
+
+    def __init__(self):
+        self.siguiente = 0
+        self.pendientes = {}
+        self.srtt = None
+        self.rttvar = None
+        self.rto = RTO_INICIAL
+        self.epoca_remota = None
+        self.acumulado = 0
+        self.fuera_de_orden = set()
+        self.ack_programado = False
+
+
+class CanalConfiable:
+    def __init__(self, enviar, al_fallar=None, rueda=None):
+        self.enviar = enviar        # funcion (ip, mensaje) que manda un datagrama
+        self.al_fallar = al_fallar  # funcion (ip, mensaje) cuando se agotan los reintentos
+        self.rueda = rueda if rueda is not None else RuedaTemporizadores(RESOLUCION)
+        self.epoca = random.getrandbits(31)
+        self.pares = {}
+        self.lock = threading.Lock()
+        # Metricas
+        self.enviados = 0
+        self.reenviados = 0
+        self.duplicados = 0
+        self.fallidos = 0
+
+    def _par(self, ip):
+        p = self.pares.get(ip)
+        if p is None:
+            p = self.pares[ip] = Par()
+        return p
+
+    # --- Emisor
+
+    def mandar(self, ip, mensaje, vida=None):
+        # vida: segundos que quien lo manda va a esperar la respuesta (None = sin limite)
+        with self.lock:
+            p = self._par(ip)
+            p.siguiente += 1
+            seq = p.siguiente
+            base = min(p.pendientes) if p.pendientes else seq
+            mensaje = dict(mensaje, rseq=seq, repoca=self.epoca, rbase=base)
+            ahora = time.monotonic()
+            p.pendientes[seq] = Pendiente(seq, mensaje, ahora, ahora + vida if vida is not None else None)
+            rto = p.rto
+            self.enviados += 1
+        self.rueda.programar(rto, ('reenvio', ip, seq), self._vencer)
+        self.enviar(ip, mensaje)
+
+    def _vencer(self, llave):
+        _, ip, seq = llave
+        with self.lock:
+            p = self.pares.get(ip)
+            pendiente = p.pendientes.get(seq) if p is not None else None
+            if pendiente is None:
+                return
+            ahora = time.monotonic()
+            if pendiente.intentos >= MAX_REINTENTOS or (pendiente.limite is not None and ahora >= pendiente.limite):
+                del p.pendientes[seq]
+                self.fallidos += 1
+                fallo = True
+            else:
+                fallo = False
+                pendiente.intentos += 1
+                pendiente.enviado = ahora
+                # Backoff exponencial por mensaje; el RTO del nodo solo cambia con mediciones.
+                # El ultimo intento se revisa justo en el limite
+                rto = min(p.rto * 2 ** pendiente.intentos, RTO_MAX)
+                if pendiente.limite is not None:
+                    rto = min(rto, max(pendiente.limite - ahora, RESOLUCION))
+                self.reenviados += 1
+        if fallo:
+            print(f"Sin confirmacion de {ip} para {pendiente.mensaje.get('action')} tras {pendiente.intentos} reintentos")
+            if self.al_fallar is not None:
+                self.al_fallar(ip, pendiente.mensaje)
+            return
+        self.rueda.programar(rto, llave, self._vencer)
+        self.enviar(ip, pendiente.mensaje)
+
+    def _medir(self, p, muestra):
+        # Llamar con self.lock tomado
+        if p.srtt is None:
+            p.srtt = muestra
+            p.rttvar = muestra / 2
+        else:
+            p.rttvar = (1 - BETA) * p.rttvar + BETA * abs(p.srtt - muestra)
+            p.srtt = (1 - ALFA) * p.srtt + ALFA * muestra
+        p.rto = min(RTO_MAX, max(RTO_MIN, p.srtt + max(RESOLUCION, 4 * p.rttvar)))
+
+    def recibir_ack(self, mensaje, ip):
+        if mensaje.get('epoca') != self.epoca:
+            return  # Confirma mensajes de una ejecucion anterior de este nodo
+        ahora = time.monotonic()
+        acumulado = mensaje.get('acumulado', 0)
+        selectivos = mensaje.get('selectivos') or []
+        reenviar = []
+        with self.lock:
+            p = self.pares.get(ip)
+            if p is None:
+                return
+            confirmados = [s for s in p.pendientes if s <= acumulado]
+            confirmados.extend(s for s in selectivos if s in p.pendientes and s > acumulado)
+            for s in confirmados:
+                pendiente = p.pendientes.pop(s)
+                if pendiente.intentos == 0:
+                    self._medir(p, ahora - pendiente.enviado)
+            if selectivos and p.srtt is not None:
+                # Huecos antes del ultimo selectivo: se reenvian ya, sin esperar el RTO
+                for s, pendiente in p.pendientes.items():
+                    if (s < max(selectivos) and ahora - pendiente.enviado > p.srtt
+                            and (pendiente.limite is None or ahora < pendiente.limite)):
+                        pendiente.intentos += 1
+                        pendiente.enviado = ahora
+                        reenviar.append(pendiente.mensaje)
+                        self.reenviados += 1
+        for s in confirmados:
+            self.rueda.cancelar(('reenvio', ip, s))
+        for m in reenviar:
+            self.enviar(ip, m)
+
+    # --- Receptor
+
+    def recibir(self, mensaje, ip):
+        # Regresa True si hay que procesar el mensaje, False si es un duplicado
+        seq = mensaje.get('rseq')
+        if seq is None:
+            return True
+        with self.lock:
+            p = self._par(ip)
+            if p.epoca_remota != mensaje.get('repoca'):
+                # El emisor arranco de nuevo: sus secuencias empiezan otra vez
+                p.epoca_remota = mensaje.get('repoca')
+                p.acumulado = 0
+                p.fuera_de_orden = set()
+            base = mensaje.get('rbase', 1)
+            if base - 1 > p.acumulado:
+                # El emisor ya no va a reenviar nada antes de base
+                p.acumulado = base - 1
+                p.fuera_de_orden = {s for s in p.fuera_de_orden if s > p.acumulado}
+                while p.acumulado + 1 in p.fuera_de_orden:
+                    p.acumulado += 1
+                    p.fuera_de_orden.discard(p.acumulado)
+            if seq > p.acumulado + VENTANA_DEDUP:
+                return False  # Demasiado adelante; se descarta sin ack y el emisor lo reenvia
+            nuevo = seq > p.acumulado and seq not in p.fuera_de_orden
+            if nuevo:
+                p.fuera_de_orden.add(seq)
+                while p.acumulado + 1 in p.fuera_de_orden:
+                    p.acumulado += 1
+                    p.fuera_de_orden.discard(p.acumulado)
+            else:
+                self.duplicados += 1
+            programar = not p.ack_programado
+            p.ack_programado = True
+        if programar:
+            self.rueda.programar(RETRASO_ACK, ('ack', ip), self._mandar_ack)
+        return nuevo
+
+    def _mandar_ack(self, llave):
+        ip = llave[1]
+        with self.lock:
+            p = self.pares[ip]
+            p.ack_programado = False
+            ack = {
+                'action': 'ack_confiable',
+                'epoca': p.epoca_remota,
+                'acumulado': p.acumulado,
+                'selectivos': sorted(p.fuera_de_orden)[:MAX_SELECTIVOS],
+            }
+        try:
+            self.enviar(ip, ack)
+        except OSError as e:
+            print(f"Error al confirmar a {ip}: {e}")
+
+    def olvidar(self, ip):
+        # El nodo se cayo: no tiene caso seguir reenviandole
+        with self.lock:
+            p = self.pares.get(ip)
+            if p is None:
+                return
+            secuencias = list(p.pendientes)
+            p.pendientes.clear()
+        for s in secuencias:
+            self.rueda.cancelar(('reenvio', ip, s))
+
+    def metricas(self):
+        with self.lock:
+            return {
+                'enviados': self.enviados,
+                'reenviados': self.reenviados,
+                'duplicados': self.duplicados,
+                'fallidos': self.fallidos,
+                'pares': {
+                    ip: {
+                        'pendientes': len(p.pendientes),
+                        'srtt_ms': p.srtt * 1000 if p.srtt is not None else None,
+                        'rto_ms': p.rto * 1000,
+                        'acumulado': p.acumulado,
+                    }
+                    for ip, p in self.pares.items()
+                },
+            }
@@ -0,0 +1,188 @@
+import struct
+import threading
+import time
+from bisect import bisect_left
+
+from codec import ACCIONES_CABECERA, decodificar, decodificar_cuerpo, leer_accion
+from enviador import es_paquete, desempaquetar
+
+# Registro de acciones compartido por programa_lider.py y proyecto.py
+# Los manejadores se marcan con @accion("nombre") dentro de la clase Node y el
+# Despachador arma una sola vez la tabla accion -> metodo, asi el ciclo del servidor
+# no tiene que recorrer una cadena de if/elif por cada datagrama
+#
+# Camino rapido: las acciones de ACCIONES_CABECERA (acks de la entrega confiable y SWIM) se
+# enrutan con la accion de la cabecera (binaria o compacta, ver codec.py). Sin manejador se
+# descartan sin decodificar el cuerpo; con manejador, el diario solo anota la cabecera, no
+# pasan por el filtro (nunca van por la entrega confiable) y el cuerpo se decodifica una vez,
+# sin la cabecera, ya con el manejador elegido
+
+# Limites (en ms) de las cubetas del histograma de latencia por accion
+LIMITES_LATENCIA_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def accion(nombre):
+    # Decorador para registrar un metodo del nodo como manejador de una accion
+    def decorador(func):
+        func._accion = nombre
+        return func
+    return decorador
+
+
+class EstadisticasAccion:
+    __slots__ = ('llamadas', 'errores', 'total_ms', 'max_ms', 'histograma')
+
+    def __init__(self):
+        self.llamadas = 0
+        self.errores = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        # Una cubeta extra para lo que exceda el ultimo limite
+        self.histograma = [0] * (len(LIMITES_LATENCIA_MS) + 1)
+
+    def registrar(self, ms, error=False):
+        self.llamadas += 1
+        if error:
+            self.errores += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        self.histograma[bisect_left(LIMITES_LATENCIA_MS, ms)] += 1
+
+    def percentil(self, p):
+        # Aproximado: limite superior de la cubeta donde cae el percentil
+        if self.llamadas == 0:
+            return 0.0
+        objetivo = p / 100.0 * self.llamadas
+        acumulado = 0
+        for i, cuenta in enumerate(self.histograma):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                if i < len(LIMITES_LATENCIA_MS):
+                    return LIMITES_LATENCIA_MS[i]
+                return self.max_ms
+        return self.max_ms
+
+    def resumen(self):
+        return {
+            'llamadas': self.llamadas,
+            'errores': self.errores,
+            'promedio_ms': self.total_ms / self.llamadas if self.llamadas else 0.0,
+            'p50_ms': self.percentil(50),
+            'p99_ms': self.percentil(99),
+            'max_ms': self.max_ms,
+            'histograma': list(self.histograma),
+        }
+
+
+class Despachador:
+    def __init__(self, node):
+        self.node = node
+        self.tabla = {}  # accion -> metodo ligado
+        self.estadisticas = {}
+        self.desconocidas = {}  # accion -> veces recibida sin manejador
+        self.invalidos = 0      # datagramas que no se pudieron decodificar
+        self.lock = threading.Lock()
+        self.observador = None  # funcion (mensaje, direccion) que ve cada mensaje decodificado (ej. el diario)
+        self.filtro = None      # funcion (mensaje, direccion) -> False para no despachar (ej. duplicados)
+
+        # Precompilar la tabla buscando los metodos marcados con @accion en la clase del nodo
+        for clase in reversed(type(node).__mro__):
+            for atributo in vars(clase).values():
+                nombre = getattr(atributo, '_accion', None)
+                if nombre is not None:
+                    self.registrar(nombre, getattr(node, atributo.__name__))
+
+    def registrar(self, nombre, manejador):
+        # Permite agregar acciones en tiempo de ejecucion sin tocar el ciclo del servidor
+        self.tabla[nombre] = manejador
+        self.estadisticas.setdefault(nombre, EstadisticasAccion())
+
+    def decodificar(self, datos):
+        # Regresa (accion, mensaje); el formato se detecta por la magia de la cabecera binaria
+        mensaje = decodificar(datos)
+        return mensaje.get('action'), mensaje
+
+    def despachar(self, datos, direccion):
+        if es_paquete(datos):
+            # Varios mensajes juntos en un datagrama (ver enviador.py)
+            try:
+                mensajes = desempaquetar(datos)
+            except struct.error:
+                with self.lock:
+                    self.invalidos += 1
+                print(f"Paquete invalido de {direccion}")
+                return None
+            for mensaje in mensajes:
+                self.despachar(mensaje, direccion)
+            return None
+        try:
+            nombre = leer_accion(datos)
+            if nombre in ACCIONES_CABECERA:
+                return self.despachar_cabecera(nombre, datos, direccion)
+            nombre, mensaje = self.decodificar(datos)
+        except (ValueError, UnicodeDecodeError, AttributeError, IndexError, struct.error):
+            self.invalido(direccion)
+            return None
+
+        if self.observador is not None:
+            self.observador(mensaje, direccion)
+        if self.filtro is not None and not self.filtro(mensaje, direccion):
+            return None
+
+        manejador = self.tabla.get(nombre)
+        if manejador is None:
+            self.desconocida(nombre, direccion)
+            return None
+
+        # Add timestamp and node to the message
+        mensaje['time'] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        mensaje['node'] = self.node.node_id
+        return self.llamar(nombre, manejador, mensaje, direccion)
+
+    def despachar_cabecera(self, nombre, datos, direccion):
+        manejador = self.tabla.get(nombre)
+        if manejador is None:
+            self.desconocida(nombre, direccion)
+            return None
+        if self.observador is not None:
+            self.observador({'action': nombre}, direccion)
+        try:
+            mensaje = decodificar_cuerpo(datos, nombre)
+        except (ValueError, UnicodeDecodeError, AttributeError, IndexError, struct.error):
+            self.invalido(direccion)
+            return None
+        return self.llamar(nombre, manejador, mensaje, direccion)
+
+    def invalido(self, direccion):
+        with self.lock:
+            self.invalidos += 1
+        print(f"Mensaje invalido de {direccion}")
+
+    def desconocida(self, nombre, direccion):
+        with self.lock:
+            self.desconocidas[nombre] = self.desconocidas.get(nombre, 0) + 1
+        print(f"Accion desconocida '{nombre}' de {direccion}")
+
+    def llamar(self, nombre, manejador, mensaje, direccion):
+        inicio = time.perf_counter()
+        error = False
+        try:
+            return manejador(mensaje, direccion)
+        except Exception as e:
+            # Un manejador con error no debe tumbar el ciclo del servidor
+            error = True
+            print(f"Error en la accion '{nombre}' de {direccion}: {e}")
+            return None
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            with self.lock:
+                self.estadisticas[nombre].registrar(ms, error)
+
+    def metricas(self):
+        with self.lock:
+            return {
+                'acciones': {nombre: est.resumen() for nombre, est in self.estadisticas.items()},
+                'desconocidas': dict(self.desconocidas),
+                'invalidos': self.invalidos,
+            }
@@ -0,0 +1,201 @@
+import math
+import threading
+import time
+from collections import deque
+
+# Detector de fallas phi-accrual
+# En lugar de un tiempo fijo (MAX_INACTIVE_TIME), por cada nodo se guarda una ventana con
+# los intervalos entre mensajes recibidos y se calcula phi = -log10(P(que el siguiente siga
+# por llegar)). Un enlace congestionado tiene intervalos mas variables y el detector se vuelve
+# mas tolerante solo con ese nodo. Las revisiones las dispara una rueda de temporizadores:
+# cada nodo se revisa cuando su phi alcanzaria el umbral, no en cada vuelta de un ciclo.
+# La membresia (membresia.py) lo usa como fuente de sospecha junto con los pings de SWIM
+#
+# La misma rueda lleva los demas vencimientos del nodo: sospechas de la membresia, leases de
+# los tokens, reenvios y acks de la entrega confiable
+
+UMBRAL_PHI = 8.0
+VENTANA = 100
+MIN_DESVIACION = 0.1     # Segundos; evita que un enlace muy estable marque caidas por milisegundos
+INTERVALO_INICIAL = 2.0  # Intervalo supuesto mientras no hay suficientes muestras
+RESOLUCION_RUEDA = 0.1
+RANURAS_RUEDA = 512
+
+
+def _phi(transcurrido, media, desviacion):
+    # Aproximacion logistica de la normal acumulada (la misma que usan Akka y Cassandra)
+    y = max((transcurrido - media) / desviacion, -20.0)
+    exponente = -y * (1.5976 + 0.070566 * y * y)
+    if transcurrido > media:
+        # -log10(e / (1 + e)) escrito sin calcular e, que se va a cero con atrasos grandes
+        return -exponente / math.log(10) + math.log10(1.0 + math.exp(exponente))
+    e = math.exp(exponente)
+    return -math.log10(1.0 - 1.0 / (1.0 + e))
+
+
+def _y_para_umbral(umbral):
+    # Desviaciones sobre la media a las que phi llega al umbral (no depende del nodo)
+    bajo, alto = 0.0, 50.0
+    for _ in range(60):
+        medio = (bajo + alto) / 2
+        if _phi(medio, 0.0, 1.0) < umbral:
+            bajo = medio
+        else:
+            alto = medio
+    return alto
+
+
+class VentanaLlegadas:
+    __slots__ = ('intervalos', 'suma', 'suma_cuadrados', 'ultimo')
+
+    def __init__(self, maximo=VENTANA):
+        self.intervalos = deque(maxlen=maximo)
+        self.suma = 0.0
+        self.suma_cuadrados = 0.0
+        self.ultimo = None
+
+    def agregar(self, ahora):
+        if self.ultimo is not None:
+            intervalo = ahora - self.ultimo
+            if len(self.intervalos) == self.intervalos.maxlen:
+                viejo = self.intervalos[0]
+                self.suma -= viejo
+                self.suma_cuadrados -= viejo * viejo
+            self.intervalos.append(intervalo)
+            self.suma += intervalo
+            self.suma_cuadrados += intervalo * intervalo
+        self.ultimo = ahora
+
+    def estadisticas(self):
+        n = len(self.intervalos)
+        if n == 0:
+            return INTERVALO_INICIAL, INTERVALO_INICIAL / 4
+        media = self.suma / n
+        varianza = max(self.suma_cuadrados / n - media * media, 0.0)
+        return media, max(math.sqrt(varianza), MIN_DESVIACION)
+
+
+class RuedaTemporizadores:
+    # Cada ranura es un tick; programar y cancelar son O(1) y cada tick solo ve su ranura
+    def __init__(self, resolucion=RESOLUCION_RUEDA, ranuras=RANURAS_RUEDA):
+        self.resolucion = resolucion
+        self.ranuras = [dict() for _ in range(ranuras)]
+        self.ubicacion = {}  # llave -> ranura
+        self.actual = 0
+        self.lock = threading.Lock()
+
+    def programar(self, retraso, llave, funcion):
+        ticks = max(1, math.ceil(retraso / self.resolucion))
+        with self.lock:
+            self._cancelar(llave)
+            ranura = (self.actual + ticks) % len(self.ranuras)
+            vueltas = (ticks - 1) // len(self.ranuras)
+            self.ranuras[ranura][llave] = [vueltas, funcion]
+            self.ubicacion[llave] = ranura
+
+    def _cancelar(self, llave):
+        ranura = self.ubicacion.pop(llave, None)
+        if ranura is not None:
+            self.ranuras[ranura].pop(llave, None)
+
+    def cancelar(self, llave):
+        with self.lock:
+            self._cancelar(llave)
+
+    def tick(self):
+        vencidos = []
+        with self.lock:
+            self.actual = (self.actual + 1) % len(self.ranuras)
+            ranura = self.ranuras[self.actual]
+            for llave, entrada in list(ranura.items()):
+                if entrada[0] > 0:
+                    entrada[0] -= 1
+                    continue
+                del ranura[llave]
+                del self.ubicacion[llave]
+                vencidos.append((llave, entrada[1]))
+        for llave, funcion in vencidos:
+            funcion(llave)
+
+    def correr(self):
+        siguiente = time.monotonic()
+        while True:
+            siguiente += self.resolucion
+            espera = siguiente - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            self.tick()
+
+
+class DetectorPhi:
+    def __init__(self, al_fallar, al_recuperar=None, umbral=UMBRAL_PHI, rueda=None, min_muestras=0):
+        self.al_fallar = al_fallar
+        self.al_recuperar = al_recuperar
+        self.umbral = umbral
+        self.min_muestras = min_muestras  # Intervalos medidos antes de poder dar a un nodo por caido
+        self.y_umbral = _y_para_umbral(umbral)
+        self.rueda = rueda if rueda is not None else RuedaTemporizadores()
+        self.ventanas = {}
+        self.caidos = set()
+        self.lock = threading.Lock()
+
+    def latido(self, nodo, ahora=None):
+        ahora = time.monotonic() if ahora is None else ahora
+        with self.lock:
+            ventana = self.ventanas.get(nodo)
+            if ventana is None:
+                ventana = self.ventanas[nodo] = VentanaLlegadas()
+            ventana.agregar(ahora)
+            media, desviacion = ventana.estadisticas()
+            recuperado = nodo in self.caidos
+            self.caidos.discard(nodo)
+        # La revision se programa para cuando phi alcanzaria el umbral si no llega otro heartbeat.
+        # La llave lleva 'phi' porque la rueda puede ser compartida (ver membresia.py)
+        self.rueda.programar(media + self.y_umbral * desviacion, ('phi', nodo), self.revisar)
+        if recuperado and self.al_recuperar is not None:
+            self.al_recuperar(nodo)
+
+    def sospecha(self, nodo, ahora=None):
+        ahora = time.monotonic() if ahora is None else ahora
+        with self.lock:
+            ventana = self.ventanas.get(nodo)
+            if ventana is None or ventana.ultimo is None:
+                return 0.0
+            media, desviacion = ventana.estadisticas()
+            return _phi(ahora - ventana.ultimo, media, desviacion)
+
+    def revisar(self, llave):
+        nodo = llave[1]
+        phi = self.sospecha(nodo)
+        if phi < self.umbral:
+            # Llego un heartbeat o la estimacion cambio; se vuelve a programar lo que falta
+            with self.lock:
+                ventana = self.ventanas.get(nodo)
+                if ventana is None:
+                    return  # Se olvido mientras tanto
+                media, desviacion = ventana.estadisticas()
+                restante = ventana.ultimo + media + self.y_umbral * desviacion - time.monotonic()
+            self.rueda.programar(max(restante, self.rueda.resolucion), llave, self.revisar)
+            return
+        with self.lock:
+            ventana = self.ventanas.get(nodo)
+            if ventana is None or len(ventana.intervalos) < self.min_muestras:
+                return  # Todavia no se sabe su ritmo; el siguiente latido vuelve a programar la revision
+            if nodo in self.caidos:
+                return
+            self.caidos.add(nodo)
+        self.al_fallar(nodo)
+
+    def olvidar(self, nodo):
+        # Para nodos que salen del grupo a proposito
+        self.rueda.cancelar(('phi', nodo))
+        with self.lock:
+            self.ventanas.pop(nodo, None)
+            self.caidos.discard(nodo)
+
+    def activos(self):
+        with self.lock:
+            return [nodo for nodo in self.ventanas if nodo not in self.caidos]
+
+    def niveles(self):
+        return {nodo: self.sospecha(nodo) for nodo in list(self.ventanas)}
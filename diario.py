@@ -0,0 +1,233 @@
+import argparse
+import json
+import mmap
+import os
+import time
+from bisect import bisect_left
+
+from registro_mensajes import RegistroMensajes
+
+# Diario de mensajes estructurado (una linea JSON por mensaje) con un indice aparte
+# El indice (<archivo>.idx) guarda, por cubeta de tiempo, el byte donde empieza la cubeta
+# y, por cada nodo vecino, el primer y el ultimo byte de sus mensajes en esa cubeta.
+# Para consultar un rango se salta directo a esos bytes con mmap en lugar de leer todo
+#
+# Uso: python diario.py logMensajes.jsonl --desde "2024-05-01 14:00" --hasta "2024-05-01 14:05" --par 192.168.253.132
+
+ARCHIVO_DIARIO = "logMensajes.jsonl"
+CUBETA = 60               # Segundos por cubeta del indice
+INTERVALO_INDICE = 5      # Segundos entre escrituras del indice a disco
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+
+def ruta_indice(ruta):
+    return ruta + ".idx"
+
+
+class IndiceDiario:
+    def __init__(self, cubeta=CUBETA):
+        self.cubeta = cubeta
+        self.tiempo = {}   # cubeta -> byte de la primera linea
+        self.pares = {}    # par -> {cubeta: [primer byte, ultimo byte]}
+        self.bytes = 0     # Hasta donde esta indexado el archivo
+
+    def agregar(self, ts, par, posicion, fin):
+        n = int(ts // self.cubeta)
+        self.tiempo.setdefault(n, posicion)
+        rango = self.pares.setdefault(par, {}).get(n)
+        if rango is None:
+            self.pares[par][n] = [posicion, posicion]
+        else:
+            rango[1] = posicion
+        self.bytes = fin
+
+    def guardar(self, ruta):
+        datos = {
+            'cubeta': self.cubeta,
+            'bytes': self.bytes,
+            'tiempo': self.tiempo,
+            'pares': self.pares,
+        }
+        temporal = ruta + ".tmp"
+        with open(temporal, "w") as file:
+            json.dump(datos, file)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        try:
+            with open(ruta, "r") as file:
+                datos = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls()
+        indice = cls(datos['cubeta'])
+        indice.bytes = datos['bytes']
+        indice.tiempo = {int(n): pos for n, pos in datos['tiempo'].items()}
+        indice.pares = {par: {int(n): rango for n, rango in cubetas.items()} for par, cubetas in datos['pares'].items()}
+        return indice
+
+    def completar(self, mm):
+        # Indexa lo que se haya escrito despues del ultimo guardado del indice
+        posicion = self.bytes
+        while posicion < len(mm):
+            fin = mm.find(b"\n", posicion)
+            if fin == -1:
+                break  # Linea a medias
+            try:
+                registro = json.loads(mm[posicion:fin])
+                self.agregar(registro['ts'], registro['par'], posicion, fin + 1)
+            except (ValueError, KeyError):
+                self.bytes = fin + 1
+            posicion = fin + 1
+
+
+class DiarioMensajes(RegistroMensajes):
+    # Igual que RegistroMensajes (lotes, rotacion, politica de cola) pero con registros JSON e indice
+    def __init__(self, ruta=ARCHIVO_DIARIO, cubeta=CUBETA, **kwargs):
+        super().__init__(ruta, **kwargs)
+        self.indice = IndiceDiario(cubeta)
+        self.ultimo_guardado = 0
+
+    def iniciar(self):
+        self.indice = IndiceDiario.cargar(ruta_indice(self.ruta))
+        super().iniciar()
+        if self.indice.bytes > self.archivo.tell():
+            self.indice = IndiceDiario(self.indice.cubeta)  # El indice no corresponde a este archivo
+        if self.indice.bytes < self.archivo.tell():
+            with open(self.ruta, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.indice.completar(mm)
+        return self
+
+    def registrar_evento(self, tipo, par, mensaje):
+        # tipo es 'RECIBIDO' o 'ENVIADO'; par es la IP del otro nodo. La linea se arma aqui: el
+        # despachador y los manejadores siguen modificando el mensaje mientras el escritor corre
+        ts = time.time()
+        linea = json.dumps({'ts': ts, 'tipo': tipo, 'par': par, 'mensaje': mensaje}, ensure_ascii=False, default=str)
+        return self.registrar((ts, par, linea + "\n"))
+
+    def escribir(self, lote):
+        posicion = self.archivo.tell()
+        lineas = []
+        for ts, par, linea in lote:
+            fin = posicion + len(linea.encode('utf-8'))
+            self.indice.agregar(ts, par, posicion, fin)
+            lineas.append(linea)
+            posicion = fin
+        self.archivo.write("".join(lineas))
+        self.archivo.flush()
+        self.escritos += len(lote)
+        self.lotes += 1
+        if time.time() - self.ultimo_guardado >= INTERVALO_INDICE:
+            self.indice.guardar(ruta_indice(self.ruta))
+            self.ultimo_guardado = time.time()
+        if self.archivo.tell() >= self.max_bytes:
+            self.rotar()
+
+    def rotar(self):
+        # El indice rota junto con su archivo
+        self.indice.guardar(ruta_indice(self.ruta))
+        for n in range(self.respaldos - 1, 0, -1):
+            origen = ruta_indice(f"{self.ruta}.{n}")
+            if os.path.exists(origen):
+                os.replace(origen, ruta_indice(f"{self.ruta}.{n + 1}"))
+        if self.respaldos > 0:
+            os.replace(ruta_indice(self.ruta), ruta_indice(f"{self.ruta}.1"))
+        super().rotar()
+        self.indice = IndiceDiario(self.indice.cubeta)
+
+    def detener(self, timeout=5):
+        super().detener(timeout)
+        self.indice.guardar(ruta_indice(self.ruta))
+
+
+def _leer_linea(mm, posicion):
+    fin = mm.find(b"\n", posicion)
+    if fin == -1:
+        return None, len(mm)
+    try:
+        return json.loads(mm[posicion:fin]), fin + 1
+    except ValueError:
+        return {}, fin + 1
+
+
+def consultar(ruta, desde, hasta, par=None, tipo=None):
+    # Generador de registros con desde <= ts <= hasta (epoch), opcionalmente de un solo par
+    with open(ruta, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            indice = IndiceDiario.cargar(ruta_indice(ruta))
+            if indice.bytes > len(mm):
+                indice = IndiceDiario(indice.cubeta)
+            indice.completar(mm)
+            primera, ultima = int(desde // indice.cubeta), int(hasta // indice.cubeta)
+
+            if par is not None:
+                # Solo se leen los tramos del archivo donde ese par tiene mensajes
+                tramos = sorted((n, r) for n, r in indice.pares.get(par, {}).items() if primera <= n <= ultima)
+                for _, (inicio, final) in tramos:
+                    posicion = inicio
+                    while posicion <= final:
+                        registro, posicion = _leer_linea(mm, posicion)
+                        if registro is None:
+                            break
+                        if registro.get('par') == par and _coincide(registro, desde, hasta, tipo):
+                            yield registro
+                return
+
+            cubetas = sorted(indice.tiempo)
+            i = bisect_left(cubetas, primera)
+            if i == len(cubetas):
+                return
+            posicion = indice.tiempo[cubetas[i]]
+            while posicion < len(mm):
+                registro, posicion = _leer_linea(mm, posicion)
+                if registro is None:
+                    break
+                if int(registro.get('ts', 0) // indice.cubeta) > ultima:
+                    break
+                if _coincide(registro, desde, hasta, tipo):
+                    yield registro
+
+
+def _coincide(registro, desde, hasta, tipo):
+    ts = registro.get('ts', 0)
+    return desde <= ts <= hasta and (tipo is None or registro.get('tipo') == tipo)
+
+
+def leer_fecha(texto):
+    # Acepta "YYYY-mm-dd HH:MM[:SS]" o solo "HH:MM[:SS]" (dia de hoy)
+    for formato in (FORMATO_FECHA, "%Y-%m-%d %H:%M"):
+        try:
+            return time.mktime(time.strptime(texto, formato))
+        except ValueError:
+            pass
+    hoy = time.strftime("%Y-%m-%d", time.localtime())
+    for formato in (FORMATO_FECHA, "%Y-%m-%d %H:%M"):
+        try:
+            return time.mktime(time.strptime(f"{hoy} {texto}", formato))
+        except ValueError:
+            pass
+    raise ValueError(f"Fecha no valida: {texto}")
+
+
+def formatear(registro):
+    fecha = time.strftime(FORMATO_FECHA, time.localtime(registro['ts']))
+    preposicion = "de" if registro['tipo'] == 'RECIBIDO' else "a"
+    return f"{fecha} - Mensaje {registro['tipo']} {preposicion} {registro['par']}: {registro['mensaje']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta el diario de mensajes por rango de tiempo")
+    parser.add_argument("archivo", nargs="?", default=ARCHIVO_DIARIO)
+    parser.add_argument("--desde", required=True)
+    parser.add_argument("--hasta", required=True)
+    parser.add_argument("--par", help="IP del otro nodo")
+    parser.add_argument("--tipo", choices=("RECIBIDO", "ENVIADO"))
+    args = parser.parse_args()
+    for registro in consultar(args.archivo, leer_fecha(args.desde), leer_fecha(args.hasta), args.par, args.tipo):
+        print(formatear(registro))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+try:
+    import numpy as np
+except ImportError:  # Sin numpy se usa la version en Python puro (mismo resultado, mas lenta)
+    np = None
+
+# Reparto del inventario entre las sucursales segun su capacidad
+# Las unidades de cada articulo que todavia no estan en ninguna columna InvN (cantidad menos
+# lo ya asignado) se reparten entre las sucursales en proporcion al espacio libre de cada
+# una, para todos los articulos a la vez (matriz articulos x sucursales). Ninguna sucursal
+# recibe mas de su espacio libre; si no cabe todo, lo que sobra se reporta como sin espacio
+#
+# Pasos, todos con enteros:
+#   1. Si no cabe todo, se recorta cada articulo en proporcion a lo que pide
+#   2. El total se reparte entre sucursales segun su espacio libre (cupo de cada columna)
+#   3. Cada articulo recibe el piso de su parte proporcional de cada cupo
+#   4. Las unidades que quedaron por los pisos (menos de una por sucursal en cada articulo) se
+#      acomodan poniendo en fila lo que le falta a cada articulo y lo que le falta a cada cupo,
+#      y cruzando los dos intervalos, asi las sumas por articulo y por sucursal quedan exactas
+
+
+def prorratear(total, pesos):
+    # Reparte `total` unidades en proporcion a `pesos` (metodo del mayor residuo)
+    suma = sum(pesos)
+    if suma <= 0 or total <= 0:
+        return [0] * len(pesos)
+    partes = [total * p // suma for p in pesos]
+    residuos = sorted(range(len(pesos)), key=lambda i: -(total * pesos[i] - partes[i] * suma))
+    for i in residuos[:total - sum(partes)]:
+        partes[i] += 1
+    return partes
+
+
+def _cruzar(faltan_filas, faltan_columnas):
+    # Asignacion con esas sumas por fila y por columna (solo las celdas que no son cero)
+    celdas = []
+    j = 0
+    disponible = faltan_columnas[0] if faltan_columnas else 0
+    for i, falta in enumerate(faltan_filas):
+        while falta > 0:
+            while disponible == 0:
+                j += 1
+                disponible = faltan_columnas[j]
+            tomar = min(falta, disponible)
+            celdas.append((i, j, tomar))
+            falta -= tomar
+            disponible -= tomar
+    return celdas
+
+
+def _repartir_python(pendientes, libre):
+    total_libre = sum(libre)
+    if sum(pendientes) > total_libre:
+        caben = prorratear(total_libre, pendientes)
+    else:
+        caben = list(pendientes)
+    total = sum(caben)
+    cupos = prorratear(total, libre)
+    asignacion = []
+    for q in caben:
+        asignacion.append([q * c // total for c in cupos] if total else [0] * len(cupos))
+    faltan_filas = [q - sum(fila) for q, fila in zip(caben, asignacion)]
+    faltan_columnas = [c - sum(fila[s] for fila in asignacion) for s, c in enumerate(cupos)]
+    for i, s, unidades in _cruzar(faltan_filas, faltan_columnas):
+        asignacion[i][s] += unidades
+    return asignacion, [q - c for q, c in zip(pendientes, caben)]
+
+
+def _prorratear_np(total, pesos):
+    suma = int(pesos.sum())
+    if suma <= 0 or total <= 0:
+        return np.zeros(len(pesos), dtype=np.int64)
+    partes = total * pesos // suma
+    residuos = total * pesos - partes * suma
+    resto = int(total - partes.sum())
+    partes[np.argsort(-residuos, kind='stable')[:resto]] += 1
+    return partes
+
+
+def _repartir_numpy(pendientes, libre):
+    q = np.asarray(pendientes, dtype=np.int64)
+    libre = np.asarray(libre, dtype=np.int64)
+    total_libre = int(libre.sum())
+    caben = _prorratear_np(total_libre, q) if int(q.sum()) > total_libre else q.copy()
+    total = int(caben.sum())
+    cupos = _prorratear_np(total, libre)
+    if total:
+        asignacion = caben[:, None] * cupos[None, :] // total
+    else:
+        asignacion = np.zeros((len(q), len(libre)), dtype=np.int64)
+    faltan_filas = caben - asignacion.sum(axis=1)
+    faltan_columnas = cupos - asignacion.sum(axis=0)
+    fin_filas = np.cumsum(faltan_filas)
+    fin_columnas = np.cumsum(faltan_columnas)
+    cruce = (np.minimum(fin_filas[:, None], fin_columnas[None, :])
+             - np.maximum((fin_filas - faltan_filas)[:, None], (fin_columnas - faltan_columnas)[None, :]))
+    asignacion += np.clip(cruce, 0, None)
+    return asignacion.tolist(), (q - caben).tolist()
+
+
+def repartir(pendientes, ocupado, capacidades):
+    # pendientes: unidades por asignar de cada articulo
+    # ocupado: unidades que ya tiene cada sucursal (todo el catalogo)
+    # capacidades: capacidad total de cada sucursal (0 si no esta disponible)
+    # Regresa (asignacion por articulo y sucursal, unidades sin espacio por articulo)
+    libre = [max(0, c - o) for c, o in zip(capacidades, ocupado)]
+    if not pendientes:
+        return [], []
+    if np is not None:
+        return _repartir_numpy(pendientes, libre)
+    return _repartir_python(pendientes, libre)
@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from collections import deque
+
+# Eleccion de nodo maestro por terminos (al estilo Raft)
+# Cada nodo vota a lo mas una vez por termino y un candidato solo es maestro si junta la
+# mayoria de los nodos conocidos, asi no puede haber dos maestros en el mismo termino.
+# El maestro manda un latido cada INTERVALO_LATIDO; si un nodo pasa un tiempo aleatorio
+# entre TIEMPO_ELECCION y 2*TIEMPO_ELECCION sin saber del maestro, se postula en el
+# termino siguiente. El tiempo de failover queda acotado por esos dos valores
+
+SEGUIDOR = 'seguidor'
+CANDIDATO = 'candidato'
+MAESTRO = 'maestro'
+
+TIEMPO_ELECCION = 1.5     # Segundos sin latido del maestro antes de postularse (minimo)
+INTERVALO_LATIDO = 0.5    # Debe ser bastante menor que TIEMPO_ELECCION
+PASO = 0.05               # Cada cuanto se revisan los temporizadores
+HISTORIAL = 100           # Duraciones de eleccion que se guardan para las metricas
+
+ACCIONES_ELECCION = ('pedir_voto', 'voto', 'latido_maestro')
+
+
+class Eleccion:
+    def __init__(self, ip, enviar, electorado, al_cambiar_maestro=None, tiempo_eleccion=TIEMPO_ELECCION):
+        self.ip = ip
+        self.enviar = enviar            # funcion (ip, mensaje)
+        self.electorado = electorado    # funcion que regresa las IPs que cuentan para la mayoria
+        self.al_cambiar_maestro = al_cambiar_maestro  # funcion (ip del maestro o None, termino)
+        self.tiempo_eleccion = tiempo_eleccion
+
+        self.termino = 0
+        self.voto = None     # A quien se voto en el termino actual
+        self.estado = SEGUIDOR
+        self.maestro = None
+        self.votos = set()
+        self.lock = threading.Lock()
+
+        ahora = time.monotonic()
+        self.ultimo_contacto = ahora
+        self.ultimo_latido = 0.0
+        self.limite = self._nuevo_limite(ahora)
+        self.sin_maestro_desde = ahora
+        # Metricas
+        self.elecciones = 0
+        self.ganadas = 0
+        self.duraciones = deque(maxlen=HISTORIAL)
+
+    def _nuevo_limite(self, ahora):
+        # Aleatorio para que normalmente solo un nodo se postule a la vez
+        return ahora + self.tiempo_eleccion * (1 + random.random())
+
+    def _mayoria(self):
+        votantes = set(self.electorado()) | {self.ip}
+        return len(votantes) // 2 + 1
+
+    def _cambiar_maestro(self, ip, eventos):
+        # Llamar con self.lock tomado; el aviso se hace despues, fuera del lock
+        if ip == self.maestro:
+            return
+        ahora = time.monotonic()
+        if ip is None:
+            # El failover se cuenta desde el ultimo latido del maestro anterior, no desde que se noto
+            self.sin_maestro_desde = self.ultimo_contacto if self.maestro not in (None, self.ip) else ahora
+        elif self.sin_maestro_desde is not None:
+            self.duraciones.append(ahora - self.sin_maestro_desde)
+            self.sin_maestro_desde = None
+        self.maestro = ip
+        eventos.append((ip, self.termino))
+
+    def _avisar(self, eventos):
+        if self.al_cambiar_maestro is not None:
+            for ip, termino in eventos:
+                self.al_cambiar_maestro(ip, termino)
+
+    def _mandar(self, ips, mensaje):
+        for ip in ips:
+            if ip == self.ip:
+                continue
+            try:
+                self.enviar(ip, dict(mensaje))
+            except OSError as e:
+                print(f"Error al enviar {mensaje['action']} a {ip}: {e}")
+
+    def _adoptar_termino(self, termino, eventos):
+        # Un termino mayor siempre gana: se vuelve a seguidor sin voto
+        if termino > self.termino:
+            self.termino = termino
+            self.voto = None
+            if self.estado != SEGUIDOR or self.maestro is not None:
+                self.estado = SEGUIDOR
+                self._cambiar_maestro(None, eventos)
+
+    def adoptar_termino(self, termino):
+        # Termino mayor visto fuera de la eleccion (por ejemplo en la replicacion del maestro)
+        eventos = []
+        with self.lock:
+            self._adoptar_termino(termino, eventos)
+        self._avisar(eventos)
+
+    def es_maestro(self):
+        return self.estado == MAESTRO
+
+    def postularse(self):
+        eventos = []
+        with self.lock:
+            if self.estado == MAESTRO:
+                return
+            self.termino += 1
+            self.estado = CANDIDATO
+            self.voto = self.ip
+            self.votos = {self.ip}
+            self.elecciones += 1
+            self._cambiar_maestro(None, eventos)
+            self.limite = self._nuevo_limite(time.monotonic())
+            termino = self.termino
+            gano = len(self.votos) >= self._mayoria()
+            if gano:
+                self._ganar(eventos)
+        self._avisar(eventos)
+        if gano:
+            self._latir()
+        else:
+            print(f"Postulandose como maestro en el termino {termino}")
+            mensaje = {'action': 'pedir_voto', 'termino': termino}
+            mensaje.update(self.datos_voto())
+            self._mandar(self.electorado(), mensaje)
+
+    def _ganar(self, eventos):
+        # Llamar con self.lock tomado
+        self.estado = MAESTRO
+        self.ganadas += 1
+        self._cambiar_maestro(self.ip, eventos)
+
+    def _latir(self):
+        with self.lock:
+            if self.estado != MAESTRO:
+                return
+            self.ultimo_latido = time.monotonic()
+            termino = self.termino
+        self._mandar(self.electorado(), {'action': 'latido_maestro', 'termino': termino})
+
+    def maestro_caido(self, ip):
+        # Aviso de la membresia: no hace falta esperar a que se venza el tiempo de eleccion
+        with self.lock:
+            caido = ip == self.maestro
+            if caido:
+                self.limite = time.monotonic()
+        return caido
+
+    def revisar(self):
+        ahora = time.monotonic()
+        with self.lock:
+            estado = self.estado
+            latir = estado == MAESTRO and ahora - self.ultimo_latido >= INTERVALO_LATIDO
+            postular = estado != MAESTRO and ahora >= self.limite
+        if latir:
+            self._latir()
+        elif postular:
+            self.postularse()
+
+    def correr(self):
+        while True:
+            time.sleep(PASO)
+            self.revisar()
+
+    def puede_votar(self, mensaje, ip):
+        # Punto de extension: condiciones extra para dar el voto (ej. que el candidato este al dia)
+        return True
+
+    def datos_voto(self):
+        # Punto de extension: campos extra que el candidato manda al pedir el voto
+        return {}
+
+    def recibir(self, mensaje, ip):
+        eventos = []
+        respuesta = None
+        latir = False
+        with self.lock:
+            termino = mensaje.get('termino', 0)
+            self._adoptar_termino(termino, eventos)
+            accion = mensaje.get('action')
+            if accion == 'pedir_voto':
+                concedido = (termino == self.termino and self.voto in (None, ip)
+                             and self.puede_votar(mensaje, ip))
+                if concedido:
+                    self.voto = ip
+                    self.limite = self._nuevo_limite(time.monotonic())
+                respuesta = {'action': 'voto', 'termino': self.termino, 'concedido': concedido}
+            elif accion == 'voto':
+                if self.estado == CANDIDATO and termino == self.termino and mensaje.get('concedido'):
+                    self.votos.add(ip)
+                    if len(self.votos) >= self._mayoria():
+                        self._ganar(eventos)
+                        latir = True
+            elif accion == 'latido_maestro':
+                if termino == self.termino:
+                    self.estado = SEGUIDOR
+                    self.ultimo_contacto = time.monotonic()
+                    self.limite = self._nuevo_limite(self.ultimo_contacto)
+                    self._cambiar_maestro(ip, eventos)
+        self._avisar(eventos)
+        if respuesta is not None:
+            self._mandar([ip], respuesta)
+        if latir:
+            print(f"Elegido como maestro en el termino {self.termino}")
+            self._latir()
+
+    def metricas(self):
+        with self.lock:
+            duraciones = sorted(self.duraciones)
+            sin_maestro = time.monotonic() - self.sin_maestro_desde if self.sin_maestro_desde is not None else 0.0
+            return {
+                'termino': self.termino,
+                'estado': self.estado,
+                'maestro': self.maestro,
+                'elecciones': self.elecciones,
+                'ganadas': self.ganadas,
+                'sin_maestro_s': sin_maestro,
+                'ultima_s': self.duraciones[-1] if self.duraciones else None,
+                'p50_s': duraciones[len(duraciones) // 2] if duraciones else None,
+                'max_s': duraciones[-1] if duraciones else None,
+            }
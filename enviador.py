@@ -0,0 +1,123 @@
+import select
+import struct
+import threading
+from collections import deque
+
+# Envio de datagramas por un solo socket de larga vida (el mismo del servidor)
+# Antes cada mensaje abria y cerraba su propio socket. Ahora los hilos solo encolan y un
+# hilo enviador saca todo lo pendiente de una vez: los mensajes chicos que van al mismo
+# nodo se juntan en un paquete (hasta TAM_PAQUETE bytes) y se mandan con un solo sendmsg,
+# pasando los pedazos sin copiarlos. Como los envios salen del puerto del servidor, el
+# receptor puede contestar directo a la direccion de origen
+#
+# Paquete: MAGIA_PAQUETE seguida de (largo de 2 bytes + datagrama original) por mensaje.
+# Un mensaje que va solo se manda tal cual, sin envoltura
+
+MAGIA_PAQUETE = b"SP"
+TAM_PAQUETE = 1400     # Debajo del MTU tipico para no fragmentar en IP
+LARGO = struct.Struct(">H")
+
+
+def es_paquete(datos):
+    return datos[:2] == MAGIA_PAQUETE
+
+
+def desempaquetar(datos):
+    mensajes = []
+    i = len(MAGIA_PAQUETE)
+    while i < len(datos):
+        (largo,) = LARGO.unpack_from(datos, i)
+        i += LARGO.size
+        mensajes.append(datos[i:i + largo])
+        i += largo
+    return mensajes
+
+
+def agrupar(datagramas, tam_paquete=TAM_PAQUETE):
+    # Lista de listas de buffers; cada lista es un datagrama a enviar
+    salida = []
+    actual = []
+    tam = len(MAGIA_PAQUETE)
+    for datos in datagramas:
+        extra = LARGO.size + len(datos)
+        if actual and tam + extra > tam_paquete:
+            salida.append(actual)
+            actual = []
+            tam = len(MAGIA_PAQUETE)
+        actual.append(datos)
+        tam += extra
+    if actual:
+        salida.append(actual)
+    buffers = []
+    for grupo in salida:
+        if len(grupo) == 1:
+            buffers.append([grupo[0]])
+        else:
+            partes = [MAGIA_PAQUETE]
+            for datos in grupo:
+                partes.append(LARGO.pack(len(datos)))
+                partes.append(datos)
+            buffers.append(partes)
+    return buffers
+
+
+class Enviador:
+    def __init__(self, sock, tam_paquete=TAM_PAQUETE):
+        self.sock = sock
+        self.tam_paquete = tam_paquete
+        self.pendientes = deque()
+        self.cond = threading.Condition()
+        self.usar_sendmsg = hasattr(sock, 'sendmsg')
+        # Metricas
+        self.mensajes = 0
+        self.datagramas = 0
+        self.errores = 0
+
+    def enviar(self, datos, direccion):
+        with self.cond:
+            self.pendientes.append((datos, direccion))
+            if len(self.pendientes) == 1:
+                self.cond.notify()
+
+    def correr(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pendientes)
+                lote = self.pendientes
+                self.pendientes = deque()
+            # Por destino, conservando el orden en que se encolaron
+            por_destino = {}
+            for datos, direccion in lote:
+                por_destino.setdefault(direccion, []).append(datos)
+            for direccion, datagramas in por_destino.items():
+                for partes in agrupar(datagramas, self.tam_paquete):
+                    self._mandar(partes, direccion)
+                self.mensajes += len(datagramas)
+
+    def _mandar(self, partes, direccion):
+        while True:
+            try:
+                if self.usar_sendmsg:
+                    self.sock.sendmsg(partes, (), 0, direccion)
+                else:
+                    self.sock.sendto(b"".join(partes), direccion)
+                self.datagramas += 1
+                return
+            except BlockingIOError:
+                # El socket es no bloqueante si lo comparte el servidor asyncio: esperar espacio
+                select.select([], [self.sock], [], 1.0)
+            except OSError as e:
+                self.errores += 1
+                print(f"Error al enviar a {direccion}: {e}")
+                return
+
+    def metricas(self):
+        with self.cond:
+            pendientes = len(self.pendientes)
+        return {
+            'mensajes': self.mensajes,
+            'datagramas': self.datagramas,
+            'mensajes_por_datagrama': self.mensajes / self.datagramas if self.datagramas else 0.0,
+            'pendientes': pendientes,
+            'errores': self.errores,
+        }
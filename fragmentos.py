@@ -0,0 +1,139 @@
+import itertools
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from queue import Queue, Empty
+
+# Transferencia del inventario completo en fragmentos que caben en un datagrama
+# Cada fragmento lleva un subconjunto de filas y se puede decodificar por si solo,
+# asi el que consulta empieza a mostrar filas antes de que llegue el resto
+
+TAM_BUFFER = 65535       # Tamaño de lectura del socket (antes 1024, truncaba el inventario)
+TAM_FRAGMENTO = 1200     # Bytes de filas por fragmento, debajo del MTU tipico
+ESPERA_REENVIO = 0.5     # Segundos sin recibir nada antes de pedir los fragmentos faltantes
+MAX_REINTENTOS = 5
+MAX_TRANSFERENCIAS = 32  # Transferencias enviadas que se guardan para poder reenviar
+VIGENCIA_TRANSFERENCIA = 30
+
+
+def fragmentar_inventario(inventario, transfer_id, tam_fragmento=TAM_FRAGMENTO):
+    fragmentos = []
+    actual = {}
+    tam_actual = 0
+    for item_id, registro in inventario.items():
+        tam_fila = len(item_id) + len(json.dumps(registro)) + 4
+        if actual and tam_actual + tam_fila > tam_fragmento:
+            fragmentos.append(actual)
+            actual = {}
+            tam_actual = 0
+        actual[item_id] = registro
+        tam_actual += tam_fila
+    if actual or not fragmentos:
+        fragmentos.append(actual)
+
+    total = len(fragmentos)
+    return [
+        {'action': 'inventory_chunk', 'id': transfer_id, 'n': n, 'total': total, 'filas': filas}
+        for n, filas in enumerate(fragmentos)
+    ]
+
+
+class TransferenciasEnviadas:
+    # Guarda los fragmentos ya enviados para atender reenvios selectivos
+    def __init__(self, maximo=MAX_TRANSFERENCIAS, vigencia=VIGENCIA_TRANSFERENCIA):
+        self.maximo = maximo
+        self.vigencia = vigencia
+        self.transferencias = OrderedDict()
+        self.lock = threading.Lock()
+
+    def guardar(self, transfer_id, fragmentos):
+        with self.lock:
+            self.transferencias[transfer_id] = (time.time(), fragmentos)
+            self.transferencias.move_to_end(transfer_id)
+            while len(self.transferencias) > self.maximo:
+                self.transferencias.popitem(last=False)
+
+    def obtener(self, transfer_id, faltan=None):
+        # faltan=None significa que el receptor no sabe cuantos hay, se regresan todos
+        with self.lock:
+            entrada = self.transferencias.get(transfer_id)
+            if entrada is None or time.time() - entrada[0] > self.vigencia:
+                self.transferencias.pop(transfer_id, None)
+                return None
+            fragmentos = entrada[1]
+        if faltan is None:
+            return fragmentos
+        return [fragmentos[n] for n in faltan if 0 <= n < len(fragmentos)]
+
+
+class RecepcionInventario:
+    def __init__(self, transfer_id, pedir_reenvio, espera_reenvio=ESPERA_REENVIO, max_reintentos=MAX_REINTENTOS):
+        self.id = transfer_id
+        self.pedir_reenvio = pedir_reenvio  # funcion (transfer_id, faltan) para solicitar fragmentos
+        self.espera_reenvio = espera_reenvio
+        self.max_reintentos = max_reintentos
+        self.total = None
+        self.recibidos = set()
+        self.cola = Queue()
+        self.lock = threading.Lock()
+
+    def recibir(self, fragmento):
+        n = fragmento['n']
+        with self.lock:
+            if self.total is None:
+                self.total = fragmento['total']
+            if n in self.recibidos:
+                return  # Duplicado por un reenvio
+            self.recibidos.add(n)
+        self.cola.put(fragmento['filas'])
+
+    def completa(self):
+        return self.total is not None and len(self.recibidos) == self.total
+
+    def faltantes(self):
+        with self.lock:
+            if self.total is None:
+                return None
+            return [n for n in range(self.total) if n not in self.recibidos]
+
+    def filas(self):
+        # Generador: entrega (item_id, registro) conforme llegan los fragmentos
+        reintentos = 0
+        entregados = 0
+        while self.total is None or entregados < self.total:
+            try:
+                filas = self.cola.get(timeout=self.espera_reenvio)
+            except Empty:
+                reintentos += 1
+                if reintentos > self.max_reintentos:
+                    print(f"Transferencia {self.id} incompleta, faltan fragmentos {self.faltantes()}")
+                    return
+                self.pedir_reenvio(self.id, self.faltantes())
+                continue
+            reintentos = 0
+            entregados += 1
+            yield from filas.items()
+
+
+class Reensamblador:
+    def __init__(self):
+        self.recepciones = {}
+        self.contador = itertools.count(random.randint(1, 1 << 20))
+        self.lock = threading.Lock()
+
+    def nueva(self, pedir_reenvio):
+        with self.lock:
+            recepcion = RecepcionInventario(next(self.contador), pedir_reenvio)
+            self.recepciones[recepcion.id] = recepcion
+        return recepcion
+
+    def recibir(self, fragmento):
+        recepcion = self.recepciones.get(fragmento.get('id'))
+        if recepcion is not None:
+            recepcion.recibir(fragmento)
+
+    def terminar(self, transfer_id):
+        with self.lock:
+            self.recepciones.pop(transfer_id, None)
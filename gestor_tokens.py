@@ -0,0 +1,260 @@
+import threading
+import time
+import zlib
+from collections import deque
+
+from detector_fallas import RuedaTemporizadores
+from planificador import Planificador, CLASE_VENTA, CLASE_GLOBAL
+
+# Gestor de accesos (tokens) del nodo maestro
+# En lugar de revisar la cola una vez por segundo, el acceso se concede en cuanto llega el
+# request_access (o en cuanto el titular lo libera). Cada concesion es un lease: si el
+# titular no lo libera antes de DURACION_LEASE (por ejemplo porque se cayo), vence solo y
+# pasa al siguiente en la cola. El token es un entero que siempre crece (fencing token);
+# quien aplica los cambios rechaza los que traigan un token viejo, asi un titular que se
+# quedo congelado y despierta con el lease vencido no puede escribir
+#
+# El acceso no es global: los articulos se reparten por hash en NUM_FRAGMENTOS candados y
+# cada request_access nombra los articulos que va a tocar. Ventas de articulos distintos se
+# conceden al mismo tiempo. Una solicitud se concede completa o nada, cuando todos sus
+# fragmentos estan libres: nadie retiene un fragmento mientras espera otro, asi que no puede
+# haber deadlock. Entre las que se pueden conceder, el Planificador decide el orden (clase de
+# prioridad, turnos justos por sucursal y una espera maxima contra la inanicion)
+
+DURACION_LEASE = 5.0     # Segundos
+HISTORIAL_ESPERAS = 10000
+BITS_CONTADOR = 32       # El termino del maestro va arriba del contador
+NUM_FRAGMENTOS = 64
+
+
+def fragmento_de(item_id, num_fragmentos=NUM_FRAGMENTOS):
+    # Estable entre procesos, a diferencia de hash()
+    return zlib.crc32(str(item_id).encode('utf-8')) % num_fragmentos
+
+
+def fragmentos_de(items, num_fragmentos=NUM_FRAGMENTOS):
+    # Sin articulos se bloquea todo el catalogo (acceso global como antes)
+    if not items:
+        return tuple(range(num_fragmentos))
+    return tuple(sorted({fragmento_de(item, num_fragmentos) for item in items}))
+
+
+class Solicitud:
+    __slots__ = ('node_id', 'solicitud', 'fragmentos', 'clase', 'solicitado', 'token', 'vence', 'concedido')
+
+    def __init__(self, node_id, solicitud, fragmentos, solicitado, clase=CLASE_VENTA):
+        self.node_id = node_id
+        self.solicitud = solicitud
+        self.fragmentos = fragmentos
+        self.clase = clase
+        self.solicitado = solicitado
+        self.token = None   # Se asigna al concederse; desde ahi es un lease
+        self.vence = None
+        self.concedido = None
+
+
+class Cerca:
+    # Lado del recurso: por cada llave (articulo) solo acepta tokens iguales o mayores al ultimo
+    def __init__(self):
+        self.maximos = {}
+        self.rechazados = 0
+        self.lock = threading.Lock()
+
+    def aceptar(self, token, llave=None):
+        with self.lock:
+            if token < self.maximos.get(llave, 0):
+                self.rechazados += 1
+                return False
+            self.maximos[llave] = token
+            return True
+
+
+class GestorTokens:
+    def __init__(self, conceder, duracion=DURACION_LEASE, rueda=None, num_fragmentos=NUM_FRAGMENTOS, planificador=None):
+        self.conceder = conceder  # funcion (node_id, token, duracion, solicitud) que avisa al nodo
+        self.duracion = duracion
+        self.rueda = rueda if rueda is not None else RuedaTemporizadores()
+        self.num_fragmentos = num_fragmentos
+        self.termino = 0
+        self.contador = 0
+        self.titulares = [None] * num_fragmentos          # fragmento -> Solicitud concedida
+        self.esperando = [0] * num_fragmentos             # fragmento -> solicitudes pendientes que lo piden
+        self.planificador = planificador if planificador is not None else Planificador()
+        self.leases = {}        # token -> Solicitud concedida
+        self.solicitudes = {}   # (node_id, solicitud) -> Solicitud pendiente o concedida
+        self.lock = threading.Lock()
+        # Metricas
+        self.concedidos = 0
+        self.vencidos = 0
+        self.max_simultaneos = 0
+        self.esperas = deque(maxlen=HISTORIAL_ESPERAS)
+        self.esperas_sucursal = {}  # node_id -> deque de esperas
+        self.concedidos_sucursal = {}
+        self.inicio = time.monotonic()
+
+    def nuevo_termino(self, termino):
+        # Al cambiar de maestro los tokens siguen creciendo: el termino va en los bits altos
+        with self.lock:
+            if termino > self.termino:
+                self.termino = termino
+                self.contador = 0
+
+    def _siguiente_token(self):
+        self.contador += 1
+        return (self.termino << BITS_CONTADOR) | self.contador
+
+    def solicitar(self, node_id, items=None, solicitud=None, clase=CLASE_VENTA):
+        # Regresa el token si se concedio de inmediato, None si quedo en espera
+        ahora = time.monotonic()
+        with self.lock:
+            s, concesiones = self._solicitar(node_id, items, solicitud, ahora, clase)
+        self._avisar(concesiones)
+        return s.token
+
+    def solicitar_varios(self, solicitudes):
+        # Un lote de (node_id, items, solicitud, clase) con una sola toma del lock; se forman
+        # todas y despues se concede, asi el planificador ordena el lote completo
+        ahora = time.monotonic()
+        concesiones = []
+        with self.lock:
+            for node_id, items, solicitud, clase in solicitudes:
+                concesiones.extend(self._solicitar(node_id, items, solicitud, ahora, clase, conceder=False)[1])
+            concesiones.extend(self._conceder_listas(ahora))
+        self._avisar(concesiones)
+
+    def _solicitar(self, node_id, items, solicitud, ahora, clase=CLASE_VENTA, conceder=True):
+        # Llamar con self.lock tomado. Regresa la solicitud y las concesiones que provoco
+        s = self.solicitudes.get((node_id, solicitud))
+        if s is not None:
+            if s.token is None:
+                return s, []  # Repetida mientras espera
+            # Se perdio la concesion: se le reenvia el mismo token
+            s.vence = ahora + self.duracion
+            return s, [s]
+        if not items:
+            clase = CLASE_GLOBAL
+        s = Solicitud(node_id, solicitud, fragmentos_de(items, self.num_fragmentos), ahora, clase)
+        self.solicitudes[(node_id, solicitud)] = s
+        for f in s.fragmentos:
+            self.esperando[f] += 1
+        self.planificador.agregar(s)
+        return s, self._conceder_listas(ahora) if conceder else []
+
+    def _libres(self, fragmentos):
+        # Llamar con self.lock tomado
+        return all(self.titulares[f] is None for f in fragmentos)
+
+    def _conceder_listas(self, ahora):
+        # Llamar con self.lock tomado. Concede en el orden del planificador todo lo que se pueda
+        concesiones = []
+        while len(self.planificador):
+            s = self.planificador.elegir(self._libres, ahora)
+            if s is None:
+                break
+            self.planificador.quitar(s)
+            for g in s.fragmentos:
+                self.esperando[g] -= 1
+                self.titulares[g] = s
+            s.token = self._siguiente_token()
+            s.concedido = ahora
+            s.vence = ahora + self.duracion
+            self.leases[s.token] = s
+            self.concedidos += 1
+            self.max_simultaneos = max(self.max_simultaneos, len(self.leases))
+            self.esperas.append(ahora - s.solicitado)
+            esperas = self.esperas_sucursal.get(s.node_id)
+            if esperas is None:
+                esperas = self.esperas_sucursal[s.node_id] = deque(maxlen=HISTORIAL_ESPERAS)
+            esperas.append(ahora - s.solicitado)
+            self.concedidos_sucursal[s.node_id] = self.concedidos_sucursal.get(s.node_id, 0) + 1
+            concesiones.append(s)
+        return concesiones
+
+    def _avisar(self, concesiones):
+        for s in concesiones:
+            self.rueda.programar(self.duracion, ('lease', s.token), self._vencer)
+            try:
+                self.conceder(s.node_id, s.token, self.duracion, s.solicitud)
+            except OSError as e:
+                print(f"Error al conceder el acceso al nodo {s.node_id}: {e}")
+
+    def _soltar(self, s):
+        # Llamar con self.lock tomado. Regresa las concesiones que se liberaron en cadena
+        del self.leases[s.token]
+        self.solicitudes.pop((s.node_id, s.solicitud), None)
+        for f in s.fragmentos:
+            self.titulares[f] = None
+        return self._conceder_listas(time.monotonic())
+
+    def liberar(self, node_id, token):
+        with self.lock:
+            s = self.leases.get(token)
+            if s is None or s.node_id != node_id:
+                return False  # Lease viejo o ajeno
+            concesiones = self._soltar(s)
+        self.rueda.cancelar(('lease', token))
+        self._avisar(concesiones)
+        return True
+
+    def _vencer(self, llave):
+        token = llave[1]
+        with self.lock:
+            s = self.leases.get(token)
+            if s is None:
+                return
+            restante = s.vence - time.monotonic()
+            if restante > 0:
+                # Se volvio a pedir despues de programar el vencimiento
+                self.rueda.programar(restante, llave, self._vencer)
+                return
+            print(f"Vencio el acceso del nodo {s.node_id} (token {token})")
+            self.vencidos += 1
+            concesiones = self._soltar(s)
+        self._avisar(concesiones)
+
+    def ocupado(self, items):
+        # Para la via optimista: alguien tiene o espera el candado de esos articulos
+        with self.lock:
+            return any(self.titulares[f] is not None or self.esperando[f]
+                       for f in fragmentos_de(items, self.num_fragmentos))
+
+    def vigente(self, token):
+        with self.lock:
+            return token in self.leases
+
+    def metricas(self):
+        with self.lock:
+            esperas = sorted(self.esperas)
+            transcurrido = time.monotonic() - self.inicio
+
+            def percentil(p, esperas=esperas):
+                if not esperas:
+                    return 0.0
+                return esperas[min(len(esperas) - 1, int(p / 100.0 * len(esperas)))] * 1000
+
+            en_cola = {}
+            for s in self.planificador.por_antiguedad:
+                en_cola[s.node_id] = en_cola.get(s.node_id, 0) + 1
+            por_sucursal = {}
+            for node_id in set(en_cola) | set(self.esperas_sucursal):
+                de_sucursal = sorted(self.esperas_sucursal.get(node_id, ()))
+                por_sucursal[node_id] = {
+                    'en_cola': en_cola.get(node_id, 0),
+                    'concedidos': self.concedidos_sucursal.get(node_id, 0),
+                    'espera_p50_ms': percentil(50, de_sucursal),
+                    'espera_p99_ms': percentil(99, de_sucursal),
+                }
+
+            return {
+                'leases': len(self.leases),
+                'pendientes': len(self.solicitudes) - len(self.leases),
+                'fragmentos_ocupados': sum(1 for t in self.titulares if t is not None),
+                'max_simultaneos': self.max_simultaneos,
+                'concedidos': self.concedidos,
+                'vencidos': self.vencidos,
+                'concesiones_por_s': self.concedidos / transcurrido if transcurrido > 0 else 0.0,
+                'espera_p50_ms': percentil(50),
+                'espera_p99_ms': percentil(99),
+                'urgentes': self.planificador.urgentes,
+                'por_sucursal': por_sucursal,
+            }
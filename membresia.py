@@ -0,0 +1,369 @@
+import math
+import random
+import threading
+import time
+
+from detector_fallas import RuedaTemporizadores, DetectorPhi, UMBRAL_PHI
+
+# Membresia por gossip al estilo SWIM
+# En cada periodo el nodo hace ping a un solo miembro (en orden aleatorio, recorriendo a
+# todos antes de repetir). Si no contesta a tiempo se pide a K miembros que lo intenten
+# por nosotros (ping indirecto) y si tampoco, se marca como sospechoso. Los cambios de
+# estado no se anuncian a todos: viajan pegados a los ping/ack que ya se mandan, cada uno
+# unas log(N) veces, asi el costo por nodo y por periodo no crece con el tamaño del grupo
+#
+# Un nodo nuevo solo necesita conocer alguna semilla (lista_ip_nodo) para unirse
+#
+# Ademas del ping, cada mensaje que llega de un miembro es un latido para un detector
+# phi-accrual (detector_fallas.py). Si su phi pasa umbral_phi se marca sospechoso sin esperar
+# a que le toque el ping; desde ahi sigue el mismo camino (desmentir o confirmar la caida).
+# umbral_phi=None deja solo los pings
+
+VIVO = 'vivo'
+SOSPECHOSO = 'sospechoso'
+CAIDO = 'caido'
+SALIO = 'salio'
+
+PERIODO = 1.0            # Segundos por ronda de ping
+TIEMPO_ACK = 0.3         # Espera del ack directo antes de pedir pings indirectos
+K_INDIRECTOS = 3
+MULT_SOSPECHA = 3        # Tiempo de sospecha = MULT * log2(N + 1) periodos
+MULT_DIFUSION = 3        # Cada actualizacion se pega a MULT * log2(N + 1) mensajes
+MAX_PIGGYBACK = 6        # Actualizaciones por mensaje; mantiene el datagrama chico
+MAX_MIEMBROS_UNION = 64  # Miembros que manda una semilla a quien se une
+MUESTRAS_PHI = 5         # Mensajes de un miembro antes de que su phi cuente para sospechar
+
+ACCIONES_MEMBRESIA = ('swim_ping', 'swim_ack', 'swim_ping_req', 'swim_unirse', 'swim_miembros', 'swim_salir')
+
+
+class Miembro:
+    __slots__ = ('ip', 'node_id', 'estado', 'incarnacion')
+
+    def __init__(self, ip, node_id, estado=VIVO, incarnacion=0):
+        self.ip = ip
+        self.node_id = node_id
+        self.estado = estado
+        self.incarnacion = incarnacion
+
+    def actualizacion(self):
+        return [self.ip, self.node_id, self.estado, self.incarnacion]
+
+
+def _gana(estado, incarnacion, actual):
+    # Reglas de precedencia de SWIM para decidir si una actualizacion reemplaza al estado actual
+    if actual.estado in (CAIDO, SALIO):
+        # Solo un nodo que regresa con una encarnacion nueva sale de caido
+        return estado == VIVO and incarnacion > actual.incarnacion
+    if estado in (CAIDO, SALIO):
+        return incarnacion >= actual.incarnacion
+    if estado == SOSPECHOSO:
+        return incarnacion > actual.incarnacion or (incarnacion == actual.incarnacion and actual.estado == VIVO)
+    return incarnacion > actual.incarnacion
+
+
+class Membresia:
+    def __init__(self, node_id, ip, enviar, semillas=None, al_unirse=None, al_caer=None, al_volver=None, rueda=None,
+                 umbral_phi=UMBRAL_PHI):
+        self.ip = ip
+        self.node_id = node_id
+        self.enviar = enviar  # funcion (ip, mensaje)
+        self.semillas = dict(semillas or {})  # ip -> node_id
+        self.al_unirse = al_unirse
+        self.al_caer = al_caer
+        self.al_volver = al_volver
+        self.rueda = rueda if rueda is not None else RuedaTemporizadores()
+        self.detector = None  # Detector phi-accrual, otra fuente de sospecha ademas del ping
+        if umbral_phi is not None:
+            self.detector = DetectorPhi(self._sospechar, umbral=umbral_phi, rueda=self.rueda, min_muestras=MUESTRAS_PHI)
+
+        self.yo = Miembro(ip, node_id)
+        self.miembros = {ip: self.yo}
+        self.difusiones = {}  # ip -> [actualizacion, veces que falta mandarla]
+        self.orden = []       # Siguientes objetivos de ping
+        self.seq = 0
+        self.esperando = {}   # seq -> Event del ack
+        self.reenvios = {}    # seq propio -> (ip, seq) de quien pidio el ping indirecto
+        self.lock = threading.Lock()
+        self.activo = True
+        # Metricas
+        self.pings = 0
+        self.indirectos = 0
+        self.sospechas = 0
+        self.sospechas_phi = 0
+        self.confirmadas = 0
+
+    # --- Consultas ---
+
+    def vivos(self):
+        with self.lock:
+            return [m.ip for m in self.miembros.values() if m.estado in (VIVO, SOSPECHOSO)]
+
+    def conocidos(self):
+        # Todos menos los que salieron a proposito; un nodo caido sigue contando para la mayoria
+        with self.lock:
+            return [m.ip for m in self.miembros.values() if m.estado != SALIO]
+
+    def otros(self):
+        return [ip for ip in self.vivos() if ip != self.ip]
+
+    def ip_de(self, node_id):
+        with self.lock:
+            for m in self.miembros.values():
+                if m.node_id == node_id:
+                    return m.ip
+        for ip, n in self.semillas.items():
+            if n == node_id:
+                return ip
+        raise KeyError(node_id)
+
+    def id_de(self, ip):
+        with self.lock:
+            m = self.miembros.get(ip)
+            if m is not None:
+                return m.node_id
+        return self.semillas.get(ip)
+
+    def estados(self):
+        with self.lock:
+            return {m.ip: (m.node_id, m.estado, m.incarnacion) for m in self.miembros.values()}
+
+    def niveles(self):
+        # phi de cada miembro: mientras mas alto, mas probable que este caido
+        return self.detector.niveles() if self.detector is not None else {}
+
+    def metricas(self):
+        niveles = self.niveles()
+        with self.lock:
+            por_estado = {}
+            for m in self.miembros.values():
+                por_estado[m.estado] = por_estado.get(m.estado, 0) + 1
+            return {
+                'miembros': por_estado,
+                'difusiones_pendientes': len(self.difusiones),
+                'pings': self.pings,
+                'indirectos': self.indirectos,
+                'sospechas': self.sospechas,
+                'sospechas_phi': self.sospechas_phi,
+                'confirmadas': self.confirmadas,
+                'phi': niveles,
+            }
+
+    # --- Difusion de actualizaciones ---
+
+    def _veces(self):
+        return max(1, math.ceil(MULT_DIFUSION * math.log2(len(self.miembros) + 1)))
+
+    def _difundir(self, miembro):
+        # Llamar con self.lock tomado; una actualizacion nueva de un nodo reemplaza a la anterior
+        self.difusiones[miembro.ip] = [miembro.actualizacion(), self._veces()]
+
+    def _piggyback(self):
+        with self.lock:
+            # Primero las nuestras (desmentir una sospecha es urgente) y luego las que menos se han mandado
+            elegidas = sorted(self.difusiones.items(), key=lambda e: (e[0] != self.ip, -e[1][1]))[:MAX_PIGGYBACK]
+            salida = []
+            for ip, entrada in elegidas:
+                salida.append(entrada[0])
+                entrada[1] -= 1
+                if entrada[1] <= 0:
+                    del self.difusiones[ip]
+            return salida
+
+    def _mandar(self, ip, mensaje):
+        mensaje['actualizaciones'] = self._piggyback()
+        with self.lock:
+            destino = self.miembros.get(ip)
+            if destino is not None and destino.estado == CAIDO:
+                # Un nodo que damos por caido nos sigue hablando: se le dice para que lo desmienta
+                mensaje['actualizaciones'].append(destino.actualizacion())
+        try:
+            self.enviar(ip, mensaje)
+        except OSError as e:
+            print(f"Error al enviar {mensaje['action']} a {ip}: {e}")
+
+    def aplicar(self, actualizaciones, difundir=True):
+        # difundir=False para la lista que manda una semilla: el resto del grupo ya la conoce
+        eventos = []
+        with self.lock:
+            for ip, node_id, estado, incarnacion in actualizaciones:
+                if ip == self.ip:
+                    if self.activo and estado != VIVO and incarnacion >= self.yo.incarnacion:
+                        # Nos creen sospechosos o caidos: se desmiente con una encarnacion nueva
+                        self.yo.incarnacion = incarnacion + 1
+                        self._difundir(self.yo)
+                    continue
+                actual = self.miembros.get(ip)
+                if actual is None:
+                    if estado in (CAIDO, SALIO):
+                        continue
+                    actual = self.miembros[ip] = Miembro(ip, node_id, estado, incarnacion)
+                    if difundir:
+                        self._difundir(actual)
+                    eventos.append((self.al_unirse, ip))
+                    if estado == SOSPECHOSO:
+                        self._programar_sospecha(actual)
+                    continue
+                if not _gana(estado, incarnacion, actual):
+                    continue
+                anterior = actual.estado
+                actual.node_id = node_id
+                actual.estado = estado
+                actual.incarnacion = incarnacion
+                self._difundir(actual)
+                if estado == SOSPECHOSO:
+                    self._programar_sospecha(actual)
+                elif estado in (CAIDO, SALIO) and anterior not in (CAIDO, SALIO):
+                    eventos.append((self._olvidar, ip))
+                    eventos.append((self.al_caer, ip))
+                elif estado == VIVO and anterior in (CAIDO, SALIO):
+                    eventos.append((self.al_volver, ip))
+        # Los avisos al nodo se hacen fuera del lock
+        for funcion, ip in eventos:
+            if funcion is not None:
+                funcion(ip)
+
+    # --- Sospecha ---
+
+    def _programar_sospecha(self, miembro):
+        # Llamar con self.lock tomado. Si nadie lo desmiente en este tiempo se da por caido
+        tiempo = MULT_SOSPECHA * math.log2(len(self.miembros) + 1) * PERIODO
+        self.rueda.programar(tiempo, ('sospecha', miembro.ip), self._confirmar)
+
+    def _sospechar(self, ip, por_phi=True):
+        # Lo llama el detector phi (por_phi) o la ronda de ping cuando no llego ningun ack
+        with self.lock:
+            m = self.miembros.get(ip)
+            if m is None or m.estado != VIVO:
+                return
+            self.sospechas += 1
+            if por_phi:
+                self.sospechas_phi += 1
+            m.estado = SOSPECHOSO
+            self._difundir(m)
+            self._programar_sospecha(m)
+        print(f"Nodo sospechoso: {ip}")
+
+    def _olvidar(self, ip):
+        # Si regresa, su ventana de llegadas empieza de nuevo
+        if self.detector is not None:
+            self.detector.olvidar(ip)
+
+    def _confirmar(self, llave):
+        ip = llave[1]
+        with self.lock:
+            m = self.miembros.get(ip)
+            if m is None or m.estado != SOSPECHOSO:
+                return  # Se desmintio a tiempo
+            self.confirmadas += 1
+            m.estado = CAIDO
+            self._difundir(m)
+        self._olvidar(ip)
+        if self.al_caer is not None:
+            self.al_caer(ip)
+
+    # --- Protocolo ---
+
+    def _siguiente_objetivo(self):
+        with self.lock:
+            while self.orden:
+                ip = self.orden.pop()
+                m = self.miembros.get(ip)
+                if m is not None and m.estado in (VIVO, SOSPECHOSO):
+                    return ip
+            candidatos = [m.ip for m in self.miembros.values() if m.ip != self.ip and m.estado in (VIVO, SOSPECHOSO)]
+            if not candidatos:
+                return None
+            random.shuffle(candidatos)
+            self.orden = candidatos
+            return self.orden.pop()
+
+    def _nuevo_seq(self):
+        with self.lock:
+            self.seq += 1
+            evento = threading.Event()
+            self.esperando[self.seq] = evento
+            return self.seq, evento
+
+    def ronda(self):
+        objetivo = self._siguiente_objetivo()
+        if objetivo is None:
+            self.unirse()  # Todavia no conocemos a nadie
+            return
+        seq, evento = self._nuevo_seq()
+        try:
+            self.pings += 1
+            self._mandar(objetivo, {'action': 'swim_ping', 'seq': seq, 'node_id': self.node_id})
+            if evento.wait(TIEMPO_ACK):
+                return
+            with self.lock:
+                ayudantes = [m.ip for m in self.miembros.values()
+                             if m.ip not in (self.ip, objetivo) and m.estado == VIVO]
+            for ip in random.sample(ayudantes, min(K_INDIRECTOS, len(ayudantes))):
+                self.indirectos += 1
+                self._mandar(ip, {'action': 'swim_ping_req', 'seq': seq, 'objetivo': objetivo})
+            if not evento.wait(PERIODO - TIEMPO_ACK):
+                self._sospechar(objetivo, por_phi=False)
+        finally:
+            with self.lock:
+                self.esperando.pop(seq, None)
+
+    def correr(self):
+        while self.activo:
+            inicio = time.monotonic()
+            self.ronda()
+            espera = PERIODO - (time.monotonic() - inicio)
+            if espera > 0:
+                time.sleep(espera)
+
+    def unirse(self):
+        for ip in self.semillas:
+            if ip != self.ip:
+                self._mandar(ip, {'action': 'swim_unirse', 'miembro': self.yo.actualizacion()})
+
+    def salir(self):
+        # Salida voluntaria: se anuncia a unos cuantos y el gossip hace el resto
+        self.activo = False
+        with self.lock:
+            self.yo.estado = SALIO
+            self._difundir(self.yo)
+            otros = [m.ip for m in self.miembros.values() if m.ip != self.ip and m.estado == VIVO]
+        for ip in random.sample(otros, min(K_INDIRECTOS + 1, len(otros))):
+            self._mandar(ip, {'action': 'swim_salir'})
+
+    def recibir(self, mensaje, ip):
+        if self.detector is not None and ip != self.ip:
+            self.detector.latido(ip)
+        self.aplicar(mensaje.get('actualizaciones', []))
+        accion = mensaje.get('action')
+        if accion == 'swim_ping':
+            self._mandar(ip, {'action': 'swim_ack', 'seq': mensaje.get('seq')})
+        elif accion == 'swim_ack':
+            with self.lock:
+                evento = self.esperando.get(mensaje.get('seq'))
+                origen = self.reenvios.pop(mensaje.get('seq'), None)
+            if evento is not None:
+                evento.set()
+            if origen is not None:
+                # Era un ping indirecto: el ack se pasa a quien lo pidio
+                self._mandar(origen[0], {'action': 'swim_ack', 'seq': origen[1]})
+        elif accion == 'swim_ping_req':
+            with self.lock:
+                self.seq += 1
+                seq = self.seq
+                self.reenvios[seq] = (ip, mensaje.get('seq'))
+                if len(self.reenvios) > 1024:
+                    # Pedidos cuyo ack nunca llego
+                    for viejo in list(self.reenvios)[:512]:
+                        del self.reenvios[viejo]
+            self._mandar(mensaje['objetivo'], {'action': 'swim_ping', 'seq': seq, 'node_id': self.node_id})
+        elif accion == 'swim_unirse':
+            self.aplicar([mensaje['miembro']])
+            with self.lock:
+                # Si lo teniamos por caido se le manda su estado para que lo desmienta
+                conocidos = [m.actualizacion() for m in self.miembros.values()
+                             if m.estado in (VIVO, SOSPECHOSO) or m.ip == ip]
+            random.shuffle(conocidos)
+            self._mandar(ip, {'action': 'swim_miembros', 'miembros': conocidos[:MAX_MIEMBROS_UNION]})
+        elif accion == 'swim_miembros':
+            self.aplicar(mensaje.get('miembros', []), difundir=False)
+        # swim_salir solo trae la actualizacion, que ya se aplico arriba
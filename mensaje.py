@@ -1,9 +1,11 @@
 import socket
 import threading
 import time
+from registro_mensajes import RegistroMensajes
 #Prueba para git
 
-mensajes_para_guardar = []
+# Los mensajes se guardan por lotes en logMensajes.txt desde un hilo aparte
+registro_mensajes = RegistroMensajes("logMensajes.txt")
 
 class Nodo:
     def __init__(self):
@@ -21,7 +23,7 @@ def recibir_mensajes():
             mensaje_decodificado = mensaje_recibido.decode('utf-8')
             timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
             mensaje_completo = f"{timestamp} - Mensaje RECIBIDO de {direccion}: {mensaje_decodificado}"
-            mensajes_para_guardar.append(mensaje_completo)
+            registro_mensajes.registrar(mensaje_completo)
             #print(mensaje_completo)
             
             if not mensaje_confirmado:
@@ -34,14 +36,6 @@ def recibir_mensajes():
             mensaje_confirmado = False
 
 
-def guardar_mensajes():
-    while True:
-        if mensajes_para_guardar:
-            mensaje_para_guardar = mensajes_para_guardar.pop(0)
-            with open("logMensajes.txt", "a") as log_file:
-                log_file.write(mensaje_para_guardar + "\n")
-            time.sleep(1)  # Espera un segundo antes de intentar guardar el siguiente mensaje
-
 def enviar_mensajes():
     while True:
         destino_ip = input("Ingrese la dirección IP de destino: ")
@@ -53,7 +47,7 @@ def enviar_mensajes():
         # Envía el mensaje a la dirección IP de destino especificada
         destino_puerto = 12345  # Se queda en 12345 para que no haya fallas
         s.sendto(mensaje.encode('utf-8'), (destino_ip, destino_puerto))
-        mensajes_para_guardar.append(mensaje_completo)
+        registro_mensajes.registrar(mensaje_completo)
 
 
 # Configura la dirección y el puerto en esta máquina virtual
@@ -65,20 +59,18 @@ s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 s.bind((mi_ip, mi_puerto))
 s.settimeout(1)
 
-# Crea hilos para recibir, enviar y guardar mensajes
+# Crea hilos para recibir y enviar mensajes
 thread_recibir = threading.Thread(target=recibir_mensajes)
 thread_enviar = threading.Thread(target=enviar_mensajes)
-thread_guardar = threading.Thread(target=guardar_mensajes)
 
 # Que corran en segundo plano
 thread_recibir.daemon = True
 thread_enviar.daemon = True
-thread_guardar.daemon = True
 
 # Los inicializa
 thread_recibir.start()
 thread_enviar.start()
-thread_guardar.start()
+registro_mensajes.iniciar()
 
 # El programa principal no hace nada más que esperar
 while True:
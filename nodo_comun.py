@@ -0,0 +1,276 @@
+import json
+import random
+import socket
+import threading
+import time
+
+from servidor_async import ServidorUDPAsincrono
+from despachador import Despachador, accion
+from codec import Codec
+from almacen import AlmacenInventario, NUM_SUCURSALES, columna
+from diario import DiarioMensajes
+from bitacora import BitacoraEscritura, recuperar, aplicar_entradas
+from sincronizacion import VersionesInventario, lotes, nodo_de_version, SYNC_INTERVAL, RONDAS_POR_DIGEST
+from fragmentos import TAM_BUFFER, Reensamblador, TransferenciasEnviadas, fragmentar_inventario
+from enviador import Enviador
+from distribucion import repartir
+
+# Logica del nodo compartida por programa_lider.py y proyecto.py
+# NodoComun es la clase base de los dos Node: servidor (bloqueante o asyncio) con el
+# despachador, negociacion del codec, inventario en fragmentos, sincronizacion por
+# diferencias, bitacora y los comandos de consulta. Cada Node pone lo suyo:
+#  - enviar_mensaje(direccion, mensaje) y get_node_address(node_id)
+#  - otros_nodos(): ids de los demas nodos a los que se les puede sincronizar
+#  - sucursales_caidas(): ids que no cuentan para el reparto (capacidad 0)
+#  - aplicar_replicado(entradas) si lo que llega de otros nodos se aplica distinto
+
+
+class NodoComun:
+    def preparar_comun(self, node_id, servidor_asincrono):
+        # Llamar desde Node.__init__, despues de crear self.inventory
+        self.servidor_asincrono = servidor_asincrono  # Usar el servidor asyncio en lugar del ciclo bloqueante
+        self.servidor = None
+        self.codec = Codec(node_id)  # Formato de mensajes acordado con cada nodo (JSON o binario)
+        self.reensamblador = Reensamblador()  # Inventarios que estamos recibiendo en fragmentos
+        self.transferencias = TransferenciasEnviadas()  # Fragmentos enviados, para reenvios
+        self.versiones = VersionesInventario(self.inventory, node_id)  # Versiones por articulo y columna InvN
+        self.capacidades = {node_id: self.capacity}  # node_id -> capacidad de cada sucursal conocida
+        self.versiones_vistas = {}  # IP -> {nodo de origen -> version mas alta recibida de ese IP}
+        self.lock_vistas = threading.Lock()  # Los manejadores corren en paralelo con el servidor asyncio
+        self.registro_mensajes = DiarioMensajes("logMensajes.jsonl")  # Diario de mensajes con indice por tiempo y por nodo
+        self.bitacora = None  # Bitacora de cambios de inventario, se abre en abrir()
+        self.despachador = Despachador(self)  # Tabla accion -> manejador, armada una sola vez
+        self.despachador.observador = self.anotar_recibido
+
+    def abrir(self, host):
+        # Primera parte de Node.start: inventario recuperado, bitacora, diario y el socket
+        self.host = host
+        self.port = 5000
+        inventario, ultimo_lsn = recuperar()  # Snapshot (o inventario.json la primera vez) + re-aplicar la bitacora
+        self.inventory = AlmacenInventario(inventario)
+        self.versiones = VersionesInventario(self.inventory, self.node_id)
+        self.bitacora = BitacoraEscritura(self.inventory.a_dict, ultimo_lsn)
+        self.registro_mensajes.iniciar()
+
+        # Un solo socket en el puerto del servidor para recibir y para todos los envios
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((self.host, self.port))
+        self.enviador = Enviador(self.socket)
+        self.enviador_thread = threading.Thread(target=self.enviador.correr)
+        self.enviador_thread.start()
+
+    def iniciar_servidor(self):
+        if self.servidor_asincrono:
+            self.server_thread = threading.Thread(target=self.start_server_async)
+        else:
+            self.server_thread = threading.Thread(target=self.start_server)
+        self.server_thread.start()
+
+    def start_server(self):
+        while True:
+            mensaje_recibido, direccion = self.socket.recvfrom(TAM_BUFFER)
+            self.procesar_datagrama(mensaje_recibido, direccion)
+
+    def start_server_async(self):
+        # Mismas acciones que start_server, pero los manejadores corren concurrentemente
+        self.servidor = ServidorUDPAsincrono(self.procesar_datagrama)
+        self.servidor.correr(sock=self.socket)
+
+    def procesar_datagrama(self, mensaje_recibido, direccion):
+        # La accion se resuelve en la tabla del despachador (ver @accion en los manejadores)
+        self.despachador.despachar(mensaje_recibido, direccion)
+
+    def metricas_servidor(self):
+        # Profundidad de la cola de recepcion y trabajo en vuelo (solo en modo asincrono)
+        if self.servidor is None:
+            return None
+        return self.servidor.metricas()
+
+    def anotar_recibido(self, mensaje, direccion):
+        self.registro_mensajes.registrar_evento('RECIBIDO', direccion[0], mensaje)
+
+    @accion('codec_hola')
+    def handle_codec_hola(self, message, direccion):
+        version = self.codec.acordar(direccion[0], message.get('versiones', []))
+        respuesta = {'action': 'codec_acepta', 'node_id': self.node_id, 'version': version}
+        # La respuesta va en JSON para que el otro nodo la entienda aunque no haya acordado aun
+        self.enviador.enviar(json.dumps(respuesta).encode('utf-8'), direccion)
+
+    @accion('codec_acepta')
+    def handle_codec_acepta(self, message, direccion):
+        version = message.get('version')
+        self.codec.acordar(direccion[0], [version] if version is not None else [])
+
+    def metricas_acciones(self):
+        # Contadores e histogramas de latencia por accion
+        return self.despachador.metricas()
+
+    @accion('get_inventory')
+    def handle_get_inventory(self, message, client_address):
+        # Enviar el inventario al nodo cliente, en fragmentos que caben en un datagrama
+        transfer_id = message.get('id', 0)
+        fragmentos = fragmentar_inventario(self.inventory, transfer_id)
+        self.transferencias.guardar((client_address[0], transfer_id), fragmentos)
+        for fragmento in fragmentos:
+            self.enviar_mensaje((client_address[0], self.port), fragmento)
+
+    @accion('inventory_resend')
+    def handle_inventory_resend(self, message, client_address):
+        # Reenvio selectivo: solo los fragmentos que le faltan al receptor
+        transfer_id = message.get('id', 0)
+        fragmentos = self.transferencias.obtener((client_address[0], transfer_id), message.get('faltan'))
+        if fragmentos is None:
+            # Ya no se tiene la transferencia, se vuelve a generar completa
+            self.handle_get_inventory(message, client_address)
+            return
+        for fragmento in fragmentos:
+            self.enviar_mensaje((client_address[0], self.port), fragmento)
+
+    @accion('inventory_chunk')
+    def handle_inventory_chunk(self, message, direccion=None):
+        self.reensamblador.recibir(message)
+
+    def sync_loop(self):
+        # Cada ronda se piden los cambios nuevos a un nodo al azar; cada tanto se compara el
+        # resumen completo para recuperar cambios que se hayan perdido
+        ronda = 0
+        while True:
+            time.sleep(SYNC_INTERVAL)
+            otros = self.otros_nodos()
+            if not otros:
+                continue
+            node_id = random.choice(otros)
+            ronda += 1
+            try:
+                if ronda % RONDAS_POR_DIGEST == 0:
+                    self.sincronizar(node_id)
+                else:
+                    self.pedir_cambios(node_id)
+            except OSError as e:
+                print(f"Error al sincronizar con el nodo {node_id}: {e}")
+
+    def sincronizar(self, node_id):
+        raiz, hojas = self.versiones.digest()
+        self.enviar_mensaje(self.get_node_address(node_id), {'action': 'sync_digest', 'raiz': raiz, 'hojas': hojas})
+
+    def pedir_cambios(self, node_id):
+        direccion = self.get_node_address(node_id)
+        with self.lock_vistas:
+            # Las llaves van como texto (JSON y el codec binario no llevan llaves enteras)
+            desde = {str(n): v for n, v in self.versiones_vistas.get(direccion[0], {}).items()}
+        self.enviar_mensaje(direccion, {'action': 'sync_desde', 'desde': desde})
+
+    def enviar_cambios(self, direccion, entradas, pedir=None):
+        primero = True
+        for lote in lotes(entradas) if entradas else [[]]:
+            mensaje = {'action': 'sync_delta', 'entradas': lote}
+            if primero and pedir:
+                mensaje['pedir'] = pedir
+            primero = False
+            self.enviar_mensaje(direccion, mensaje)
+
+    @accion('sync_digest')
+    def handle_sync_digest(self, message, direccion):
+        raiz, _ = self.versiones.digest()
+        if message.get('raiz') == raiz:
+            return  # Ya estamos de acuerdo, no hay nada que mandar
+        distintas = self.versiones.cubetas_distintas(message.get('hojas', []))
+        # Se mandan nuestras entradas de esas cubetas y se piden las del otro nodo
+        self.enviar_cambios((direccion[0], self.port), self.versiones.entradas_de_cubetas(distintas), pedir=distintas)
+
+    @accion('sync_desde')
+    def handle_sync_desde(self, message, direccion):
+        desde = {int(n): v for n, v in (message.get('desde') or {}).items()}
+        entradas = self.versiones.cambios_desde(desde)
+        self.enviar_cambios((direccion[0], self.port), entradas)
+
+    @accion('sync_delta')
+    def handle_sync_delta(self, message, direccion):
+        # Lo que gana se anota en la bitacora, igual que un cambio local (ver aplicar_replicado)
+        self.aplicar_replicado(message.get('entradas', []))
+        peer = direccion[0]
+        with self.lock_vistas:
+            vistas = self.versiones_vistas.setdefault(peer, {})
+            for entrada in message.get('entradas', []):
+                origen = nodo_de_version(entrada['version'])
+                if entrada['version'] > vistas.get(origen, 0):
+                    vistas[origen] = entrada['version']
+        if message.get('pedir'):
+            # Sin 'pedir' en la respuesta para no rebotar indefinidamente
+            self.enviar_cambios((peer, self.port), self.versiones.entradas_de_cubetas(message['pedir']))
+
+    def aplicar_replicado(self, entradas):
+        # Entradas que llegan de otros nodos; programa_lider.py tambien las recibe del log
+        aplicar_entradas(entradas, self.inventory, self.versiones, self.bitacora)
+
+    @accion('capacidad')
+    def handle_capacidad(self, message, direccion=None):
+        self.capacidades[message.get('node_id')] = message.get('capacidad', 0)
+
+    def anunciar_capacidad(self, node_ip):
+        self.enviar_mensaje((node_ip, self.port), {'action': 'capacidad', 'node_id': self.node_id, 'capacidad': self.capacity})
+
+    def sucursales_caidas(self):
+        return set()
+
+    def capacidades_sucursales(self):
+        # Capacidad de cada sucursal; las caidas o desconocidas cuentan como 0
+        caidas = self.sucursales_caidas()
+        capacidades = [0] * NUM_SUCURSALES
+        for node_id, capacidad in self.capacidades.items():
+            if node_id not in caidas and 1 <= node_id <= NUM_SUCURSALES:
+                capacidades[node_id - 1] = capacidad
+        return capacidades
+
+    def calcular_reparto(self, items):
+        # Regresa (entradas, (unidades asignadas, unidades que no cupieron)) sin aplicar nada
+        capacidades = self.capacidades_sucursales()
+        entradas = []
+        with self.bitacora.lock:
+            ids = sorted(self.inventory) if items is None else [i for i in items if i in self.inventory]
+            asignacion, sin_espacio = repartir(self.inventory.sin_asignar(ids), self.inventory.ocupacion(), capacidades)
+            for item_id, fila in zip(ids, asignacion):
+                for i, unidades in enumerate(fila):
+                    if not unidades:
+                        continue
+                    campo = columna(i + 1)
+                    entradas.append({'item': item_id, 'campo': campo, 'valor': self.inventory.valor(item_id, campo) + unidades,
+                                     'version': self.versiones.nueva_version()})
+        return entradas, (sum(map(sum, asignacion)), sum(sin_espacio))
+
+    def send_token(self, recipient_id, token, lease=None, solicitud=None):
+        recipient_address = self.get_node_address(recipient_id)
+        message = {'action': 'token', 'token': token, 'lease': lease, 'solicitud': solicitud}
+        self.enviar_mensaje(recipient_address, message)
+
+    def token_handler(self):
+        # Las concesiones son inmediatas; este hilo solo vence los leases de titulares caidos
+        self.gestor_tokens.rueda.correr()
+
+    def buscar(self, filtros):
+        # filtros: lista de "categoria=Calzado", "min=100", "max=2000", "sucursal=3"
+        criterios = {}
+        nombres = {'categoria': 'categoria', 'min': 'precio_min', 'max': 'precio_max', 'sucursal': 'sucursal'}
+        for filtro in filtros:
+            llave, _, valor = filtro.partition('=')
+            try:
+                criterios[nombres[llave]] = valor if llave == 'categoria' else int(valor)
+            except (KeyError, ValueError):
+                print(f"Filtro no valido: {filtro}")
+                return
+        for a in self.inventory.buscar(**criterios):
+            existencias = " ".join(f"{n}" for n in a.inv)
+            print(f"{a.id:<6}{a.articulo:<20}{a.categoria:<18}{a.precio:>8}  {existencias}")
+
+    def leer_cantidad(self, item_id, cantidad):
+        try:
+            cantidad = int(cantidad)
+        except ValueError:
+            cantidad = 0
+        if cantidad <= 0:
+            print("La cantidad debe ser un entero positivo")
+            return None
+        if item_id not in self.inventory:
+            print(f"No existe el articulo {item_id}")
+            return None
+        return cantidad
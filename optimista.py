@@ -0,0 +1,79 @@
+import threading
+
+# Compras optimistas (compare-and-set) contra el nodo maestro
+# La sucursal manda buy_item con la version que conoce de la columna InvN del articulo y el
+# maestro solo lo aplica si la columna sigue en esa version: una ida y vuelta por venta.
+# Si alguien la cambio antes (conflicto) se repite por la via con token (pedir acceso,
+# comprar, liberar). Cada sucursal lleva la tasa de conflictos por articulo y, para los
+# articulos muy disputados, se va directo por la via con token
+
+OK = 'ok'
+CONFLICTO = 'conflicto'
+SIN_EXISTENCIAS = 'sin_existencias'
+VENCIDO = 'vencido'   # El token ya no era vigente cuando llego la compra
+
+MODO_OPTIMISTA = 'optimista'
+MODO_TOKEN = 'token'
+
+UMBRAL_CONFLICTOS = 0.3   # Arriba de esta tasa conviene pedir el token desde el principio
+MIN_INTENTOS = 10         # Intentos antes de confiar en la tasa
+PESO_RECIENTE = 0.1       # Promedio movil: los ultimos intentos pesan mas que los viejos
+REINTENTO_OPTIMISTA = 50  # Cada tantas ventas en modo token se vuelve a probar el optimista
+
+
+class ConflictosArticulo:
+    __slots__ = ('intentos', 'conflictos', 'tasa', 'en_token')
+
+    def __init__(self):
+        self.intentos = 0
+        self.conflictos = 0
+        self.tasa = 0.0
+        self.en_token = 0   # Ventas seguidas por la via con token
+
+
+class EstadisticasConflicto:
+    def __init__(self, umbral=UMBRAL_CONFLICTOS):
+        self.umbral = umbral
+        self.articulos = {}
+        self.lock = threading.Lock()
+
+    def registrar(self, item_id, conflicto):
+        with self.lock:
+            a = self.articulos.get(item_id)
+            if a is None:
+                a = self.articulos[item_id] = ConflictosArticulo()
+            a.intentos += 1
+            a.en_token = 0
+            if conflicto:
+                a.conflictos += 1
+            a.tasa += PESO_RECIENTE * ((1.0 if conflicto else 0.0) - a.tasa)
+
+    def modo(self, item_id):
+        with self.lock:
+            a = self.articulos.get(item_id)
+            if a is None or a.intentos < MIN_INTENTOS or a.tasa <= self.umbral:
+                return MODO_OPTIMISTA
+            a.en_token += 1
+            if a.en_token >= REINTENTO_OPTIMISTA:
+                # De vez en cuando se prueba de nuevo por si ya bajo la disputa
+                return MODO_OPTIMISTA
+            return MODO_TOKEN
+
+    def tasa(self, item_id):
+        with self.lock:
+            a = self.articulos.get(item_id)
+            return a.tasa if a is not None else 0.0
+
+    def metricas(self, limite=20):
+        # Los articulos con mas conflictos primero
+        with self.lock:
+            filas = sorted(self.articulos.items(), key=lambda e: -e[1].tasa)[:limite]
+            return {
+                item_id: {
+                    'intentos': a.intentos,
+                    'conflictos': a.conflictos,
+                    'tasa_reciente': a.tasa,
+                    'modo': MODO_TOKEN if a.intentos >= MIN_INTENTOS and a.tasa > self.umbral else MODO_OPTIMISTA,
+                }
+                for item_id, a in filas
+            }
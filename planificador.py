@@ -0,0 +1,141 @@
+from collections import deque
+
+# Orden en que el maestro concede los accesos pendientes (lo usa GestorTokens)
+# Antes cada fragmento tenia su cola FIFO y un reabasto grande de una sucursal podia dejar
+# esperando a las ventas de un articulo detras de el. Ahora:
+#  - Clases de prioridad: las ventas (CLASE_VENTA) van antes que los reabastos y los
+#    accesos a todo el catalogo
+#  - Dentro de cada clase, deficit round robin por sucursal: en su turno cada sucursal junta
+#    QUANTUM de credito y cada concesion le cuesta los fragmentos que bloquea, asi una
+#    sucursal con muchas peticiones (o muy grandes) no acapara a las demas. Si en su turno
+#    no tiene nada que se pueda conceder conserva su credito y, cuando le alcanza, su primera
+#    solicitud aparta sus fragmentos conforme se liberan (una reserva a la vez, que respetan
+#    todas las clases) y la sucursal conserva el turno hasta que se la conceden. Asi un
+#    reabasto de muchos fragmentos no espera a que las ventas los dejen todos libres a la vez
+#  - Espera maxima: una solicitud que lleva mas de ESPERA_MAXIMA segundos se vuelve urgente y
+#    pasa antes que todo; sus fragmentos se reservan para que nadie mas los tome mientras
+#    espera a que se liberen. Las urgentes se atienden por antiguedad
+# Solo se consideran las solicitudes que se pueden conceder ya (todos sus fragmentos libres)
+
+CLASE_VENTA = 0
+CLASE_REABASTO = 1
+CLASE_GLOBAL = 2
+CLASES = (CLASE_VENTA, CLASE_REABASTO, CLASE_GLOBAL)
+
+QUANTUM = 4            # Credito (en fragmentos) que recibe una sucursal en cada turno
+ESPERA_MAXIMA = 0.5    # Segundos antes de que una solicitud se vuelva urgente
+
+
+class Planificador:
+    def __init__(self, quantum=QUANTUM, espera_maxima=ESPERA_MAXIMA):
+        self.quantum = quantum
+        self.espera_maxima = espera_maxima
+        self.colas = {}                           # (clase, sucursal) -> [solicitudes] en orden de llegada
+        self.activos = {c: deque() for c in CLASES}  # clase -> sucursales con algo pendiente
+        self.deficit = {}                         # (clase, sucursal) -> credito acumulado
+        self.en_turno = {}                        # clase -> sucursal a la que ya se le dio su quantum
+        self.reserva = None                       # Solicitud que aparta sus fragmentos (ver _drr)
+        self.por_antiguedad = []                  # Todas las pendientes, en orden de llegada
+        # Metricas
+        self.urgentes = 0
+
+    def __len__(self):
+        return len(self.por_antiguedad)
+
+    def agregar(self, s):
+        llave = (s.clase, s.node_id)
+        cola = self.colas.get(llave)
+        if cola is None:
+            cola = self.colas[llave] = []
+            self.activos[s.clase].append(s.node_id)
+            self.deficit[llave] = 0
+        cola.append(s)
+        self.por_antiguedad.append(s)
+
+    def quitar(self, s):
+        llave = (s.clase, s.node_id)
+        cola = self.colas.get(llave)
+        if cola is None or s not in cola:
+            return
+        cola.remove(s)
+        self.por_antiguedad.remove(s)
+        if self.reserva is s:
+            self.reserva = None
+        if not cola:
+            # Sin pendientes la sucursal sale de la ronda y pierde su credito
+            del self.colas[llave]
+            del self.deficit[llave]
+            self.activos[s.clase].remove(s.node_id)
+            if self.en_turno.get(s.clase) == s.node_id:
+                self.en_turno[s.clase] = None
+
+    def elegir(self, libre, ahora):
+        # libre(fragmentos) dice si se pueden tomar. Regresa la siguiente solicitud a conceder o None
+        reservados = set()
+        for s in self.por_antiguedad:
+            if ahora - s.solicitado <= self.espera_maxima:
+                break  # Las demas llegaron despues
+            if not reservados.intersection(s.fragmentos) and libre(s.fragmentos):
+                self.urgentes += 1
+                return s
+            reservados.update(s.fragmentos)
+
+        def lista(s):
+            # La reserva vale para todas las clases: las ventas siguen pasando primero con los
+            # fragmentos libres, pero no le ganan a un reabasto los que ya aparto
+            r = self.reserva
+            if r is not None and r is not s and not set(r.fragmentos).isdisjoint(s.fragmentos):
+                return False
+            return not reservados.intersection(s.fragmentos) and libre(s.fragmentos)
+
+        for clase in CLASES:
+            s = self._drr(clase, lista)
+            if s is not None:
+                return s
+        return None
+
+    def _drr(self, clase, lista):
+        cola = self.activos[clase]
+        if not cola:
+            return None
+        # Cada paso le da el turno a la cabeza de la ronda. Si no hay nada listo en la clase se da
+        # un solo paso (asi la cabeza puede apartar sus fragmentos); si hay, se sigue hasta
+        # conceder: cada vuelta le suma un quantum a quien lo tiene, asi que termina
+        while True:
+            sucursal = cola[0]
+            llave = (clase, sucursal)
+            if self.en_turno.get(clase) != sucursal:
+                self.deficit[llave] += self.quantum
+                self.en_turno[clase] = sucursal
+            pendientes = self.colas[llave]
+            s = next((x for x in pendientes if lista(x)), None)
+            if s is not None and len(s.fragmentos) <= self.deficit[llave]:
+                self.deficit[llave] -= len(s.fragmentos)
+                return s
+            if s is None:
+                # Nada listo: conserva su credito (hasta lo que cuesta su primera solicitud) y,
+                # si ya le alcanza y nadie mas aparto, esa solicitud aparta sus fragmentos
+                primera = pendientes[0]
+                costo = len(primera.fragmentos)
+                self.deficit[llave] = min(self.deficit[llave], max(self.quantum, costo))
+                if self.reserva is None and costo <= self.deficit[llave]:
+                    self.reserva = primera
+                if self.reserva is primera:
+                    # Conserva el turno hasta que se liberen; mientras, pasan las demas sucursales
+                    # que no necesitan esos fragmentos, con el credito que ya tengan
+                    return self._relleno(clase, lista)
+            cola.rotate(-1)
+            self.en_turno[clase] = None
+            if not any(lista(x) for sucursal in cola for x in self.colas[(clase, sucursal)]):
+                return None
+
+    def _relleno(self, clase, lista):
+        for i, sucursal in enumerate(self.activos[clase]):
+            if i == 0:
+                continue  # La cabeza, que espera su reserva
+            llave = (clase, sucursal)
+            s = next((x for x in self.colas[llave] if lista(x)), None)
+            if s is not None:
+                self.deficit[llave] = max(0, self.deficit[llave] - len(s.fragmentos))
+                return s
+        return None
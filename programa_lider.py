@@ -1,13 +1,42 @@
 import socket
+import sys
 import threading
 import time
 import json
 import random
-from collections import deque
-from queue import Queue
+from collections import OrderedDict
+from nodo_comun import NodoComun
+from despachador import accion
+from almacen import AlmacenInventario, columna
+from membresia import Membresia, ACCIONES_MEMBRESIA
+from detector_fallas import UMBRAL_PHI
+from eleccion import Eleccion, ACCIONES_ELECCION
+from gestor_tokens import GestorTokens, Cerca
+from planificador import CLASE_VENTA, CLASE_REABASTO
+from optimista import EstadisticasConflicto, MODO_OPTIMISTA, OK, CONFLICTO, SIN_EXISTENCIAS, VENCIDO
+from coalescedor import Coalescedor, VENTANA_LOTE, resolver_compras
+from distribucion import repartir
+from rebalanceo import Rebalanceador
+from confiable import CanalConfiable
+from replicacion import Replicacion, ACCIONES_REPLICACION
+from anillo import AnilloToken
+from ricart import RicartAgrawala, ACCIONES_RICART
+from bitacora import aplicar_entradas
+from sincronizacion import NUM_CUBETAS
+
+ESPERA_ACCESO = 10  # Segundos que se espera el token del maestro antes de rendirse
+COMPRAS_RECORDADAS = 10000  # id_compra aplicados que se recuerdan para descartar reintentos
+# Mensajes que no se pueden perder ni aplicar dos veces: van con acks y reenvios (confiable.py)
+ACCIONES_CONFIABLES = {'request_access', 'release_access', 'token', 'buy_item', 'buy_result',
+                       'update_inventory', 'update_result', 'capacidad', 'get_inventory',
+                       'read_index', 'read_index_result', 'ring_token', 'ra_request', 'ra_reply',
+                       'ra_cambios', 'instalar'}
+ATRASO_LECTURA = 2.0  # Segundos sin saber del maestro que se toleran en una lectura local
+ESPERA_LECTURA = 2.0  # Segundos para confirmar una lectura fuerte con el maestro
+EXCLUSION_MAESTRO = 'maestro'  # El maestro concede el acceso (tokens por articulo)
+EXCLUSION_ANILLO = 'anillo'    # Un token da la vuelta entre las sucursales, sin maestro
+EXCLUSION_RICART = 'ricart'    # Ricart-Agrawala: permiso de todas las sucursales, sin maestro
 
-HEARTBEAT_INTERVAL = 2
-MAX_INACTIVE_TIME = 5
 # Clase Nodo deberia tener la capacidad de responder y hacer todo si fuera "maestro"
 # De no ser asi, envia peticiones al nodo maestro, cada nodo sabe quien es el nodo maestro 
 # Cada nodo tiene exclusivamente un nodo vecino
@@ -16,45 +45,73 @@ MAX_INACTIVE_TIME = 5
 # Todas las solicitudes las "coordina" el nodo maestro y les da el permiso para poder 
 #       realizar cualquier cosa que podria entrar en una exclusion mutua
 
-class Node:
-    #Listado de los nodos. Todos saben de todos. Se hace la busqueda por IP
+class Node(NodoComun):
+    #Nodos semilla para unirse al grupo. Los miembros actuales los mantiene la membresia (gossip)
     lista_ip_nodo = {"192.168.253.129":1,"192.168.253.130":2,"192.168.253.132":3,"192.168.253.133":4,"192.168.253.134":5}
     lista_nodo_ip = {1:"192.168.253.129",2:"192.168.253.130",3:"192.168.253.132",4:"192.168.253.133",5:"192.168.253.134"}
 
-    def __init__(self, node_id, capacity):
-        self.last_heartbeat = {}  # Inicializar el registro de heartbeats
-        self.master_lock = threading.Lock()  # Inicializar el lock
+    def __init__(self, node_id, capacity, servidor_asincrono=False, ventana_lote=VENTANA_LOTE,
+                 exclusion=EXCLUSION_MAESTRO, umbral_phi=UMBRAL_PHI):
         self.master_node = None  # Inicializar el nodo maestro
-        self.token_stack = deque()  # Inicializar la pila de tokens
         self.node_id = node_id
         self.capacity = capacity
-        self.inventory = {}
+        self.inventory = AlmacenInventario()  # Inventario con indices, se carga una sola vez
         self.clients = {}
-        self.master_alive = True
+        self.master_alive = False  # Hasta que se elija un maestro
         self.master_id = None
         self.neighbors = None   #Exclusivamente para consenso y decisiones (Mensajeria entre nodos)
-        self.access = False
         self.failed_nodes = set()
-        self.request_queue = Queue()  # Cola de solicitudes
+        self.membresia = None  # Membresia por gossip (SWIM), se crea en start() con la IP local
+        self.umbral_phi = umbral_phi  # phi a partir del cual la membresia sospecha de un nodo (None = solo pings)
+        self.eleccion = None   # Eleccion del maestro por terminos, tambien se crea en start()
+        self.replicacion = None  # Log de cambios replicado con quorum, se crea en start()
+        self.gestor_tokens = GestorTokens(self.send_token)  # Leases de acceso (solo se usa en el maestro)
+        self.cerca = Cerca()  # Rechaza cambios con un token de acceso viejo
+        self.esperas_maestro = {}  # solicitud -> [Event, respuesta] mientras se espera al maestro (con lock_accesos)
+        self.siguiente_solicitud = 0
+        self.lock_accesos = threading.Lock()
+        self.lock_maestro = threading.Lock()  # Un cambio del maestro en el log a la vez (ver cambios_maestro)
+        self.compras_hechas = OrderedDict()  # id_compra -> resultado, de lo que ya se aplico del log
+        self.conflictos = EstadisticasConflicto()  # Tasa de conflictos de las compras optimistas por articulo
+        self.accesos = {}  # token -> articulos, accesos que tenemos ahora
+        # Lotes de peticiones en el maestro. Siempre en su propio hilo: el lote espera el quorum de
+        # la replicacion y las respuestas llegan por el hilo del servidor
+        self.coalescedor = Coalescedor(self.aplicar_lote, ventana_lote, en_hilo=True)
+        self.rebalanceo = Rebalanceador(self.planear_rebalanceo, self.mover_existencias, self.existencia)  # Existencias de sucursales caidas
+        self.exclusion = exclusion  # Quien da el permiso de escribir las ventas propias (EXCLUSION_*)
+        self.anillo = None          # Token del anillo, solo con EXCLUSION_ANILLO; se crea en start()
+        self.ricart = None          # Solo con EXCLUSION_RICART; se crea en start()
+        self.preparar_comun(node_id, servidor_asincrono)  # Codec, versiones, diario, despachador (nodo_comun.py)
+        self.confiable = CanalConfiable(lambda ip, mensaje: self.enviar_datagrama((ip, self.port), mensaje))
+        self.despachador.filtro = self.filtrar_duplicados
 
     def make_master(self, node_id):
         self.master_id = node_id
 
     def start(self, host):
-        self.host = host
-        self.port = 5000
-
-        send_thread = threading.Thread(target=self.send_heartbeats)
-        receive_thread = threading.Thread(target=self.receive_heartbeats_modified)
-
-        send_thread.start()
-        receive_thread.start()
-
-        self.server_thread = threading.Thread(target=self.start_server)
-        self.server_thread.start()
-
-        self.client_thread = threading.Thread(target=self.start_client)
-        self.client_thread.start()
+        self.abrir(host)  # Inventario recuperado, bitacora, diario y el socket del servidor
+
+        self.membresia = Membresia(self.node_id, host, lambda ip, mensaje: self.enviar_mensaje((ip, self.port), mensaje),
+                                   self.lista_ip_nodo, al_unirse=self.handle_node_join,
+                                   al_caer=self.handle_node_failure, al_volver=self.handle_node_recovery,
+                                   umbral_phi=self.umbral_phi)
+        for nombre in ACCIONES_MEMBRESIA:
+            self.despachador.registrar(nombre, self.handle_membresia)
+        self.eleccion = Eleccion(host, lambda ip, mensaje: self.enviar_mensaje((ip, self.port), mensaje),
+                                 self.electorado, al_cambiar_maestro=self.handle_master_change)
+        for nombre in ACCIONES_ELECCION:
+            self.despachador.registrar(nombre, self.handle_eleccion)
+        self.replicacion = Replicacion(host, lambda ip, mensaje: self.enviar_mensaje((ip, self.port), mensaje),
+                                       self.electorado, lambda: self.eleccion.termino, self.is_master,
+                                       self.aplicar_replicado, instantanea=self.instantanea_replica,
+                                       adoptar_termino=self.eleccion.adoptar_termino)
+        # Solo se vota por candidatos con el log al dia
+        self.eleccion.puede_votar = self.replicacion.puede_votar
+        self.eleccion.datos_voto = self.replicacion.datos_voto
+        for nombre in ACCIONES_REPLICACION:
+            self.despachador.registrar(nombre, self.handle_replicacion)
+
+        self.iniciar_servidor()
 
         self.check_master_thread = threading.Thread(target=self.check_master_alive)
         self.check_master_thread.start()
@@ -62,98 +119,467 @@ class Node:
         self.token_thread = threading.Thread(target=self.token_handler)
         self.token_thread.start()
 
-        self.send_thread = threading.Thread(target=self.send_heartbeats)
+        self.coalescedor.iniciar()
+
+        # Reenvios y acks diferidos de la entrega confiable
+        self.confiable_thread = threading.Thread(target=self.confiable.rueda.correr)
+        self.confiable_thread.start()
+
+        self.rebalanceo_thread = threading.Thread(target=self.rebalanceo.correr)
+        self.rebalanceo_thread.start()
+
+        self.replicacion_thread = threading.Thread(target=self.replicacion.correr)
+        self.replicacion_thread.start()
+
+        if self.exclusion == EXCLUSION_ANILLO:
+            self.anillo = AnilloToken(self.node_id, self.sucursales_vivas,
+                                      lambda node_id, mensaje: self.enviar_mensaje(self.get_node_address(node_id), mensaje),
+                                      self.aplicar_ventas_propias, self.aplicar_replicado)
+            self.anillo_thread = threading.Thread(target=self.anillo.correr)
+            self.anillo_thread.start()
+        elif self.exclusion == EXCLUSION_RICART:
+            self.ricart = RicartAgrawala(self.node_id, self.sucursales_vivas,
+                                         lambda node_id, mensaje: self.enviar_mensaje(self.get_node_address(node_id), mensaje),
+                                         self.aplicar_ventas_propias, self.aplicar_replicado)
+            for nombre in ACCIONES_RICART:
+                self.despachador.registrar(nombre, self.handle_ricart)
+            self.ricart_thread = threading.Thread(target=self.ricart.correr)
+            self.ricart_thread.start()
+
+        self.sync_thread = threading.Thread(target=self.sync_loop)
+        self.sync_thread.start()
+
+        # Una ronda de ping por periodo, sin importar cuantos nodos haya
+        self.send_thread = threading.Thread(target=self.membresia.correr)
         self.send_thread.start()
 
-        self.receive_thread = threading.Thread(target=self.receive_heartbeats_modified)
+        # Temporizadores de sospecha de la membresia
+        self.receive_thread = threading.Thread(target=self.membresia.rueda.correr)
         self.receive_thread.start()
 
     
 
-    def start_server(self):
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server_socket:
-            server_socket.bind((self.host, self.port))
+    def get_node_address(self, node_id):
+        return (self.membresia.ip_de(node_id), self.port)
 
-            while True:
-                mensaje_recibido, direccion = server_socket.recvfrom(1024)
-                mensaje_decodificado = mensaje_recibido.decode('utf-8')
+    def otros_nodos(self):
+        return [self.membresia.id_de(ip) for ip in self.membresia.otros()]
 
-                # Add timestamp, node, and action to the message
-                timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                message_data = json.loads(mensaje_decodificado)
-                message_data['time'] = timestamp
-                message_data['node'] = self.node_id
-                action = message_data.get('action')
-
-                # Further processing based on the action
-                if action == 'request_access':
-                    self.handle_request_access(message_data)
-                elif action == 'update_inventory':
-                    self.handle_update_inventory(message_data)
-                elif action == 'get_inventory':
-                    self.handle_get_inventory(direccion, message_data)
-                elif action == 'buy_item':
-                    self.handle_buy_item(message_data)
-
-    def start_client(self):
-        while True:
-            time.sleep(5)
-            if self.master_alive and self.master_id is not None:
-                neighbor_id = self.neighbors[self.master_id]
-                neighbor_address = self.get_node_address(neighbor_id)
+    def enviar_mensaje(self, direccion, mensaje, vida=None):
+        # vida: segundos que se espera la respuesta; despues ya no se reenvia
+        if mensaje.get('action') in ACCIONES_CONFIABLES:
+            self.confiable.mandar(direccion[0], mensaje, vida)
+        else:
+            self.enviar_datagrama(direccion, mensaje)
 
-                with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client_socket:
-                    try:
-                        client_socket.sendto(b'heartbeat', neighbor_address)
-                    except:
-                        self.master_alive = False
+    def enviar_datagrama(self, direccion, mensaje):
+        # Codifica en el formato acordado con ese nodo (por IP)
+        datos = self.codec.codificar(mensaje, direccion[0])
+        self.registro_mensajes.registrar_evento('ENVIADO', direccion[0], mensaje)
+        self.enviador.enviar(datos, direccion)
 
-    def check_master_alive(self):
-        while True:
-            time.sleep(10)
-            if not self.master_alive:
-                self.elect_master()
+    def metricas_envio(self):
+        # Mensajes enviados, datagramas que ocuparon y cola del hilo enviador
+        return self.enviador.metricas()
 
-    def elect_master(self):
-        # Implementar lógica de elección de nuevo nodo maestro
-        pass
-
-    def handle_update_inventory(self, message):
-        # Implementar lógica de consenso para actualizar el inventario
-        # Aquí se debe considerar la distribución equitativa y la verificación del espacio en cada sucursal
-        pass
-
-    def handle_get_inventory(self, client_address):
-        # Enviar el inventario al nodo cliente
-        response = {'action': 'send_inventory', 'inventory': self.inventory}
-        response_json = json.dumps(response).encode('utf-8')
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as response_socket:
-            response_socket.sendto(response_json, client_address)
-
-    def handle_buy_item(self, message):
-            # Implementar lógica de exclusión mutua para la compra de un artículo
-        pass
-
-    def send_token(self, recipient_id, token):
-        recipient_address = self.get_node_address(recipient_id)
-
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client_socket:
-            message = {'action': 'token', 'token': token}
-            message_json = json.dumps(message).encode('utf-8')
-            client_socket.sendto(message_json, recipient_address)
-
-    def token_handler(self):
-        while True:
-            time.sleep(1)
+    def filtrar_duplicados(self, mensaje, direccion):
+        # Programa el ack y descarta los reenvios de algo que ya se proceso
+        return self.confiable.recibir(mensaje, direccion[0])
 
-            if not self.token_stack and not self.request_queue.empty():
-                # Si no hay tokens disponibles y hay solicitudes en la cola, generar un nuevo token
-                new_token = f'Token-{time.time()}'
-                self.token_stack.append(new_token)
+    @accion('ack_confiable')
+    def handle_ack_confiable(self, message, direccion):
+        self.confiable.recibir_ack(message, direccion[0])
 
-                # Desencolar la solicitud y enviar el token al nodo que solicitó acceso
-                node_id = self.request_queue.get()
-                self.send_token(node_id, new_token)
+    def metricas_entrega(self):
+        # Reenvios, duplicados descartados y RTT/RTO por nodo
+        return self.confiable.metricas()
+
+    def negociar_codec(self, node_ip):
+        # Ofrecer el formato binario al nodo; mientras no responda se usa JSON
+        try:
+            self.enviar_mensaje((node_ip, self.port), self.codec.mensaje_hola())
+        except OSError as e:
+            print(f"Error al negociar formato con {node_ip}: {e}")
+
+    def check_master_alive(self):
+        # Si somos maestro manda los latidos; si no, se postula cuando se vence el tiempo sin latido
+        self.eleccion.correr()
+
+    def elect_master(self):
+        # Postularse en el siguiente termino sin esperar el tiempo de eleccion
+        self.eleccion.postularse()
+
+    def handle_eleccion(self, message, direccion):
+        self.eleccion.recibir(message, direccion[0])
+
+    def electorado(self):
+        # Las semillas siempre cuentan para la mayoria: asi dos nodos que arrancan sin conocerse
+        # no pueden elegirse cada uno en el mismo termino
+        return list(set(self.membresia.conocidos()) | set(self.lista_ip_nodo))
+
+    def handle_master_change(self, master_ip, termino):
+        if master_ip == self.host:
+            # Los tokens del nuevo maestro son mayores que todos los del anterior
+            self.gestor_tokens.nuevo_termino(termino)
+            # Las sucursales que ya estaban caidas (por ejemplo el maestro anterior) se rebalancean aqui
+            for ip in list(self.failed_nodes) if self.maestro_escribe() else []:
+                self.rebalanceo.caida(self.membresia.id_de(ip))
+            self.replicacion.al_ser_lider()
+        self.master_node = master_ip
+        self.master_id = self.membresia.id_de(master_ip) if master_ip is not None else None
+        self.master_alive = master_ip is not None
+        if master_ip is not None:
+            print(f"El nodo maestro actual es: {master_ip} (termino {termino})")
+
+    def metricas_eleccion(self):
+        # Termino actual, elecciones y cuanto tardaron en tener maestro otra vez
+        return self.eleccion.metricas()
+
+    @accion('request_access')
+    def handle_request_access(self, message, direccion=None):
+        # Se concede en cuanto nadie tenga esos articulos; si no, espera su turno en el planificador
+        if not self.is_master():
+            return
+        self.coalescedor.agregar(('request_access', message, direccion))
+
+    @accion('release_access')
+    def handle_release_access(self, message, direccion=None):
+        # Al liberar, el gestor le pasa el acceso al siguiente de la cola en ese momento
+        self.coalescedor.agregar(('release_access', message, direccion))
+
+    @accion('token')
+    def handle_token(self, message, direccion=None):
+        self.respuesta_maestro(message)
+
+    @accion('buy_result')
+    def handle_buy_result(self, message, direccion=None):
+        self.respuesta_maestro(message)
+
+    def respuesta_maestro(self, message):
+        with self.lock_accesos:
+            espera = self.esperas_maestro.get(message.get('solicitud'))
+        if espera is not None:
+            espera[1] = message
+            espera[0].set()
+
+    def preguntar_maestro(self, mensaje, timeout=ESPERA_ACCESO):
+        # Manda el mensaje al maestro con un numero de solicitud y espera la respuesta que lo trae
+        if self.master_id is None:
+            return None
+        with self.lock_accesos:
+            self.siguiente_solicitud += 1
+            solicitud = self.siguiente_solicitud
+            espera = self.esperas_maestro[solicitud] = [threading.Event(), None]
+        mensaje['solicitud'] = solicitud
+        try:
+            self.enviar_mensaje(self.get_node_address(self.master_id), mensaje, vida=timeout)
+            if not espera[0].wait(timeout):
+                return None
+        finally:
+            with self.lock_accesos:
+                self.esperas_maestro.pop(solicitud, None)
+        return espera[1]
+
+    def pedir_acceso(self, items=None, timeout=ESPERA_ACCESO, clase=CLASE_VENTA):
+        # Pide al maestro el acceso a esos articulos (None = todo el catalogo). Regresa el token
+        # o None si no hay maestro o no contesto a tiempo. La clase ordena la espera en el maestro
+        respuesta = self.preguntar_maestro({'action': 'request_access', 'node_id': self.node_id, 'items': items,
+                                            'clase': clase}, timeout)
+        if respuesta is None:
+            return None
+        self.accesos[respuesta['token']] = items
+        return respuesta['token']
+
+    def liberar_acceso(self, token):
+        self.accesos.pop(token, None)
+        if self.master_id is not None:
+            self.enviar_mensaje(self.get_node_address(self.master_id),
+                                {'action': 'release_access', 'node_id': self.node_id, 'token': token})
+
+    def metricas_tokens(self):
+        # Concesiones por segundo, vencidos y percentiles de espera (en el maestro)
+        return self.gestor_tokens.metricas()
+
+    @accion('update_inventory')
+    def handle_update_inventory(self, message, direccion=None):
+        # Reparto de las unidades sin asignar entre las sucursales segun su espacio libre. Lo hace
+        # el maestro y los demas reciben las columnas nuevas por la sincronizacion
+        if not self.is_master():
+            return
+        self.coalescedor.agregar(('update_inventory', message, direccion))
+
+    @accion('update_result')
+    def handle_update_result(self, message, direccion=None):
+        self.respuesta_maestro(message)
+
+    def sucursales_caidas(self):
+        # Para capacidades_sucursales (nodo_comun.py): las caidas cuentan como capacidad 0
+        return {self.membresia.id_de(ip) for ip in self.failed_nodes}
+
+    def distribuir(self, items=None):
+        # Reparte lo que falta asignar de esos articulos (None = todo el catalogo) en un solo
+        # calculo para todos. Regresa (unidades asignadas, unidades que no cupieron), o None si
+        # la mayoria no confirmo el cambio
+        return self.cambios_maestro(self.calcular_reparto, items)
+
+    def planear_rebalanceo(self, sucursal):
+        # Las existencias de la sucursal caida repartidas entre las vivas segun su espacio libre
+        capacidades = self.capacidades_sucursales()
+        capacidades[sucursal - 1] = 0
+        with self.bitacora.lock:
+            ids = [item_id for item_id in sorted(self.inventory) if self.inventory.existencia(item_id, sucursal) > 0]
+            existencias = [self.inventory.existencia(item_id, sucursal) for item_id in ids]
+            ocupado = self.inventory.ocupacion()
+        asignacion, sin_espacio = repartir(existencias, ocupado, capacidades)
+        if sum(sin_espacio):
+            print(f"No hay espacio para {sum(sin_espacio)} unidades de la sucursal {sucursal}")
+        return [(item_id, sucursal, i + 1, unidades)
+                for item_id, fila in zip(ids, asignacion) for i, unidades in enumerate(fila) if unidades]
+
+    def mover_existencias(self, movimientos):
+        # Pasa unidades entre columnas: (item, sucursal origen, sucursal destino, unidades).
+        # Nunca mas de lo que el origen tiene en ese momento. Regresa lo que si se movio
+        return self.cambios_maestro(self.calcular_movimientos, movimientos) or []
+
+    def existencia(self, item_id, sucursal):
+        # Unidades que tiene ahora la columna de la sucursal (el rebalanceo no devuelve mas que esto)
+        with self.bitacora.lock:
+            return self.inventory.existencia(item_id, sucursal)
+
+    def calcular_movimientos(self, movimientos):
+        hechos = []
+        nuevas = {}  # (item, campo) -> entrada; un origen puede mandar a varios destinos
+        with self.bitacora.lock:
+            for item_id, origen, destino, unidades in movimientos:
+                campo_origen = columna(origen)
+                anterior = nuevas.get((item_id, campo_origen))
+                unidades = min(unidades, anterior['valor'] if anterior else self.inventory.existencia(item_id, origen))
+                if unidades <= 0:
+                    continue
+                for sucursal, delta in ((origen, -unidades), (destino, unidades)):
+                    campo = columna(sucursal)
+                    entrada = nuevas.get((item_id, campo))
+                    if entrada is None:
+                        entrada = nuevas[(item_id, campo)] = {'item': item_id, 'campo': campo,
+                                                              'valor': self.inventory.valor(item_id, campo),
+                                                              'version': self.versiones.nueva_version()}
+                    entrada['valor'] += delta
+                hechos.append((item_id, origen, destino, unidades))
+        return list(nuevas.values()), hechos
+
+    def cambios_maestro(self, calcular, *args):
+        # Cambios que decide el maestro (compras, reparto, rebalanceo). calcular(*args) regresa
+        # (entradas, resultado) a partir de lo ya comprometido, sin aplicar nada: el maestro
+        # aplica las entradas igual que los seguidores, al comprometerse en el log
+        # (aplicar_replicado). Uno a la vez, asi cada calculo parte de lo que dejo el anterior.
+        # Regresa el resultado, o None si la mayoria no confirmo
+        if not self.maestro_escribe():
+            return None
+        with self.lock_maestro:
+            if not self.replicacion.esperar_al_dia():
+                print("El log del maestro tiene cambios sin confirmar por la mayoria")
+                return None
+            entradas, resultado = calcular(*args)
+            if entradas and not self.replicar(entradas):
+                return None
+            return resultado
+
+    def maestro_escribe(self):
+        # Con el anillo o Ricart-Agrawala, las columnas InvN solo se escriben con ese permiso. El
+        # maestro no lo pide, asi que no reparte ni rebalancea (sus cambios podrian pisar una venta
+        # hecha con el permiso)
+        return self.exclusion == EXCLUSION_MAESTRO
+
+    def replicar(self, entradas):
+        # Se agregan al log y se espera a la mayoria; al comprometerse ya quedaron aplicadas
+        confirmado = self.replicacion.esperar(self.replicacion.proponer(entradas))
+        if not confirmado:
+            print("La mayoria de los nodos no confirmo el cambio a tiempo")
+        return confirmado
+
+    def aplicar_replicado(self, entradas):
+        # Entrada comprometida del log (en todos los nodos), cambios que trae el token del anillo
+        # o Ricart-Agrawala, o un sync_delta: se aplica y se anota en la bitacora local
+        aplicar_entradas(entradas, self.inventory, self.versiones, self.bitacora)
+        for entrada in entradas:
+            for id_compra in entrada.get('compras', ()):
+                self.compras_hechas[id_compra] = {'resultado': OK, 'entrada': entrada}
+        while len(self.compras_hechas) > COMPRAS_RECORDADAS:
+            self.compras_hechas.popitem(last=False)
+
+    def instantanea_replica(self):
+        # Para un nodo que se quedo mas atras de lo que guarda el log: todo el inventario
+        return self.versiones.entradas_de_cubetas(range(NUM_CUBETAS))
+
+    def handle_replicacion(self, message, direccion):
+        self.replicacion.recibir(message, direccion[0])
+
+    def metricas_replicacion(self):
+        # Indices del log (ultimo, comprometido, aplicado) y atraso respecto al maestro
+        return self.replicacion.metricas()
+
+    def metricas_rebalanceo(self):
+        # Sucursales caidas, unidades movidas, devueltas y las que se quedaron en el destino
+        return self.rebalanceo.metricas()
+
+    def repartir_inventario(self, items=None):
+        if not self.maestro_escribe():
+            print(f"El reparto no esta disponible con la exclusion '{self.exclusion}'")
+            return
+        respuesta = self.preguntar_maestro({'action': 'update_inventory', 'items': items or None})
+        if respuesta is None:
+            print("No se obtuvo respuesta del nodo maestro, intenta de nuevo")
+            return
+        print(f"Se repartieron {respuesta['asignado']} unidades entre las sucursales")
+        if respuesta['sin_espacio']:
+            print(f"No hubo espacio para {respuesta['sin_espacio']} unidades")
+
+    @accion('buy_item')
+    def handle_buy_item(self, message, direccion):
+        # Compra aplicada por el maestro. Con token (via pesimista) se aplica si el lease sigue
+        # vigente; sin token (via optimista) solo si la columna sigue en la version que trae
+        if not self.is_master():
+            return
+        self.coalescedor.agregar(('buy_item', message, direccion))
+
+    def aplicar_lote(self, lote):
+        # Peticiones que llegaron dentro de la misma ventana: primero se liberan accesos (asi
+        # las solicitudes del lote ya los encuentran libres), luego se conceden todas con una
+        # sola toma del lock, las compras se suman por articulo y columna, y al final se contesta
+        liberaciones = [m for a, m, d in lote if a == 'release_access']
+        solicitudes = [(m.get('node_id'), m.get('items'), m.get('solicitud'), m.get('clase', CLASE_VENTA))
+                       for a, m, d in lote if a == 'request_access']
+        compras = [(m, d) for a, m, d in lote if a == 'buy_item']
+        repartos = [(m, d) for a, m, d in lote if a == 'update_inventory']
+        for m in liberaciones:
+            self.gestor_tokens.liberar(m.get('node_id'), m.get('token'))
+        if solicitudes:
+            self.gestor_tokens.solicitar_varios(solicitudes)
+        if repartos:
+            # Un solo reparto para todos los articulos pedidos en el lote
+            items = set()
+            for m, d in repartos:
+                if not m.get('items'):
+                    items = None
+                    break
+                items.update(m['items'])
+            resultado = self.distribuir(items)
+            for m, direccion in repartos:
+                if resultado is not None and m.get('solicitud') is not None:
+                    asignado, sin_espacio = resultado
+                    self.enviar_mensaje((direccion[0], self.port), {'action': 'update_result', 'solicitud': m['solicitud'],
+                                                                    'asignado': asignado, 'sin_espacio': sin_espacio})
+        if not compras:
+            return
+        resultados = self.cambios_maestro(resolver_compras, [m for m, d in compras], self.inventory, self.versiones,
+                                          self.gestor_tokens, self.cerca, self.compras_hechas)
+        if resultados is None:
+            # Sin respuesta la sucursal se rinde por tiempo; no se le confirma una venta sin quorum
+            return
+        for (m, direccion), resultado in zip(compras, resultados):
+            resultado['action'] = 'buy_result'
+            resultado['solicitud'] = m.get('solicitud')
+            self.enviar_mensaje((direccion[0], self.port), resultado)
+
+    def metricas_lotes(self):
+        # Ventana, lotes procesados y peticiones por lote (en el maestro)
+        return self.coalescedor.metricas()
+
+    def comprar(self, item_id, delta, token=None, id_compra=None):
+        # Una ida y vuelta al maestro. Sin token va la version que conocemos de nuestra columna.
+        # Con el mismo id_compra el maestro la aplica una sola vez aunque llegue repetida
+        mensaje = {'action': 'buy_item', 'item': item_id, 'sucursal': self.node_id, 'delta': delta}
+        if id_compra is not None:
+            mensaje['id_compra'] = id_compra
+        if token is not None:
+            mensaje['token'] = token
+        else:
+            mensaje['version'] = self.versiones.version(item_id, f"Inv{self.node_id}")
+        respuesta = self.preguntar_maestro(mensaje)
+        if respuesta is not None and respuesta.get('entrada') is not None:
+            # Ya esta comprometido; se copia el valor y la version que le asigno el maestro
+            self.aplicar_replicado([respuesta['entrada']])
+        return respuesta
+
+    def comprar_con_token(self, item_id, delta, id_compra=None):
+        # Las ventas pasan antes que los reabastos en la cola del maestro
+        token = self.pedir_acceso([item_id], clase=CLASE_VENTA if delta < 0 else CLASE_REABASTO)
+        if token is None:
+            return None
+        try:
+            return self.comprar(item_id, delta, token, id_compra)
+        finally:
+            self.liberar_acceso(token)
+
+    def ajustar_en_maestro(self, item_id, delta):
+        # Primero la via optimista (salvo en articulos con muchos conflictos); si hay conflicto,
+        # se repite con token. Los dos intentos llevan el mismo id: si el primero si se aplico
+        # (la respuesta no llego a tiempo), el maestro contesta el segundo con ese resultado
+        with self.lock_accesos:
+            self.siguiente_solicitud += 1
+            id_compra = f"{self.node_id}-{self.confiable.epoca}-{self.siguiente_solicitud}"
+        respuesta = None
+        if self.conflictos.modo(item_id) == MODO_OPTIMISTA:
+            respuesta = self.comprar(item_id, delta, id_compra=id_compra)
+            if respuesta is not None:
+                self.conflictos.registrar(item_id, respuesta['resultado'] == CONFLICTO)
+        if respuesta is None or respuesta['resultado'] == CONFLICTO:
+            respuesta = self.comprar_con_token(item_id, delta, id_compra)
+        return respuesta
+
+    def ajustar(self, item_id, delta):
+        # Venta o alta en la columna propia, con el permiso del modo de exclusion elegido
+        if self.anillo is not None:
+            return self.anillo.ajustar(item_id, delta)
+        if self.ricart is not None:
+            return self.ricart.ajustar(item_id, delta)
+        return self.ajustar_en_maestro(item_id, delta)
+
+    def sucursales_vivas(self):
+        ids = (self.membresia.id_de(ip) for ip in self.membresia.vivos())
+        return [node_id for node_id in ids if node_id is not None]
+
+    def aplicar_ventas_propias(self, ventas):
+        # Con el token del anillo: [(item, delta)] sobre la columna propia, un solo fsync.
+        # Regresa (resultados, cambios) con un resultado por venta ({'resultado', 'entrada'})
+        resultados = []
+        cambios = []
+        ultimo_lsn = None
+        campo = columna(self.node_id)
+        with self.bitacora.lock:
+            for item_id, delta in ventas:
+                actual = self.inventory.valor(item_id, campo)
+                if actual is None or actual + delta < 0:
+                    resultados.append({'resultado': SIN_EXISTENCIAS})
+                    continue
+                nueva = self.versiones.actualizar(item_id, campo, actual + delta)
+                ultimo_lsn = self.bitacora.anotar(item_id, self.node_id, delta, None, nueva)
+                entrada = {'item': item_id, 'campo': campo, 'valor': actual + delta, 'version': nueva}
+                cambios.append(entrada)
+                resultados.append({'resultado': OK, 'entrada': entrada})
+        if ultimo_lsn is not None:
+            self.bitacora.esperar(ultimo_lsn)
+        return resultados, cambios
+
+    @accion('ring_token')
+    def handle_ring_token(self, message, direccion=None):
+        if self.anillo is not None:
+            self.anillo.recibir(message)
+
+    def handle_ricart(self, message, direccion):
+        self.ricart.recibir(message, self.membresia.id_de(direccion[0]))
+
+    def metricas_ricart(self):
+        # Reloj de Lamport, mensajes por seccion critica y por venta, espera para entrar
+        return self.ricart.metricas() if self.ricart is not None else None
+
+    def metricas_anillo(self):
+        # Generacion del token, vueltas, regeneraciones, ventas por retencion y espera por el token
+        return self.anillo.metricas() if self.anillo is not None else None
+
+    def metricas_conflictos(self):
+        # Intentos, conflictos y modo elegido por articulo (los mas disputados primero)
+        return self.conflictos.metricas()
 
     def recibir_mensajes(self):
         mensaje_confirmado = False
@@ -167,7 +593,7 @@ class Node:
 
                 timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
                 mensaje_completo = f"{timestamp} - Mensaje RECIBIDO de {direccion}: {mensaje_json}"
-                mensajes_para_guardar.append(mensaje_completo)
+                self.registro_mensajes.registrar_evento('RECIBIDO', direccion[0], mensaje_json)
 
                 if not mensaje_confirmado:
                     # Enviar un mensaje de confirmación al remitente
@@ -178,13 +604,6 @@ class Node:
             except socket.timeout:
                 mensaje_confirmado = False
 
-    def guardar_mensajes(self):
-        while True:
-            if mensajes_para_guardar:
-                mensaje_para_guardar = mensajes_para_guardar.pop(0)
-                with open("logMensajes.txt", "a") as log_file:
-                    log_file.write(mensaje_para_guardar + "\n")
-                time.sleep(1)  # Espera un segundo antes de intentar guardar el siguiente mensaje
 
     def enviar_mensajes(self):
         while True:
@@ -201,20 +620,98 @@ class Node:
             # Envía el mensaje a la dirección IP de destino especificada
             destino_puerto = 5000
             socket.sendto(json.dumps(mensaje_json).encode('utf-8'), (destino_ip, destino_puerto))
-            mensajes_para_guardar.append(mensaje_completo)
-
-    def consultar(self, nodo):
-        pass
+            self.registro_mensajes.registrar_evento('ENVIADO', destino_ip, mensaje_json)
 
-    def vender(self, item_id, cantidad):
-        pass
+    def consultar(self, nodo, fuerte=False):
+        # Las columnas InvN de todas las sucursales se leen de la replica local (la mantiene al
+        # dia el log que empuja el maestro), sin ir a la red. La salida trae el indice del log
+        # aplicado y la cota de atraso. Con fuerte=True primero se le pregunta al maestro hasta
+        # donde va y se espera a tenerlo aplicado
+        try:
+            nodo = int(nodo)
+            direccion = self.get_node_address(nodo)
+        except (ValueError, KeyError):
+            print(f"Nodo no valido: {nodo}")
+            return
+
+        if fuerte:
+            if not self.lectura_fuerte():
+                print("El maestro no confirmo la lectura; intenta de nuevo")
+                return
+        elif self.replicacion.atraso() > ATRASO_LECTURA:
+            # La replica local ya no es confiable (sin maestro o muy atrasada): se pregunta al nodo
+            print(f"Replica local con mas de {ATRASO_LECTURA} s de atraso, se consulta al nodo {nodo}")
+            self.consultar_nodo(nodo, direccion)
+            return
+
+        indice, termino, atraso = self.replicacion.estado_lectura()
+        cota = "lectura fuerte" if fuerte else f"atraso <= {atraso * 1000:.0f} ms"
+        print(f"Replica local: indice {indice} (termino {termino}), {cota}")
+        campo = columna(nodo)
+        for a in sorted(self.inventory.articulos.values(), key=lambda a: a.id):
+            print(f"{a.id:<6}{a.articulo:<20}{a.inv[nodo - 1]:>6}  v{self.versiones.version(a.id, campo)}")
+
+    def lectura_fuerte(self):
+        # Una ida y vuelta al maestro por su indice comprometido (no por los datos)
+        if self.is_master():
+            return True
+        respuesta = self.preguntar_maestro({'action': 'read_index'}, ESPERA_LECTURA)
+        if respuesta is None:
+            return False
+        return self.replicacion.esperar_aplicado(respuesta['indice'], ESPERA_LECTURA)
+
+    @accion('read_index')
+    def handle_read_index(self, message, direccion):
+        if not self.is_master():
+            return
+        indice, termino = self.replicacion.indice_lectura()
+        self.enviar_mensaje((direccion[0], self.port), {'action': 'read_index_result', 'solicitud': message.get('solicitud'),
+                                                        'indice': indice, 'termino': termino})
+
+    @accion('read_index_result')
+    def handle_read_index_result(self, message, direccion=None):
+        self.respuesta_maestro(message)
+
+    def consultar_nodo(self, nodo, direccion):
+        # Pide el inventario al nodo y muestra las filas conforme llegan los fragmentos
+        def pedir_reenvio(transfer_id, faltan):
+            self.enviar_mensaje(direccion, {'action': 'inventory_resend', 'id': transfer_id, 'faltan': faltan})
+
+        recepcion = self.reensamblador.nueva(pedir_reenvio)
+        self.enviar_mensaje(direccion, {'action': 'get_inventory', 'id': recepcion.id})
+        try:
+            for item_id, registro in recepcion.filas():
+                print(f"{item_id:<6}{registro['articulo']:<20}{registro.get(f'Inv{nodo}', 0):>6}")
+        finally:
+            self.reensamblador.terminar(recepcion.id)
+
+    def vender(self, item_id, cantidad, cliente=0):
+        cantidad = self.leer_cantidad(item_id, cantidad)
+        if cantidad is None:
+            return
+        respuesta = self.ajustar(item_id, -cantidad)
+        if respuesta is None or respuesta['resultado'] == VENCIDO:
+            print("No se obtuvo respuesta del nodo maestro, intenta de nuevo")
+            return
+        if respuesta['resultado'] != OK:
+            print(f"No hay existencias suficientes de {item_id} en la sucursal {self.node_id}")
+            return
+        # Ticket: IDARTICULO+SERIE+SUCURSAL+IDCLIENTE. La serie es la version del cambio, unica en el grupo
+        print(f"Ticket: {item_id}-{respuesta['entrada']['version']}-{self.node_id}-{cliente}")
 
     def agregar(self, item_id, cantidad):
-        pass
+        cantidad = self.leer_cantidad(item_id, cantidad)
+        if cantidad is None:
+            return
+        respuesta = self.ajustar(item_id, cantidad)
+        if respuesta is None or respuesta['resultado'] != OK:
+            print("No se obtuvo respuesta del nodo maestro, intenta de nuevo")
+            return
+        print(f"Se agregaron {cantidad} unidades de {item_id} a la sucursal {self.node_id}")
 
     def is_master(self):
         # Comprueba si este nodo es el maestro
-        return self.node_id == self.master_node
+        return self.eleccion.es_maestro()
     
     def handle_node_failure(self, node_ip):#######################################################
         if node_ip not in self.failed_nodes:
@@ -222,8 +719,50 @@ class Node:
             print(f"Nodo caído detectado: {node_ip}")
             # Implementar acciones específicas por la caída del nodo
             self.failed_nodes.add(node_ip)  # Agrega el nodo al conjunto de nodos caídos
-
-    def load_inventory_from_file(file_path="inventario.json"):
+            self.confiable.olvidar(node_ip)
+            if self.ricart is not None:
+                self.ricart.caida(self.membresia.id_de(node_ip))
+            if self.eleccion.maestro_caido(node_ip):
+                # La membresia confirmo la caida: se adelanta la eleccion
+                self.master_alive = False
+            elif self.is_master() and self.maestro_escribe():
+                # Sus existencias pasan a las demas sucursales en segundo plano
+                self.rebalanceo.caida(self.membresia.id_de(node_ip))
+
+    def handle_node_recovery(self, node_ip):
+        # Un nodo que se habia dado por caido regreso con una encarnacion nueva
+        if node_ip in self.failed_nodes:
+            print(f"Nodo recuperado: {node_ip}")
+            self.failed_nodes.discard(node_ip)
+        if self.is_master() and self.maestro_escribe():
+            # Se le devuelve lo que se habia movido y todavia no se vende
+            self.rebalanceo.regreso(self.membresia.id_de(node_ip))
+        self.negociar_codec(node_ip)
+        self.anunciar_capacidad(node_ip)
+
+    def handle_node_join(self, node_ip):
+        print(f"Nodo nuevo en el grupo: {node_ip}")
+        self.negociar_codec(node_ip)
+        self.anunciar_capacidad(node_ip)
+
+    def handle_membresia(self, message, direccion):
+        # ping, ack, ping indirecto, union y salida; las actualizaciones vienen pegadas al mensaje
+        self.membresia.recibir(message, direccion[0])
+
+    def estados_miembros(self):
+        # IP -> (nodo, estado, encarnacion) segun lo que este nodo sabe del grupo
+        return self.membresia.estados()
+
+    def niveles_sospecha(self):
+        # phi de cada nodo: mientras mas alto, mas probable que este caido
+        return self.membresia.niveles()
+
+    def salir(self):
+        # Salida voluntaria del grupo; los demas dejan de hacerle ping sin esperar a sospechar
+        self.membresia.salir()
+        print("Se anuncio la salida del grupo")
+
+    def load_inventory_from_file(self, file_path="inventario.json"):
             try:
                 with open(file_path, "r") as file:
                     inventory_data = json.load(file)
@@ -235,55 +774,9 @@ class Node:
                 print(f"Error: Unable to decode JSON in file '{file_path}'.")
                 return None
 
-    def send_heartbeats(self):
-                while True:
-                    heartbeat_msg = "Heartbeat"
-                    if self.is_master():
-                        heartbeat_msg += ":Master" ##AQUI PUEDE REALIZAR FUNCIONES EL NODO MAESTRO ########################################
-                    for node_ip in self.lista_ip_nodo:
-                        try:
-                            server_socket.sendto(heartbeat_msg.encode(), (node_ip, self.port))
-                        except Exception as e:
-                            print(f"Error al enviar heartbeat a {node_ip}: {e}")
-                            pass
-                    time.sleep(HEARTBEAT_INTERVAL)
-
-        # Esta función recibe heartbeats y actualiza el estado de los nodos
-    def receive_heartbeats_modified(self):
-                while True:
-                    current_time = time.time()
-                    for node_ip, last_hb_time in list(self.last_heartbeat.items()):
-                        if current_time - last_hb_time > MAX_INACTIVE_TIME and node_ip != self.host:
-                            self.handle_node_failure(node_ip)
-                            # Actualiza el último heartbeat para evitar múltiples detecciones
-                            self.last_heartbeat[node_ip] = current_time
-                    try:
-                        data, addr = self.server_socket.recvfrom(1024)
-                        self.last_heartbeat[addr] = time.time()
-                        if "Master" in data.decode():
-                            if addr != self.master_node:
-                                print(f"Nuevo nodo maestro elegido: {addr}")
-                                self.master_node = addr
-                        #print(f"Heartbeat recibido de {addr}, nodo activo")
-                    except socket.timeout:
-                        pass
-                    self.determine_master()
-                pass
-            # Función para determinar el nodo maestro
-
-    def determine_master(self):
-                with self.master_lock:
-                    current_time = time.time()
-                    active_nodes = {ip: self.last_heartbeat[ip] for ip in self.lista_ip_nodo if current_time - self.last_heartbeat.get(ip, 0) <= MAX_INACTIVE_TIME}
-                    if active_nodes:
-                        highest_ip = max(active_nodes.keys())
-                        if highest_ip != self.master_node:
-                            self.master_node = highest_ip
-                            print(f"El nodo maestro actual es: {self.master_node}")
-
 
     #Funcion para hacer la seleccion de comando (Punto de vista del usuario que controla todo)
-def sel_comando():
+def sel_comando(node):
         comando = input("Escribe un comando:").split()
         if not comando:
             pass
@@ -292,15 +785,22 @@ def sel_comando():
             seleccion = seleccion[1:]
             if seleccion == "help":
                 print("""La lista de comandos es:
-        /consultar {nodo} #Regresa el listado de id, articulo y cantidad, del nodo, en pantalla
+        /consultar {nodo} [fuerte] #Regresa el listado de id, articulo, cantidad y version del nodo (de la replica local; fuerte confirma con el maestro)
+        /buscar [categoria=X] [min=N] [max=N] [sucursal=N] #Lista los articulos que cumplen los filtros
         /vender {item_id} {cantidad} #Regresa un "ticket" en pantalla con (IDARTICULO+SERIE+SUCURSAL+IDCLIENTE)
         /agregar {item_id} {cantidad} #Regresa una confirmacion en pantalla de que fue agregado exitosamente
+        /repartir [item_id ...] #Reparte las unidades sin asignar entre las sucursales segun su capacidad
+        /salir #Anuncia a los demas nodos que este nodo deja el grupo
     Gracias""")
             elif seleccion == "consultar":
                 if (len(comando) == 2):
                     node.consultar(comando[1])
+                elif (len(comando) == 3 and comando[2] == "fuerte"):
+                    node.consultar(comando[1], fuerte=True)
                 else:
                     print("Especifica el nodo a consultar el inventario")
+            elif seleccion == "buscar":
+                node.buscar(comando[1:])
             elif seleccion == "vender":
                 if (len(comando) == 3):
                     node.vender(comando[1],comando[2])
@@ -311,6 +811,10 @@ def sel_comando():
                     node.agregar(comando[1],comando[2])
                 else:
                     print("Especifica el id del item y la cantidad a agregar")
+            elif seleccion == "repartir":
+                node.repartir_inventario(comando[1:])
+            elif seleccion == "salir":
+                node.salir()
             else:
                 print("Comando no valido. Escribe /help para mayor informacion")
         else:
@@ -336,10 +840,14 @@ def get_local_ip():
             return None
 
 def main():
-        node = Node(node_id=Node.lista_ip_nodo[get_local_ip()], capacity=get_random_integer())
+        # Un nodo que no es semilla recibe su numero de sucursal como argumento
+        # El segundo argumento elige la exclusion mutua: maestro (por omision), anillo o ricart
+        node_id = int(sys.argv[1]) if len(sys.argv) > 1 else Node.lista_ip_nodo[get_local_ip()]
+        exclusion = sys.argv[2] if len(sys.argv) > 2 else EXCLUSION_MAESTRO
+        node = Node(node_id=node_id, capacity=get_random_integer(), exclusion=exclusion)
         node.start(host= get_local_ip())
         # Iniciar hilos para enviar y recibir heartbeats
         while True:
-            sel_comando()
+            sel_comando(node)
 
 main()
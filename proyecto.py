@@ -3,8 +3,12 @@ import threading
 import time
 import json
 import random
-from collections import deque
-from queue import Queue
+from nodo_comun import NodoComun
+from despachador import accion
+from almacen import AlmacenInventario
+from gestor_tokens import GestorTokens, Cerca
+from planificador import CLASE_VENTA
+from coalescedor import resolver_compras
 
 # Clase Nodo deberia tener la capacidad de responder y hacer todo si fuera "maestro"
 # De no ser asi, envia peticiones al nodo maestro, cada nodo sabe quien es el nodo maestro 
@@ -14,31 +18,36 @@ from queue import Queue
 # Todas las solicitudes las "coordina" el nodo maestro y les da el permiso para poder 
 #       realizar cualquier cosa que podria entrar en una exclusion mutua
 
-class Node:
+class Node(NodoComun):
     #Listado de los nodos. Todos saben de todos. Se hace la busqueda por IP
     lista_ip_nodo = {"192.168.253.129":1,"192.168.253.130":2,"192.168.253.132":3,"192.168.253.133":4,"192.168.253.134":5}
     lista_nodo_ip = {1:"192.168.253.129",2:"192.168.253.130",3:"192.168.253.132",4:"192.168.253.133",5:"192.168.253.134"}
 
-    def __init__(self, node_id, capacity):
+    def __init__(self, node_id, capacity, servidor_asincrono=False):
         self.node_id = node_id
         self.capacity = capacity
-        self.inventory = {}
+        self.inventory = AlmacenInventario()  # Inventario con indices, se carga una sola vez
         self.clients = {}
         self.master_alive = True
         self.master_id = None
         self.neighbors = None   #Exclusivamente para consenso y decisiones (Mensajeria entre nodos)
         self.access = False
-        self.request_queue = Queue()  # Cola de solicitudes
+        self.gestor_tokens = GestorTokens(self.send_token)  # Leases de acceso concedidos por este nodo
+        self.cerca = Cerca()  # Rechaza compras con un token de acceso viejo
+        self.lock_compras = threading.Lock()  # Cada compra se decide contra lo que dejo la anterior
+        self.ultimo_latido = {}  # IP -> monotonic del ultimo heartbeat recibido
+        self.preparar_comun(node_id, servidor_asincrono)  # Codec, versiones, diario, despachador (nodo_comun.py)
 
     def make_master(self, node_id):
         self.master_id = node_id
 
     def start(self, host):
-        self.host = host
-        self.port = 5000
+        self.abrir(host)  # Inventario recuperado, bitacora, diario y el socket del servidor
 
-        self.server_thread = threading.Thread(target=self.start_server)
-        self.server_thread.start()
+        self.iniciar_servidor()
+
+        # Ofrecer el formato binario a los demas nodos; mientras no respondan se usa JSON
+        self.negociar_codec()
 
         self.client_thread = threading.Thread(target=self.start_client)
         self.client_thread.start()
@@ -49,43 +58,45 @@ class Node:
         self.token_thread = threading.Thread(target=self.token_handler)
         self.token_thread.start()
 
-    def start_server(self):
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server_socket:
-            server_socket.bind((self.host, self.port))
+        self.sync_thread = threading.Thread(target=self.sync_loop)
+        self.sync_thread.start()
 
-            while True:
-                mensaje_recibido, direccion = server_socket.recvfrom(1024)
-                mensaje_decodificado = mensaje_recibido.decode('utf-8')
+    def get_node_address(self, node_id):
+        return (self.lista_nodo_ip[node_id], self.port)
 
-                # Add timestamp, node, and action to the message
-                timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                message_data = json.loads(mensaje_decodificado)
-                message_data['time'] = timestamp
-                message_data['node'] = self.node_id
-                action = message_data.get('action')
-
-                # Further processing based on the action
-                if action == 'request_access':
-                    self.handle_request_access(message_data)
-                elif action == 'update_inventory':
-                    self.handle_update_inventory(message_data)
-                elif action == 'get_inventory':
-                    self.handle_get_inventory(direccion, message_data)
-                elif action == 'buy_item':
-                    self.handle_buy_item(message_data)
+    def otros_nodos(self):
+        return [n for n in self.lista_nodo_ip if n != self.node_id]
+
+    def enviar_mensaje(self, direccion, mensaje):
+        # Codifica en el formato acordado con ese nodo (por IP)
+        datos = self.codec.codificar(mensaje, direccion[0])
+        self.registro_mensajes.registrar_evento('ENVIADO', direccion[0], mensaje)
+        self.enviador.enviar(datos, direccion)
+
+    def negociar_codec(self):
+        # Tambien se anuncia la capacidad, para el reparto (calcular_reparto en nodo_comun.py)
+        for node_id in self.lista_nodo_ip:
+            if node_id != self.node_id:
+                try:
+                    self.enviar_mensaje(self.get_node_address(node_id), self.codec.mensaje_hola())
+                    self.anunciar_capacidad(self.lista_nodo_ip[node_id])
+                except OSError as e:
+                    print(f"Error al negociar formato con el nodo {node_id}: {e}")
 
     def start_client(self):
         while True:
             time.sleep(5)
-            if self.master_alive and self.master_id is not None:
-                neighbor_id = self.neighbors[self.master_id]
-                neighbor_address = self.get_node_address(neighbor_id)
-
-                with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client_socket:
-                    try:
-                        client_socket.sendto(b'heartbeat', neighbor_address)
-                    except:
-                        self.master_alive = False
+            if self.master_alive and self.master_id is not None and self.master_id != self.node_id:
+                neighbor_id = self.neighbors[self.master_id] if self.neighbors else self.master_id
+                try:
+                    self.enviar_mensaje(self.get_node_address(neighbor_id), {'action': 'heartbeat', 'node_id': self.node_id})
+                except OSError as e:
+                    print(f"Error al enviar heartbeat al nodo {neighbor_id}: {e}")
+                    self.master_alive = False
+
+    @accion('heartbeat')
+    def handle_heartbeat(self, message, direccion):
+        self.ultimo_latido[direccion[0]] = time.monotonic()
 
     def check_master_alive(self):
         while True:
@@ -97,42 +108,39 @@ class Node:
         # Implementar lógica de elección de nuevo nodo maestro
         pass
 
-    def handle_update_inventory(self, message):
-        # Implementar lógica de consenso para actualizar el inventario
-        # Aquí se debe considerar la distribución equitativa y la verificación del espacio en cada sucursal
-        pass
-
-    def handle_get_inventory(self, client_address):
-        # Enviar el inventario al nodo cliente
-        response = {'action': 'send_inventory', 'inventory': self.inventory}
-        response_json = json.dumps(response).encode('utf-8')
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as response_socket:
-            response_socket.sendto(response_json, client_address)
-
-    def handle_buy_item(self, message):
-            # Implementar lógica de exclusión mutua para la compra de un artículo
-        pass
-
-    def send_token(self, recipient_id, token):
-        recipient_address = self.get_node_address(recipient_id)
-
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client_socket:
-            message = {'action': 'token', 'token': token}
-            message_json = json.dumps(message).encode('utf-8')
-            client_socket.sendto(message_json, recipient_address)
-
-    def token_handler(self):
-        while True:
-            time.sleep(1)
-
-            if not self.token_stack and not self.request_queue.empty():
-                # Si no hay tokens disponibles y hay solicitudes en la cola, generar un nuevo token
-                new_token = f'Token-{time.time()}'
-                #self.token_stack.append(new_token)
-
-                # Desencolar la solicitud y enviar el token al nodo que solicitó acceso
-                node_id = self.request_queue.get()
-                #self.send_token(node_id, new_token)
+    @accion('request_access')
+    def handle_request_access(self, message, direccion=None):
+        # Se concede en cuanto nadie tenga esos articulos; si no, espera su turno en el planificador
+        self.gestor_tokens.solicitar(message.get('node_id'), message.get('items'), message.get('solicitud'),
+                                     message.get('clase', CLASE_VENTA))
+
+    @accion('release_access')
+    def handle_release_access(self, message, direccion=None):
+        self.gestor_tokens.liberar(message.get('node_id'), message.get('token'))
+
+    @accion('update_inventory')
+    def handle_update_inventory(self, message, direccion):
+        # Reparto de las unidades sin asignar segun el espacio libre de cada sucursal conocida.
+        # Los demas nodos reciben las columnas nuevas por la sincronizacion
+        with self.lock_compras:
+            entradas, (asignado, sin_espacio) = self.calcular_reparto(message.get('items') or None)
+            self.aplicar_replicado(entradas)
+        if message.get('solicitud') is not None:
+            self.enviar_mensaje((direccion[0], self.port), {'action': 'update_result', 'solicitud': message['solicitud'],
+                                                            'asignado': asignado, 'sin_espacio': sin_espacio})
+
+    @accion('buy_item')
+    def handle_buy_item(self, message, direccion):
+        # Con token (concedido por este nodo) se aplica si el lease sigue vigente; sin token,
+        # solo si la columna sigue en la version que trae (ver resolver_compras)
+        with self.lock_compras:
+            entradas, resultados = resolver_compras([message], self.inventory, self.versiones,
+                                                    self.gestor_tokens, self.cerca)
+            self.aplicar_replicado(entradas)
+        if message.get('solicitud') is not None:
+            resultado = resultados[0]
+            resultado.update(action='buy_result', solicitud=message['solicitud'])
+            self.enviar_mensaje((direccion[0], self.port), resultado)
 
     def recibir_mensajes(self):
         mensaje_confirmado = False
@@ -146,7 +154,7 @@ class Node:
 
                 timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
                 mensaje_completo = f"{timestamp} - Mensaje RECIBIDO de {direccion}: {mensaje_json}"
-                mensajes_para_guardar.append(mensaje_completo)
+                self.registro_mensajes.registrar_evento('RECIBIDO', direccion[0], mensaje_json)
 
                 if not mensaje_confirmado:
                     # Enviar un mensaje de confirmación al remitente
@@ -157,13 +165,6 @@ class Node:
             except socket.timeout:
                 mensaje_confirmado = False
 
-    def guardar_mensajes(self):
-        while True:
-            if mensajes_para_guardar:
-                mensaje_para_guardar = mensajes_para_guardar.pop(0)
-                with open("logMensajes.txt", "a") as log_file:
-                    log_file.write(mensaje_para_guardar + "\n")
-                time.sleep(1)  # Espera un segundo antes de intentar guardar el siguiente mensaje
 
     def enviar_mensajes(self):
         while True:
@@ -180,17 +181,64 @@ class Node:
             # Envía el mensaje a la dirección IP de destino especificada
             destino_puerto = 5000
             s.sendto(json.dumps(mensaje_json).encode('utf-8'), (destino_ip, destino_puerto))
-            mensajes_para_guardar.append(mensaje_completo)
+            self.registro_mensajes.registrar_evento('ENVIADO', destino_ip, mensaje_json)
 
     def consultar(self, nodo):
-        print(Node.load_inventory_from_file())
-        pass
-
-    def vender(self, item_id, cantidad):
-        pass
+        # Pide el inventario al nodo y muestra las filas conforme llegan los fragmentos
+        try:
+            nodo = int(nodo)
+            direccion = self.get_node_address(nodo)
+        except (ValueError, KeyError):
+            print(f"Nodo no valido: {nodo}")
+            return
+
+        if nodo == self.node_id:
+            # El inventario propio ya esta en memoria, no hace falta ir a la red ni al archivo
+            for a in sorted(self.inventory.articulos.values(), key=lambda a: a.id):
+                print(f"{a.id:<6}{a.articulo:<20}{a.inv[nodo - 1]:>6}")
+            return
+
+        def pedir_reenvio(transfer_id, faltan):
+            self.enviar_mensaje(direccion, {'action': 'inventory_resend', 'id': transfer_id, 'faltan': faltan})
+
+        recepcion = self.reensamblador.nueva(pedir_reenvio)
+        self.enviar_mensaje(direccion, {'action': 'get_inventory', 'id': recepcion.id})
+        try:
+            for item_id, registro in recepcion.filas():
+                print(f"{item_id:<6}{registro['articulo']:<20}{registro.get(f'Inv{nodo}', 0):>6}")
+        finally:
+            self.reensamblador.terminar(recepcion.id)
+
+    def ajustar_existencia(self, item_id, sucursal, delta, token=None):
+        # Aplica el cambio en memoria y lo anota en la bitacora; regresa el lsn o None si no alcanza
+        columna = f"Inv{sucursal}"
+        with self.bitacora.lock:
+            actual = self.inventory.valor(item_id, columna)
+            if actual is None or actual + delta < 0:
+                return None
+            version = self.versiones.actualizar(item_id, columna, actual + delta)
+            lsn = self.bitacora.anotar(item_id, sucursal, delta, token, version)
+        # Se confirma hasta que el grupo de registros esta en disco
+        self.bitacora.esperar(lsn)
+        return lsn
+
+    def vender(self, item_id, cantidad, cliente=0):
+        cantidad = self.leer_cantidad(item_id, cantidad)
+        if cantidad is None:
+            return
+        lsn = self.ajustar_existencia(item_id, self.node_id, -cantidad)
+        if lsn is None:
+            print(f"No hay existencias suficientes de {item_id} en la sucursal {self.node_id}")
+            return
+        # Ticket: IDARTICULO+SERIE+SUCURSAL+IDCLIENTE
+        print(f"Ticket: {item_id}-{lsn}-{self.node_id}-{cliente}")
 
     def agregar(self, item_id, cantidad):
-        pass
+        cantidad = self.leer_cantidad(item_id, cantidad)
+        if cantidad is None:
+            return
+        self.ajustar_existencia(item_id, self.node_id, cantidad)
+        print(f"Se agregaron {cantidad} unidades de {item_id} a la sucursal {self.node_id}")
 
     def load_inventory_from_file(self, file_path="inventario.json"):
         try:
@@ -205,7 +253,7 @@ class Node:
             return None
 
 #Funcion para hacer la seleccion de comando (Punto de vista del usuario que controla todo)
-def sel_comando():
+def sel_comando(node):
     comando = input("Escribe un comando:").split()
     if not comando:
         pass
@@ -215,22 +263,25 @@ def sel_comando():
         if seleccion == "help":
             print("""La lista de comandos es:
     /consultar {nodo} #Regresa el listado de id, articulo y cantidad, del nodo, en pantalla
+    /buscar [categoria=X] [min=N] [max=N] [sucursal=N] #Lista los articulos que cumplen los filtros
     /vender {item_id} {cantidad} #Regresa un "ticket" en pantalla con (IDARTICULO+SERIE+SUCURSAL+IDCLIENTE)
     /agregar {item_id} {cantidad} #Regresa una confirmacion en pantalla de que fue agregado exitosamente
 Gracias""")
         elif seleccion == "consultar":
             if (len(comando) == 2):
-                Node.consultar(comando[1])
+                node.consultar(comando[1])
             else:
                 print("Especifica el nodo a consultar el inventario")
+        elif seleccion == "buscar":
+            node.buscar(comando[1:])
         elif seleccion == "vender":
             if (len(comando) == 3):
-                Node.vender(comando[1],comando[2])
+                node.vender(comando[1],comando[2])
             else:
                 print("Especifica el id del item y la cantidad a vender")
         elif seleccion == "agregar":
             if (len(comando) == 3):
-                Node.agregar(comando[1],comando[2])
+                node.agregar(comando[1],comando[2])
             else:
                 print("Especifica el id del item y la cantidad a agregar")
         else:
@@ -262,7 +313,7 @@ def main():
     node.start(host= get_local_ip())
 
     while True:
-        sel_comando()
+        sel_comando(node)
 
 main()
 
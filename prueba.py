@@ -4,6 +4,10 @@ import time
 import json
 from collections import deque
 from queue import Queue
+from registro_mensajes import RegistroMensajes
+
+# Los mensajes se guardan por lotes en logMensajes.txt desde un hilo aparte
+registro_mensajes = RegistroMensajes("logMensajes.txt").iniciar()
 
 class Node:
     def __init__(self, node_id, capacity, neighbors):
@@ -150,7 +154,7 @@ class Node:
 
                 timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
                 mensaje_completo = f"{timestamp} - Mensaje RECIBIDO de {direccion}: {mensaje_json}"
-                mensajes_para_guardar.append(mensaje_completo)
+                registro_mensajes.registrar(mensaje_completo)
 
                 if not mensaje_confirmado:
                     # Enviar un mensaje de confirmación al remitente
@@ -161,13 +165,6 @@ class Node:
             except socket.timeout:
                 mensaje_confirmado = False
 
-    def guardar_mensajes():
-        while True:
-            if mensajes_para_guardar:
-                mensaje_para_guardar = mensajes_para_guardar.pop(0)
-                with open("logMensajes.txt", "a") as log_file:
-                    log_file.write(mensaje_para_guardar + "\n")
-                time.sleep(1)  # Espera un segundo antes de intentar guardar el siguiente mensaje
 
     def enviar_mensajes():
         while True:
@@ -185,7 +182,7 @@ class Node:
             # Envía el mensaje a la dirección IP de destino especificada
             destino_puerto = 12345
             s.sendto(json.dumps(mensaje_json).encode('utf-8'), (destino_ip, destino_puerto))
-            mensajes_para_guardar.append(mensaje_completo)
+            registro_mensajes.registrar(mensaje_completo)
 
 # Definir la malla cerrada de nodos (cada nodo tiene un vecino a la izquierda y uno a la derecha)
 neighbors = {1: 2, 2: 3, 3: 4, 4: 5, 5: 1}
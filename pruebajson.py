@@ -2,8 +2,9 @@ import socket
 import threading
 import time
 import json
+from registro_mensajes import RegistroMensajes
 
-mensajes_para_guardar = []
+registro_mensajes = RegistroMensajes("logMensajes.txt")
 
 class Nodo:
     def __init__(self):
@@ -30,7 +31,7 @@ class Nodo:
 
                 timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
                 mensaje_completo = f"{timestamp} - Mensaje RECIBIDO de {direccion}: {mensaje_json}"
-                mensajes_para_guardar.append(mensaje_completo)
+                registro_mensajes.registrar(mensaje_completo)
 
                 if not mensaje_confirmado:
                     # Enviar un mensaje de confirmación al remitente
@@ -42,14 +43,6 @@ class Nodo:
                 mensaje_confirmado = False
 
 
-    def guardar_mensajes():
-        while True:
-            if mensajes_para_guardar:
-                mensaje_para_guardar = mensajes_para_guardar.pop(0)
-                with open("logMensajes.txt", "a") as log_file:
-                    log_file.write(mensaje_para_guardar + "\n")
-                time.sleep(1)  # Espera un segundo antes de intentar guardar el siguiente mensaje
-
 
     def enviar_mensajes():
         while True:
@@ -67,7 +60,7 @@ class Nodo:
             # Envía el mensaje a la dirección IP de destino especificada
             destino_puerto = 12345
             s.sendto(json.dumps(mensaje_json).encode('utf-8'), (destino_ip, destino_puerto))
-            mensajes_para_guardar.append(mensaje_completo)
+            registro_mensajes.registrar(mensaje_completo)
 
 
 # Configura la dirección y el puerto en esta máquina virtual
@@ -78,20 +71,18 @@ s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 s.bind((mi_ip, mi_puerto))
 s.settimeout(1)
 
-# Crea hilos para recibir, enviar y guardar mensajes
+# Crea hilos para recibir y enviar mensajes
 thread_recibir = threading.Thread(target=recibir_mensajes)
 thread_enviar = threading.Thread(target=enviar_mensajes)
-thread_guardar = threading.Thread(target=guardar_mensajes)
 
 # Que corran en segundo plano
 thread_recibir.daemon = True
 thread_enviar.daemon = True
-thread_guardar.daemon = True
 
 # Los inicializa
 thread_recibir.start()
 thread_enviar.start()
-thread_guardar.start()
+registro_mensajes.iniciar()
 
 # El programa principal no hace nada más que esperar
 while True:
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import deque
+
+# Rebalanceo de existencias cuando se cae una sucursal
+# Lo que tenia la columna InvN de la sucursal caida se pasa a las que siguen vivas segun su
+# espacio libre (mismo reparto que update_inventory). Cada unidad se mueve una sola vez y
+# directo a su destino final; entre las sucursales vivas no se mueve nada. Se hace en un hilo
+# aparte y en tandas de LOTE_MOVIMIENTOS, soltando el lock de la bitacora entre tandas para
+# que las ventas no esperen a que termine todo
+#
+# Cada movimiento se recuerda por sucursal caida, articulo y destino. Si la sucursal regresa
+# se le devuelve lo movido (si a media tarea, se detiene y se devuelve lo que alcanzo a moverse).
+# Lo que el destino ya vendio no se puede devolver: esas unidades se quedan fusionadas en el destino.
+# Lo que no alcanzo a devolverse (la mayoria no confirmo, o se volvio a caer) se sigue recordando
+
+LOTE_MOVIMIENTOS = 200
+PAUSA = 0.01   # Segundos entre tandas
+
+
+class Rebalanceador:
+    def __init__(self, planear, mover, existencia, lote=LOTE_MOVIMIENTOS, pausa=PAUSA):
+        self.planear = planear  # funcion (sucursal caida) -> [(item, origen, destino, unidades)]
+        self.mover = mover      # funcion (movimientos) -> movimientos que si se hicieron
+        self.existencia = existencia  # funcion (item, sucursal) -> unidades que tiene ahora
+        self.lote = lote
+        self.pausa = pausa
+        self.caidas = set()     # Sucursales que se consideran caidas ahora
+        self.movidos = {}       # sucursal -> {(item, destino): unidades}
+        self.eventos = deque()
+        self.cond = threading.Condition()
+        # Metricas
+        self.unidades_movidas = 0
+        self.unidades_devueltas = 0
+        self.unidades_fusionadas = 0
+
+    def caida(self, sucursal):
+        with self.cond:
+            if sucursal is None or sucursal in self.caidas:
+                return
+            self.caidas.add(sucursal)
+            self.eventos.append(sucursal)
+            self.cond.notify()
+
+    def regreso(self, sucursal):
+        with self.cond:
+            if sucursal is None or sucursal not in self.caidas:
+                return
+            self.caidas.discard(sucursal)
+            self.eventos.append(sucursal)
+            self.cond.notify()
+
+    def correr(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.eventos)
+                sucursal = self.eventos.popleft()
+                caida = sucursal in self.caidas
+            try:
+                # Se actua segun el estado actual, no segun el evento: repetidos no hacen nada
+                if caida:
+                    self._redistribuir(sucursal)
+                else:
+                    self._devolver(sucursal)
+            except Exception as e:
+                print(f"Error al rebalancear la sucursal {sucursal}: {e}")
+
+    def _en_tandas(self, plan, sigue):
+        for i in range(0, len(plan), self.lote):
+            if not sigue():
+                return
+            yield self.mover(plan[i:i + self.lote])
+            time.sleep(self.pausa)
+
+    def _redistribuir(self, sucursal):
+        plan = self.planear(sucursal)
+        total = 0
+        for hechos in self._en_tandas(plan, lambda: sucursal in self.caidas):
+            with self.cond:
+                movidos = self.movidos.setdefault(sucursal, {})
+                for item_id, origen, destino, unidades in hechos:
+                    movidos[(item_id, destino)] = movidos.get((item_id, destino), 0) + unidades
+                    total += unidades
+                self.unidades_movidas += sum(m[3] for m in hechos)
+        if total:
+            print(f"Se pasaron {total} unidades de la sucursal {sucursal} a las demas")
+
+    def _devolver(self, sucursal):
+        # Cada devolucion se limita a lo que el destino aun tiene; la diferencia ya se vendio
+        with self.cond:
+            movidos = self.movidos.get(sucursal, {})
+            pares = list(movidos.items())
+        tiene = {par: self.existencia(*par) for par, _ in pares}
+        plan = []
+        with self.cond:
+            for (item_id, destino), unidades in pares:
+                devolver = min(unidades, max(0, tiene[(item_id, destino)]))
+                self.unidades_fusionadas += unidades - devolver
+                if devolver:
+                    movidos[(item_id, destino)] = devolver
+                    plan.append((item_id, destino, sucursal, devolver))
+                else:
+                    del movidos[(item_id, destino)]
+        devueltas = 0
+        for hechos in self._en_tandas(plan, lambda: sucursal not in self.caidas):
+            with self.cond:
+                # Solo se olvida lo que si se movio; el resto queda para la siguiente devolucion
+                for item_id, origen, destino, unidades in hechos:
+                    restantes = movidos.get((item_id, origen), 0) - unidades
+                    if restantes > 0:
+                        movidos[(item_id, origen)] = restantes
+                    else:
+                        movidos.pop((item_id, origen), None)
+                    devueltas += unidades
+                self.unidades_devueltas += sum(m[3] for m in hechos)
+        with self.cond:
+            if not movidos:
+                self.movidos.pop(sucursal, None)
+        if plan:
+            pendientes = sum(movidos.values())
+            print(f"Se regresaron {devueltas} unidades a la sucursal {sucursal}"
+                  + (f", faltan {pendientes}" if pendientes else ""))
+
+    def metricas(self):
+        with self.cond:
+            return {
+                'caidas': sorted(self.caidas),
+                'pendientes': len(self.eventos),
+                'por_devolver': {s: sum(m.values()) for s, m in self.movidos.items()},
+                'unidades_movidas': self.unidades_movidas,
+                'unidades_devueltas': self.unidades_devueltas,
+                'unidades_fusionadas': self.unidades_fusionadas,
+            }
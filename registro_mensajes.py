@@ -0,0 +1,132 @@
+import os
+import threading
+from queue import Queue, Full, Empty
+
+# Registro de mensajes por lotes (reemplaza a guardar_mensajes)
+# Los hilos que reciben y envian mensajes solo encolan la linea; un hilo escritor junta
+# varias lineas y las escribe de una vez, con el archivo abierto todo el tiempo. Cuando el
+# archivo pasa de cierto tamaño se rota (logMensajes.txt.1, .2, ...). Si la cola se llena
+# se aplica la politica configurada: esperar (contrapresion) o descartar mensajes
+
+POLITICA_BLOQUEAR = 'bloquear'
+POLITICA_DESCARTAR_NUEVOS = 'descartar_nuevos'
+POLITICA_DESCARTAR_VIEJOS = 'descartar_viejos'
+
+MAX_COLA = 10000
+TAM_LOTE = 512
+MAX_BYTES = 10 * 1024 * 1024
+RESPALDOS = 3
+ESPERA_BLOQUEO = 1.0   # Segundos que espera registrar() con la politica de bloquear
+
+
+class RegistroMensajes:
+    def __init__(self, ruta="logMensajes.txt", max_cola=MAX_COLA, tam_lote=TAM_LOTE, max_bytes=MAX_BYTES,
+                 respaldos=RESPALDOS, politica=POLITICA_BLOQUEAR, espera_bloqueo=ESPERA_BLOQUEO):
+        self.ruta = ruta
+        self.cola = Queue(maxsize=max_cola)
+        self.tam_lote = tam_lote
+        self.max_bytes = max_bytes
+        self.respaldos = respaldos
+        self.politica = politica
+        self.espera_bloqueo = espera_bloqueo
+        self.archivo = None
+        self.hilo = None
+        self.activo = False
+        # Metricas
+        self.encolados = 0
+        self.escritos = 0
+        self.descartados = 0
+        self.lotes = 0
+        self.rotaciones = 0
+        self.errores = 0
+
+    def iniciar(self):
+        self.archivo = open(self.ruta, "a")
+        self.activo = True
+        self.hilo = threading.Thread(target=self.escritor, daemon=True)
+        self.hilo.start()
+        return self
+
+    def registrar(self, linea):
+        # Regresa False si el mensaje se descarto
+        try:
+            if self.politica == POLITICA_BLOQUEAR:
+                self.cola.put(linea, timeout=self.espera_bloqueo)
+            else:
+                self.cola.put_nowait(linea)
+        except Full:
+            if self.politica != POLITICA_DESCARTAR_VIEJOS:
+                self.descartados += 1
+                return False
+            # Se tira el mensaje mas viejo para hacer lugar al nuevo
+            try:
+                self.cola.get_nowait()
+                self.descartados += 1
+            except Empty:
+                pass
+            try:
+                self.cola.put_nowait(linea)
+            except Full:
+                self.descartados += 1
+                return False
+        self.encolados += 1
+        return True
+
+    def escritor(self):
+        while self.activo or not self.cola.empty():
+            try:
+                lote = [self.cola.get(timeout=0.5)]
+            except Empty:
+                continue
+            while len(lote) < self.tam_lote:
+                try:
+                    lote.append(self.cola.get_nowait())
+                except Empty:
+                    break
+            try:
+                self.escribir(lote)
+            except Exception as e:
+                # Un lote con error se pierde, pero el escritor sigue; si no, registrar() se
+                # quedaria esperando con la cola llena
+                self.errores += 1
+                print(f"Error al escribir el registro de mensajes: {e}")
+
+    def escribir(self, lote):
+        self.archivo.write("\n".join(lote) + "\n")
+        self.archivo.flush()
+        self.escritos += len(lote)
+        self.lotes += 1
+        if self.archivo.tell() >= self.max_bytes:
+            self.rotar()
+
+    def rotar(self):
+        self.archivo.close()
+        for n in range(self.respaldos - 1, 0, -1):
+            origen = f"{self.ruta}.{n}"
+            if os.path.exists(origen):
+                os.replace(origen, f"{self.ruta}.{n + 1}")
+        if self.respaldos > 0:
+            os.replace(self.ruta, f"{self.ruta}.1")
+        else:
+            os.remove(self.ruta)
+        self.archivo = open(self.ruta, "a")
+        self.rotaciones += 1
+
+    def detener(self, timeout=5):
+        # Espera a que se escriba lo que queda en la cola
+        self.activo = False
+        if self.hilo is not None:
+            self.hilo.join(timeout)
+        if self.archivo is not None:
+            self.archivo.close()
+
+    def metricas(self):
+        return {
+            'profundidad': self.cola.qsize(),
+            'encolados': self.encolados,
+            'escritos': self.escritos,
+            'descartados': self.descartados,
+            'lotes': self.lotes,
+            'rotaciones': self.rotaciones,
+            'errores': self.errores,
+        }
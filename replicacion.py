@@ -0,0 +1,361 @@
+import threading
+import time
+
+# Replicacion del inventario por log con quorum (al estilo Raft, version reducida)
+# Cada cambio que hace el maestro (ventas, altas, reparto, rebalanceo) se agrega al log como
+# una entrada con el termino actual y la lista de columnas que cambiaron, en el mismo formato
+# que la sincronizacion ({'item', 'campo', 'valor', 'version'}). El maestro manda las
+# entradas a todos; cuando la mayoria de los nodos las tiene se comprometen y cada nodo las
+# aplica en orden. El maestro solo le contesta a la sucursal despues de comprometer, asi una
+# venta confirmada sobrevive a la caida de cualquier nodo, incluido el maestro: la eleccion
+# solo da el voto a candidatos con el log al menos igual de completo (puede_votar)
+#
+# Todos, el maestro incluido, aplican una entrada (inventario y bitacora) hasta que se
+# compromete: nadie ve ni sincroniza un cambio que la mayoria no confirmo. El maestro calcula
+# cada cambio sobre lo que ya aplico y no propone el siguiente hasta tener todo su log
+# aplicado (esperar_al_dia), asi la siguiente compra se valida contra el valor que dejo la
+# anterior. Diferencias con Raft: el log vive en memoria; lo durable es el inventario
+# (bitacora). Un nodo que se quedo atras de lo que el maestro todavia guarda en el log recibe
+# una instantanea del inventario (mensajes 'instalar', por el canal confiable, con el indice
+# aplicado al que corresponde). Solo cuando tiene todas las partes la instala, mueve su base a
+# ese indice y lo confirma; hasta esa confirmacion el maestro no le manda entradas
+
+INTERVALO_REPLICA = 0.1  # Segundos entre reenvios a los seguidores atrasados (y latido del log)
+ESPERA_QUORUM = 2.0      # Segundos que el maestro espera a la mayoria antes de rendirse
+CAMBIOS_POR_ENTRADA = 40
+ENTRADAS_POR_MENSAJE = 8
+MAX_LOG = 10000          # Entradas en memoria; las aplicadas mas viejas se descartan
+ESPERA_INSTALACION = 5.0  # Segundos sin confirmacion antes de volver a mandar una instantanea
+
+ACCIONES_REPLICACION = ('replicar', 'replicado', 'instalar')
+
+
+class Replicacion:
+    def __init__(self, ip, enviar, electorado, termino, es_lider, aplicar, instantanea=None, adoptar_termino=None):
+        self.ip = ip
+        self.enviar = enviar          # funcion (ip, mensaje)
+        self.electorado = electorado  # funcion que regresa las IPs que cuentan para la mayoria
+        self.termino = termino        # funcion que regresa el termino actual de la eleccion
+        self.es_lider = es_lider      # funcion
+        self.aplicar = aplicar        # funcion (cambios) que aplica una entrada comprometida
+        self.instantanea = instantanea  # funcion () -> cambios con el inventario completo (para los muy atrasados)
+        self.adoptar_termino = adoptar_termino  # funcion (termino) para un termino mayor que trae el maestro
+
+        self.log = []                 # [(termino, cambios)]; la entrada i esta en log[i - base - 1]
+        self.base = 0
+        self.termino_base = 0
+        self.comprometido = 0
+        self.aplicado = 0
+        self.siguiente = {}           # ip -> siguiente indice que hay que mandarle
+        self.coincide = {}            # ip -> ultimo indice que se sabe que tiene igual
+        self.instalando = {}          # ip -> (indice, cuando se mando) de la instantanea sin confirmar
+        self.partes = {}              # ip -> ((termino, indice), {parte: cambios}) de la que se esta recibiendo
+        self.ultimo_contacto = time.monotonic()
+        self.cond = threading.Condition()
+        # Metricas
+        self.propuestas = 0
+        self.sin_quorum = 0
+        self.lecturas_locales = 0
+        self.lecturas_fuertes = 0
+        self.instantaneas = 0
+
+    # --- Log
+
+    def ultimo(self):
+        return self.base + len(self.log)
+
+    def termino_de(self, indice):
+        if indice == self.base:
+            return self.termino_base
+        if self.base < indice <= self.ultimo():
+            return self.log[indice - self.base - 1][0]
+        return None
+
+    def _compactar(self):
+        # Llamar con self.cond tomado. Solo se descartan entradas ya aplicadas
+        if len(self.log) <= MAX_LOG:
+            return
+        hasta = min(self.aplicado, self.ultimo() - MAX_LOG // 2)
+        if hasta <= self.base:
+            return
+        self.termino_base = self.termino_de(hasta)
+        del self.log[:hasta - self.base]
+        self.base = hasta
+
+    def _aplicar_comprometidas(self):
+        # Llamar con self.cond tomado, asi se aplican en orden
+        while self.aplicado < self.comprometido:
+            self.aplicado += 1
+            cambios = self.log[self.aplicado - self.base - 1][1]
+            if cambios:
+                self.aplicar(cambios)
+        self.cond.notify_all()
+        self._compactar()
+
+    # --- Maestro
+
+    def al_ser_lider(self):
+        with self.cond:
+            for ip in self.siguiente:
+                self.siguiente[ip] = self.ultimo() + 1
+            self.coincide = {}
+            self.instalando = {}
+        # Entrada vacia del termino nuevo: al comprometerla quedan comprometidas las anteriores
+        self.proponer([])
+
+    def proponer(self, cambios):
+        # Regresa el indice de la ultima entrada agregada
+        with self.cond:
+            termino = self.termino()
+            for i in range(0, max(len(cambios), 1), CAMBIOS_POR_ENTRADA):
+                self.log.append((termino, cambios[i:i + CAMBIOS_POR_ENTRADA]))
+            indice = self.ultimo()
+            self.propuestas += 1
+            self._avanzar()
+        self._replicar_todos()
+        return indice
+
+    def esperar(self, indice, timeout=ESPERA_QUORUM):
+        # True si la entrada quedo comprometida por la mayoria
+        with self.cond:
+            listo = self.cond.wait_for(lambda: self.comprometido >= indice or not self.es_lider(), timeout)
+            if listo and self.comprometido >= indice:
+                return True
+            self.sin_quorum += 1
+            return False
+
+    def esperar_al_dia(self, timeout=ESPERA_QUORUM):
+        # En el maestro: True cuando todo su log esta comprometido y aplicado (por ejemplo una
+        # propuesta anterior que no junto la mayoria a tiempo, o lo del termino anterior)
+        with self.cond:
+            listo = self.cond.wait_for(lambda: self.aplicado >= self.ultimo() or not self.es_lider(), timeout)
+            return listo and self.es_lider() and self.aplicado >= self.ultimo()
+
+    def _seguidores(self):
+        return [ip for ip in set(self.electorado()) if ip != self.ip]
+
+    def _avanzar(self):
+        # Llamar con self.cond tomado. Se compromete lo que ya tiene la mayoria, pero solo
+        # contando entradas del termino actual (las de terminos anteriores entran con ellas)
+        votantes = set(self.electorado()) | {self.ip}
+        mayoria = len(votantes) // 2 + 1
+        termino = self.termino()
+        for n in range(self.ultimo(), self.comprometido, -1):
+            if self.termino_de(n) != termino:
+                break
+            copias = 1 + sum(1 for ip in votantes if ip != self.ip and self.coincide.get(ip, 0) >= n)
+            if copias >= mayoria:
+                self.comprometido = n
+                self._aplicar_comprometidas()
+                break
+
+    def _mensaje_para(self, ip):
+        # Llamar con self.cond tomado
+        siguiente = self.siguiente.setdefault(ip, self.ultimo() + 1)
+        prev = siguiente - 1
+        fin = min(self.ultimo(), prev + ENTRADAS_POR_MENSAJE)
+        return {'action': 'replicar', 'termino': self.termino(), 'comprometido': self.comprometido,
+                'prev_indice': prev, 'prev_termino': self.termino_de(prev),
+                'entradas': [list(e) for e in self.log[prev - self.base:fin - self.base]]}
+
+    def _instantanea_para(self, ip):
+        # Llamar con self.cond tomado, asi el inventario corresponde justo a self.aplicado.
+        # Lo que le falta ya no esta en el log: todo el inventario, en partes del tamano de una entrada
+        cambios = self.instantanea() if self.instantanea is not None else []
+        self.instalando[ip] = (self.aplicado, time.monotonic())
+        self.instantaneas += 1
+        partes = [cambios[i:i + CAMBIOS_POR_ENTRADA] for i in range(0, max(len(cambios), 1), CAMBIOS_POR_ENTRADA)]
+        return [{'action': 'instalar', 'termino': self.termino(), 'indice': self.aplicado,
+                 'indice_termino': self.termino_de(self.aplicado), 'parte': k, 'partes': len(partes),
+                 'cambios': parte} for k, parte in enumerate(partes)]
+
+    def _replicar_a(self, ip):
+        with self.cond:
+            if not self.es_lider():
+                return
+            instalando = self.instalando.get(ip)
+            if instalando is not None and time.monotonic() - instalando[1] < ESPERA_INSTALACION:
+                return  # Se espera a que confirme la instantanea
+            if self.siguiente.setdefault(ip, self.ultimo() + 1) <= self.base:
+                mensajes = self._instantanea_para(ip)
+            else:
+                mensajes = [self._mensaje_para(ip)]
+        try:
+            for mensaje in mensajes:
+                self.enviar(ip, mensaje)
+        except OSError as e:
+            print(f"Error al replicar a {ip}: {e}")
+
+    def _replicar_todos(self):
+        for ip in self._seguidores():
+            self._replicar_a(ip)
+
+    def correr(self):
+        while True:
+            time.sleep(INTERVALO_REPLICA)
+            if self.es_lider():
+                with self.cond:
+                    self._avanzar()  # Por si cambio el numero de nodos
+                self._replicar_todos()
+
+    # --- Mensajes
+
+    def recibir(self, mensaje, ip):
+        accion = mensaje.get('action')
+        if accion in ('replicar', 'instalar'):
+            if self.adoptar_termino is not None and mensaje.get('termino', 0) > self.termino():
+                # De un maestro de un termino que aun no conociamos
+                self.adoptar_termino(mensaje['termino'])
+            if accion == 'replicar':
+                respuesta = self._recibir_entradas(mensaje)
+            else:
+                respuesta = self._recibir_instantanea(mensaje, ip)
+            if respuesta is None:
+                return
+            try:
+                self.enviar(ip, respuesta)
+            except OSError as e:
+                print(f"Error al contestar la replicacion a {ip}: {e}")
+        elif accion == 'replicado':
+            self._recibir_respuesta(mensaje, ip)
+
+    def _recibir_entradas(self, mensaje):
+        with self.cond:
+            termino = self.termino()
+            respuesta = {'action': 'replicado', 'termino': termino, 'exito': False, 'coincide': 0}
+            if mensaje.get('termino', 0) < termino:
+                return respuesta  # De un maestro viejo
+            self.ultimo_contacto = time.monotonic()
+            prev, prev_termino = mensaje['prev_indice'], mensaje['prev_termino']
+            entradas = mensaje.get('entradas') or []
+            if prev < self.base:
+                # Esas entradas ya estan aplicadas y compactadas aqui
+                entradas = entradas[self.base - prev:]
+                prev = self.base
+            elif prev > self.ultimo() or self.termino_de(prev) != prev_termino:
+                # Hueco o conflicto: el maestro retrocede y vuelve a intentar
+                respuesta['coincide'] = min(self.ultimo(), prev - 1)
+                return respuesta
+            for k, (t, cambios) in enumerate(entradas):
+                indice = prev + 1 + k
+                if indice <= self.ultimo():
+                    if self.termino_de(indice) == t:
+                        continue
+                    # Entrada de otro termino que nunca se comprometio: se descarta con lo que sigue
+                    del self.log[indice - self.base - 1:]
+                self.log.append((t, cambios))
+            coincide = prev + len(entradas)
+            self.comprometido = max(self.comprometido, min(mensaje.get('comprometido', 0), coincide))
+            self._aplicar_comprometidas()
+            respuesta.update(exito=True, coincide=coincide)
+            return respuesta
+
+    def _recibir_instantanea(self, mensaje, ip):
+        # Se juntan las partes (el canal confiable no garantiza el orden); con todas se instala
+        with self.cond:
+            termino = self.termino()
+            if mensaje.get('termino', 0) < termino:
+                return {'action': 'replicado', 'termino': termino, 'exito': False, 'coincide': 0}
+            self.ultimo_contacto = time.monotonic()
+            indice, indice_termino = mensaje['indice'], mensaje['indice_termino']
+            llave = (mensaje['termino'], indice)
+            if ip in self.partes and llave < self.partes[ip][0]:
+                return None  # Parte de una instantanea vieja (reenvio) mientras llega una mas nueva
+            if ip not in self.partes or self.partes[ip][0] != llave:
+                self.partes[ip] = (llave, {})
+            partes = self.partes[ip][1]
+            partes[mensaje['parte']] = mensaje.get('cambios') or []
+            if len(partes) < mensaje['partes']:
+                return None
+            del self.partes[ip]
+            if indice > self.aplicado:
+                for k in range(mensaje['partes']):
+                    if partes[k]:
+                        self.aplicar(partes[k])
+                if self.termino_de(indice) == indice_termino:
+                    # Lo que sigue en el log concuerda con el maestro: se conserva
+                    del self.log[:indice - self.base]
+                else:
+                    self.log = []
+                self.base = indice
+                self.termino_base = indice_termino
+                self.comprometido = max(self.comprometido, indice)
+                self.aplicado = indice
+                self.cond.notify_all()
+            # Se confirma ya instalada (o si es un reenvio de una que ya teniamos)
+            return {'action': 'replicado', 'termino': termino, 'exito': True, 'coincide': indice}
+
+    def _recibir_respuesta(self, mensaje, ip):
+        with self.cond:
+            if not self.es_lider() or mensaje.get('termino', 0) != self.termino():
+                return
+            if mensaje.get('exito'):
+                instalando = self.instalando.get(ip)
+                if instalando is not None and mensaje['coincide'] >= instalando[0]:
+                    del self.instalando[ip]
+                self.coincide[ip] = max(self.coincide.get(ip, 0), mensaje['coincide'])
+                self.siguiente[ip] = self.coincide[ip] + 1
+                self._avanzar()
+                pendiente = self.siguiente[ip] <= self.ultimo()
+            else:
+                self.siguiente[ip] = max(0, min(self.siguiente.get(ip, 1) - 1, mensaje.get('coincide', 0) + 1))
+                pendiente = True
+        if pendiente:
+            self._replicar_a(ip)
+
+    # --- Eleccion y lecturas
+
+    def datos_voto(self):
+        with self.cond:
+            return {'ultimo_indice': self.ultimo(), 'ultimo_termino': self.termino_de(self.ultimo())}
+
+    def puede_votar(self, mensaje, ip):
+        # Solo se vota por candidatos cuyo log esta al menos igual de completo que el propio
+        with self.cond:
+            propio = (self.termino_de(self.ultimo()), self.ultimo())
+        return (mensaje.get('ultimo_termino', 0), mensaje.get('ultimo_indice', 0)) >= propio
+
+    def indice_lectura(self):
+        # En el maestro: hasta donde tiene que haber aplicado un nodo para leer lo mas nuevo
+        with self.cond:
+            return self.comprometido, self.termino()
+
+    def esperar_aplicado(self, indice, timeout=ESPERA_QUORUM):
+        # Lectura fuerte: se espera a tener aplicado lo que el maestro ya habia comprometido
+        with self.cond:
+            self.lecturas_fuertes += 1
+            return self.cond.wait_for(lambda: self.aplicado >= indice, timeout)
+
+    def estado_lectura(self):
+        # (indice aplicado, su termino, atraso en segundos) para sellar una lectura local
+        atraso = self.atraso()
+        with self.cond:
+            self.lecturas_locales += 1
+            return self.aplicado, self.termino_de(self.aplicado), atraso
+
+    def atraso(self):
+        # Segundos desde que se supo del maestro (0 en el maestro): cota de que tan viejas
+        # pueden ser las lecturas locales
+        if self.es_lider():
+            return 0.0
+        with self.cond:
+            if self.aplicado < self.comprometido:
+                return float('inf')
+            return time.monotonic() - self.ultimo_contacto
+
+    def metricas(self):
+        with self.cond:
+            return {
+                'ultimo': self.ultimo(),
+                'comprometido': self.comprometido,
+                'aplicado': self.aplicado,
+                'base': self.base,
+                'propuestas': self.propuestas,
+                'sin_quorum': self.sin_quorum,
+                'lecturas_locales': self.lecturas_locales,
+                'lecturas_fuertes': self.lecturas_fuertes,
+                'coincide': dict(self.coincide),
+                'instantaneas': self.instantaneas,
+                'instalando': sorted(self.instalando),
+                'atraso_s': None if self.es_lider() else time.monotonic() - self.ultimo_contacto,
+            }
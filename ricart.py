@@ -0,0 +1,227 @@
+import threading
+import time
+
+from anillo import VentaEncolada, LOTE_ANILLO, ESPERA_VENTA
+
+# Exclusion mutua distribuida de Ricart-Agrawala, sin maestro ni token
+# Quien quiere escribir manda ra_request con su reloj de Lamport a todas las sucursales vivas
+# y entra cuando todas le contestan ra_reply. Una sucursal contesta en seguida, salvo que
+# este dentro o que su propia peticion vaya antes ((reloj, id) menor): entonces guarda la
+# respuesta y la manda al salir. Son 2(N-1) mensajes por seccion critica; dentro se aplican
+# de una vez hasta LOTE_ANILLO ventas encoladas, asi el costo se reparte entre ellas
+#
+# Los cambios hechos dentro viajan en las respuestas: a cada sucursal se le manda lo que aun
+# no le hemos mandado. Como nadie entra sin la respuesta de todos, el siguiente en entrar ya
+# aplico lo que hizo el anterior. Al salir, a las que no estaban esperando se les manda lo
+# nuevo en un ra_cambios (no cuenta como permiso), asi sus replicas no se quedan atras hasta
+# la siguiente peticion. Una sucursal que se cae deja de esperarse; una que llega
+# con una peticion mientras esperamos se agrega a las que tienen que contestarnos
+
+LIBRE, QUIERE, DENTRO = 'libre', 'quiere', 'dentro'
+HISTORIAL_ESPERAS = 10000
+
+ACCIONES_RICART = ('ra_request', 'ra_reply', 'ra_cambios')
+
+
+class RelojLamport:
+    def __init__(self):
+        self.valor = 0
+        self.lock = threading.Lock()
+
+    def tick(self):
+        with self.lock:
+            self.valor += 1
+            return self.valor
+
+    def recibir(self, otro):
+        with self.lock:
+            self.valor = max(self.valor, otro) + 1
+            return self.valor
+
+
+class RicartAgrawala:
+    def __init__(self, node_id, miembros, enviar, aplicar_ventas, aplicar_cambios, lote=LOTE_ANILLO):
+        self.node_id = node_id
+        self.miembros = miembros              # funcion que regresa los ids vivos
+        self.enviar = enviar                  # funcion (node_id, mensaje)
+        self.aplicar_ventas = aplicar_ventas  # funcion ([(item, delta)]) -> (resultados, cambios)
+        self.aplicar_cambios = aplicar_cambios  # funcion (cambios) con los de otras sucursales
+        self.lote = lote
+        self.reloj = RelojLamport()
+        self.estado = LIBRE
+        self.marca = None                     # (reloj, id) de nuestra peticion
+        self.faltan = set()                   # Sucursales cuya respuesta esperamos
+        self.pedidos = set()                  # Sucursales a las que se les mando la peticion actual
+        self.diferidas = set()                # Sucursales a las que se les contesta al salir
+        self.pendientes = []
+        self.propios = []                     # Cambios propios, en orden
+        self.base_propios = 0                 # Indice absoluto de propios[0]
+        self.enviados = {}                    # node_id -> indice absoluto hasta donde se le mando
+        self.cond = threading.Condition()
+        # Metricas
+        self.secciones = 0
+        self.mensajes = 0                     # ra_request mandados + ra_reply recibidos por nuestras secciones
+        self.ventas = 0
+        self.difusiones = 0                   # ra_cambios mandados al salir
+        self.esperas = []
+
+    # --- Ventas
+
+    def ajustar(self, item_id, delta, timeout=ESPERA_VENTA):
+        venta = VentaEncolada(item_id, delta)
+        with self.cond:
+            self.pendientes.append(venta)
+            self.cond.notify_all()
+        if not venta.listo.wait(timeout):
+            with self.cond:
+                if venta in self.pendientes:
+                    self.pendientes.remove(venta)
+                    return None
+            # Ya entro en un lote: se le da otro plazo, no se espera para siempre
+            venta.listo.wait(timeout)
+        return venta.resultado
+
+    def correr(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pendientes)
+                self.estado = QUIERE
+                self.marca = (self.reloj.tick(), self.node_id)
+                self.faltan = {n for n in self.miembros() if n != self.node_id}
+                self.pedidos = set(self.faltan)
+                otros = sorted(self.faltan)
+                self.mensajes += len(otros)
+            inicio = time.monotonic()
+            for node_id in otros:
+                self._mandar(node_id, {'action': 'ra_request', 'lamport': self.marca[0]})
+            with self.cond:
+                self.cond.wait_for(lambda: not self.faltan)
+                self.estado = DENTRO
+                lote = self.pendientes[:self.lote]
+                del self.pendientes[:self.lote]
+            try:
+                self._seccion(lote, inicio)
+            except Exception as e:
+                print(f"Error en la seccion critica: {e}")
+            finally:
+                self._completar(lote)
+            with self.cond:
+                self.estado = LIBRE
+                self.marca = None
+                diferidas = sorted(self.diferidas)
+                self.diferidas = set()
+            for node_id in diferidas:
+                self._contestar(node_id)
+            for node_id in self.miembros():
+                if node_id != self.node_id and node_id not in diferidas:
+                    self._contestar(node_id, 'ra_cambios')
+
+    def _completar(self, lote):
+        # Lo que quedo sin resultado (fallo aplicar_ventas) se libera con None
+        for venta in lote:
+            if not venta.listo.is_set():
+                venta.resultado = None
+                venta.listo.set()
+
+    def _seccion(self, lote, inicio):
+        resultados, cambios = self.aplicar_ventas([(v.item, v.delta) for v in lote])
+        for venta, resultado in zip(lote, resultados):
+            venta.resultado = resultado
+            venta.listo.set()
+        with self.cond:
+            self.propios.extend(cambios)
+            self.secciones += 1
+            self.ventas += len(lote)
+            self.esperas.append(time.monotonic() - inicio)
+            del self.esperas[:-HISTORIAL_ESPERAS]
+
+    # --- Mensajes
+
+    def _mandar(self, node_id, mensaje):
+        try:
+            self.enviar(node_id, mensaje)
+        except OSError as e:
+            print(f"Error al mandar {mensaje['action']} a la sucursal {node_id}: {e}")
+
+    def _contestar(self, node_id, accion='ra_reply'):
+        # ra_reply siempre se manda (es el permiso); ra_cambios solo si hay algo nuevo
+        with self.cond:
+            desde = max(self.enviados.get(node_id, self.base_propios), self.base_propios)
+            cambios = self.propios[desde - self.base_propios:]
+            if accion == 'ra_cambios':
+                if not cambios:
+                    return
+                self.difusiones += 1
+            self.enviados[node_id] = self.base_propios + len(self.propios)
+            self._recortar()
+        self._mandar(node_id, {'action': accion, 'lamport': self.reloj.tick(), 'cambios': cambios})
+
+    def _recortar(self):
+        # Llamar con self.cond tomado. Se olvida lo que ya se le mando a todas las vivas
+        vivos = [n for n in self.miembros() if n != self.node_id]
+        if not vivos:
+            return
+        hasta = min(self.enviados.get(n, self.base_propios) for n in vivos)
+        if hasta > self.base_propios:
+            del self.propios[:hasta - self.base_propios]
+            self.base_propios = hasta
+
+    def recibir(self, mensaje, node_id):
+        if node_id is None:
+            return
+        self.reloj.recibir(mensaje.get('lamport', 0))
+        if mensaje.get('action') == 'ra_request':
+            marca = (mensaje.get('lamport', 0), node_id)
+            pedir = None
+            with self.cond:
+                diferir = self.estado == DENTRO or (self.estado == QUIERE and self.marca < marca)
+                if diferir:
+                    self.diferidas.add(node_id)
+                if self.estado == QUIERE and node_id not in self.pedidos:
+                    # Sucursal nueva para esta ronda: tambien tiene que darnos permiso
+                    self.pedidos.add(node_id)
+                    self.faltan.add(node_id)
+                    self.mensajes += 1
+                    pedir = {'action': 'ra_request', 'lamport': self.marca[0]}
+            if not diferir:
+                self._contestar(node_id)
+            if pedir is not None:
+                self._mandar(node_id, pedir)
+        elif mensaje.get('action') == 'ra_cambios':
+            self.aplicar_cambios(mensaje.get('cambios') or [])
+        elif mensaje.get('action') == 'ra_reply':
+            # Primero lo que hizo dentro, despues se cuenta su permiso
+            if mensaje.get('cambios'):
+                self.aplicar_cambios(mensaje['cambios'])
+            with self.cond:
+                if node_id in self.faltan:
+                    self.faltan.discard(node_id)
+                    self.mensajes += 1
+                    self.cond.notify_all()
+
+    def caida(self, node_id):
+        # No se espera mas a una sucursal caida
+        with self.cond:
+            self.faltan.discard(node_id)
+            self.diferidas.discard(node_id)
+            self.enviados.pop(node_id, None)
+            self.cond.notify_all()
+
+    def metricas(self):
+        with self.cond:
+            esperas = sorted(self.esperas)
+            secciones = self.secciones
+            percentil = lambda p: esperas[min(len(esperas) - 1, int(p / 100 * len(esperas)))] * 1000 if esperas else 0.0
+            return {
+                'reloj': self.reloj.valor,
+                'estado': self.estado,
+                'secciones': secciones,
+                'mensajes_por_seccion': self.mensajes / secciones if secciones else 0.0,
+                'mensajes_por_venta': self.mensajes / self.ventas if self.ventas else 0.0,
+                'ventas_por_seccion': self.ventas / secciones if secciones else 0.0,
+                'difusiones_por_seccion': self.difusiones / secciones if secciones else 0.0,
+                'pendientes': len(self.pendientes),
+                'cambios_sin_confirmar': len(self.propios),
+                'espera_p50_ms': percentil(50),
+                'espera_p99_ms': percentil(99),
+            }
@@ -0,0 +1,108 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Servidor UDP basado en asyncio para reemplazar el ciclo bloqueante de start_server
+# Cada datagrama se encola y un grupo acotado de trabajadores lo procesa, asi un
+# manejador lento (ej. handle_get_inventory) no detiene al resto de los mensajes
+# Por eso los manejadores del nodo corren en paralelo: el estado que comparten (versiones
+# vistas, esperas del maestro, formatos del codec...) va protegido con su propio lock
+
+MAX_EN_VUELO = 16    # Manejadores ejecutandose al mismo tiempo
+MAX_COLA = 1024      # Datagramas en espera antes de empezar a descartar
+
+
+class ProtocoloUDP(asyncio.DatagramProtocol):
+    def __init__(self, servidor):
+        self.servidor = servidor
+
+    def datagram_received(self, data, addr):
+        self.servidor.encolar(data, addr)
+
+    def error_received(self, exc):
+        print(f"Error en el socket del servidor: {exc}")
+
+
+class ServidorUDPAsincrono:
+    # procesar es una funcion (datos, direccion) sincrona, la misma que usa el servidor bloqueante
+    def __init__(self, procesar, max_en_vuelo=MAX_EN_VUELO, max_cola=MAX_COLA):
+        self.procesar = procesar
+        self.max_en_vuelo = max_en_vuelo
+        self.max_cola = max_cola
+        self.cola = None
+        self.transport = None
+        self.ejecutor = ThreadPoolExecutor(max_workers=max_en_vuelo)
+        # Metricas
+        self.en_vuelo = 0
+        self.procesados = 0
+        self.descartados = 0
+        self.errores = 0
+        self.max_profundidad = 0
+
+    def encolar(self, data, addr):
+        try:
+            self.cola.put_nowait((data, addr))
+        except asyncio.QueueFull:
+            # Igual que el buffer del kernel: si no hay espacio, el datagrama se pierde
+            self.descartados += 1
+            return
+        profundidad = self.cola.qsize()
+        if profundidad > self.max_profundidad:
+            self.max_profundidad = profundidad
+
+    def profundidad_cola(self):
+        if self.cola is None:
+            return 0
+        return self.cola.qsize()
+
+    def metricas(self):
+        return {
+            'profundidad_cola': self.profundidad_cola(),
+            'max_profundidad': self.max_profundidad,
+            'en_vuelo': self.en_vuelo,
+            'procesados': self.procesados,
+            'descartados': self.descartados,
+            'errores': self.errores,
+        }
+
+    async def trabajador(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            data, addr = await self.cola.get()
+            self.en_vuelo += 1
+            try:
+                # Los manejadores son bloqueantes (sockets, archivos), se ejecutan en el pool de hilos
+                await loop.run_in_executor(self.ejecutor, self.procesar, data, addr)
+                self.procesados += 1
+            except Exception as e:
+                self.errores += 1
+                print(f"Error al procesar mensaje de {addr}: {e}")
+            finally:
+                self.en_vuelo -= 1
+                self.cola.task_done()
+
+    async def iniciar(self, host=None, port=None, sock=None):
+        loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=self.max_cola)
+        if sock is not None:
+            self.transport, _ = await loop.create_datagram_endpoint(lambda: ProtocoloUDP(self), sock=sock)
+        else:
+            self.transport, _ = await loop.create_datagram_endpoint(lambda: ProtocoloUDP(self), local_addr=(host, port))
+        self.trabajadores = [asyncio.create_task(self.trabajador()) for _ in range(self.max_en_vuelo)]
+
+    async def servir(self, host=None, port=None, sock=None):
+        await self.iniciar(host, port, sock)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.detener()
+
+    def detener(self):
+        for tarea in getattr(self, 'trabajadores', []):
+            tarea.cancel()
+        if self.transport is not None:
+            self.transport.close()
+        self.ejecutor.shutdown(wait=False)
+
+    # Punto de entrada para un hilo del nodo (el resto del nodo sigue usando threading)
+    def correr(self, host=None, port=None, sock=None):
+        asyncio.run(self.servir(host, port, sock))
@@ -0,0 +1,147 @@
+import threading
+import zlib
+from bisect import bisect_right, insort
+from hashlib import blake2b
+
+from almacen import COLUMNAS, CAMPO_ITEM
+
+# Sincronizacion por diferencias del inventario entre nodos
+# Cada registro de inventario.json lleva un contador de version por campo: 'item' para los
+# datos del articulo y uno por cada columna Inv1..Inv5. Los nodos solo se mandan las
+# entradas mas nuevas que la ultima version que ya vieron de cada nodo de origen, y con un
+# resumen tipo Merkle (hash por cubeta + hash raiz) pueden comprobar rapido si ya estan de
+# acuerdo
+
+NUM_CUBETAS = 64
+TAM_LOTE_SYNC = 40   # Entradas por datagrama sync_delta
+SYNC_INTERVAL = 10   # Segundos entre rondas de sincronizacion con un nodo al azar
+RONDAS_POR_DIGEST = 6  # Cada cuantas rondas se compara el resumen completo (anti-entropia)
+
+# La version combina un reloj de Lamport con el id del nodo que hizo el cambio:
+# version = reloj * 256 + nodo. Asi son unicas, comparables y caben en un entero
+
+
+def nodo_de_version(version):
+    return version & 0xff
+
+
+def cubeta(item_id):
+    return zlib.crc32(item_id.encode('utf-8')) % NUM_CUBETAS
+
+
+def _hash_entrada(item_id, campo, version):
+    h = blake2b(f"{item_id}|{campo}|{version}".encode('utf-8'), digest_size=8)
+    return int.from_bytes(h.digest(), 'big')
+
+
+class VersionesInventario:
+    def __init__(self, inventario, node_id):
+        self.inventario = inventario  # El AlmacenInventario del nodo, se modifica en sitio
+        self.node_id = node_id
+        self.reloj = 0
+        self.versiones = {}          # (item, campo) -> version
+        self.cambios = []            # (version, item, campo) ordenado; las entradas superadas se saltan
+        self.origenes = set()        # Nodos que hicieron alguna de las versiones vigentes
+        self.hojas = [0] * NUM_CUBETAS  # XOR de los hashes de las entradas de cada cubeta
+        self.llaves_cubeta = [set() for _ in range(NUM_CUBETAS)]
+        self.lock = threading.RLock()
+
+        for item_id in inventario:
+            guardadas = inventario.versiones_guardadas(item_id)
+            for campo in (CAMPO_ITEM,) + COLUMNAS:
+                self._poner_version(item_id, campo, guardadas.get(campo, 0))
+
+    def _poner_version(self, item_id, campo, version):
+        llave = (item_id, campo)
+        n = cubeta(item_id)
+        anterior = self.versiones.get(llave)
+        if anterior is not None:
+            self.hojas[n] ^= _hash_entrada(item_id, campo, anterior)
+        self.hojas[n] ^= _hash_entrada(item_id, campo, version)
+        self.llaves_cubeta[n].add(llave)
+        self.versiones[llave] = version
+        self.inventario.poner_version(item_id, campo, version)
+        if version > 0:
+            self.origenes.add(nodo_de_version(version))
+            # Los cambios remotos pueden traer versiones menores a las ultimas, por eso insort
+            insort(self.cambios, (version, item_id, campo))
+            if len(self.cambios) > 2 * len(self.versiones):
+                self.cambios = [c for c in self.cambios if self.versiones.get((c[1], c[2])) == c[0]]
+        reloj = version >> 8
+        if reloj > self.reloj:
+            self.reloj = reloj
+
+    def _valor(self, item_id, campo):
+        valor = self.inventario.valor(item_id, campo)
+        if valor is None and campo != CAMPO_ITEM:
+            return 0
+        return valor
+
+    def version(self, item_id, campo):
+        return self.versiones.get((item_id, campo), 0)
+
+    def actualizar(self, item_id, campo, valor):
+        # Cambio local: se aplica al inventario y se le asigna una version nueva
+        with self.lock:
+            self.inventario.poner(item_id, campo, valor)
+            self.reloj += 1
+            version = self.reloj << 8 | self.node_id
+            self._poner_version(item_id, campo, version)
+            return version
+
+    def nueva_version(self):
+        # Version para un cambio que se aplica despues (el maestro la asigna al proponerlo al log)
+        with self.lock:
+            self.reloj += 1
+            return self.reloj << 8 | self.node_id
+
+    def aplicar(self, entradas):
+        # Cambios remotos: gana la version mas alta. Regresa cuantas entradas se aplicaron
+        aplicadas = 0
+        with self.lock:
+            for entrada in entradas:
+                item_id, campo, version = entrada['item'], entrada['campo'], entrada['version']
+                if version <= self.versiones.get((item_id, campo), -1):
+                    continue
+                self.inventario.poner(item_id, campo, entrada['valor'])
+                self._poner_version(item_id, campo, version)
+                aplicadas += 1
+        return aplicadas
+
+    def _entrada(self, llave, version):
+        return {'item': llave[0], 'campo': llave[1], 'valor': self._valor(*llave), 'version': version}
+
+    def cambios_desde(self, desde):
+        # desde: nodo de origen -> version mas alta de ese nodo que ya tiene quien pregunta. Cada
+        # nodo tiene su propio reloj: con una sola marca se saltarian las entradas de un nodo
+        # atrasado que llegaron aqui despues. Busqueda binaria desde la marca mas baja
+        with self.lock:
+            minima = min((desde.get(n, 0) for n in self.origenes), default=0)
+            entradas = []
+            for v, item_id, campo in self.cambios[bisect_right(self.cambios, (minima, '\uffff')):]:
+                llave = (item_id, campo)
+                if self.versiones.get(llave) == v and v > desde.get(nodo_de_version(v), 0):
+                    entradas.append(self._entrada(llave, v))
+            return entradas
+
+    def digest(self):
+        # Regresa (raiz, hojas). Las hojas se mantienen al dia en cada cambio, la raiz es un hash de ellas
+        with self.lock:
+            hojas = list(self.hojas)
+        h = blake2b(digest_size=16)
+        for hoja in hojas:
+            h.update(hoja.to_bytes(8, 'big'))
+        return h.hexdigest(), hojas
+
+    def cubetas_distintas(self, hojas_remotas):
+        with self.lock:
+            return [n for n, hoja in enumerate(self.hojas) if n >= len(hojas_remotas) or hojas_remotas[n] != hoja]
+
+    def entradas_de_cubetas(self, cubetas):
+        with self.lock:
+            return [self._entrada(llave, self.versiones[llave]) for n in cubetas for llave in self.llaves_cubeta[n]]
+
+
+def lotes(entradas, tam=TAM_LOTE_SYNC):
+    for i in range(0, len(entradas), tam):
+        yield entradas[i:i + tam]
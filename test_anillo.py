@@ -0,0 +1,35 @@
+import threading
+import time
+import unittest
+
+from anillo import AnilloToken
+
+# Pruebas del anillo: si aplicar_ventas falla, las ventas del lote se liberan con None en
+# lugar de dejar esperando a quien vende
+
+
+def fallar(ventas):
+    raise RuntimeError("disco lleno")
+
+
+class PruebaAnillo(unittest.TestCase):
+    def setUp(self):
+        self.anillo = AnilloToken(1, lambda: [1], lambda node_id, mensaje: None, fallar, lambda cambios: None)
+        threading.Thread(target=self.anillo.correr, daemon=True).start()
+        self.anillo.recibir({'action': 'ring_token', 'generacion': 1, 'generador': 1, 'cambios': []})
+
+    def test_error_al_aplicar_no_cuelga_la_venta(self):
+        inicio = time.monotonic()
+        self.assertIsNone(self.anillo.ajustar('A1', -1, timeout=3.0))
+        # Se libera al terminar la retencion, sin agotar el plazo
+        self.assertLess(time.monotonic() - inicio, 1.0)
+        self.assertEqual(self.anillo.pendientes, [])
+
+    def test_sigue_vendiendo_despues_del_error(self):
+        self.assertIsNone(self.anillo.ajustar('A1', -1, timeout=3.0))
+        self.anillo.aplicar_ventas = lambda ventas: ([{'resultado': 'ok'} for _ in ventas], [])
+        self.assertEqual(self.anillo.ajustar('A1', -1, timeout=3.0), {'resultado': 'ok'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from codec import (ACCIONES_JSON, Codec, codificar_binario, codificar_json, decodificar, decodificar_binario,
+                   desempaquetar_valor, empaquetar_valor, es_binario)
+
+# Pruebas del codec: lo que se codifica (binario o JSON) regresa igual al decodificarlo
+
+
+class PruebaValores(unittest.TestCase):
+    def test_ida_y_vuelta(self):
+        for valor in (None, True, False, 0, 1, -1, 127, 128, -33, 2 ** 31, -2 ** 40, 2 ** 63 - 1,
+                      0.5, -3.25, "", "sucursal", "ñandú" * 20, "x" * 70000,
+                      [], [1, [2, [3]]], {}, {'a': {'b': [None, 1.5]}}, list(range(40))):
+            self.assertEqual(desempaquetar_valor(empaquetar_valor(valor)), valor)
+
+    def test_llaves_no_texto(self):
+        # Igual que en JSON, las llaves que no son texto llegan como texto
+        self.assertEqual(desempaquetar_valor(empaquetar_valor({1: 'a', None: 'b', False: 'c', 2.5: 'd'})),
+                         {'1': 'a', 'null': 'b', 'false': 'c', '2.5': 'd'})
+
+
+class PruebaMensajes(unittest.TestCase):
+    def setUp(self):
+        self.mensaje = {'action': 'buy_item', 'item': 'A7', 'delta': -3, 'node_id': 2,
+                        'cambios': [{'item': 'A7', 'campo': 'Inv2', 'valor': 5, 'version': (9 << 8) | 2}]}
+
+    def test_binario(self):
+        datos = codificar_binario(self.mensaje, node_id=2, seq=41)
+        self.assertTrue(es_binario(datos))
+        self.assertEqual(decodificar(datos), self.mensaje)
+        # Igual que el mismo mensaje en JSON
+        self.assertEqual(decodificar(datos), decodificar(codificar_json(self.mensaje)))
+
+    def test_accion_sin_codigo(self):
+        mensaje = dict(self.mensaje, action='accion_nueva')
+        recibido = decodificar(codificar_binario(mensaje))
+        self.assertEqual(recibido['action'], 'accion_nueva')
+
+    def test_cabecera_aparte(self):
+        mensaje = {'action': 'heartbeat'}
+        self.assertEqual(decodificar_binario(codificar_binario(mensaje, node_id=7, seq=3)), (mensaje, 7, 3))
+
+    def test_json(self):
+        datos = codificar_json(self.mensaje)
+        self.assertFalse(es_binario(datos))
+        self.assertEqual(decodificar(datos), self.mensaje)
+
+
+class PruebaCodec(unittest.TestCase):
+    def test_json_hasta_acordar(self):
+        codec = Codec(1)
+        self.assertFalse(es_binario(codec.codificar({'action': 'heartbeat'}, 'nodo')))
+        self.assertIsNotNone(codec.acordar('nodo', codec.mensaje_hola()['versiones']))
+        self.assertTrue(es_binario(codec.codificar({'action': 'heartbeat'}, 'nodo')))
+
+    def test_sin_version_comun(self):
+        codec = Codec(1)
+        self.assertIsNone(codec.acordar('nodo', [255]))
+        self.assertFalse(es_binario(codec.codificar({'action': 'heartbeat'}, 'nodo')))
+
+    def test_acciones_json(self):
+        codec = Codec(1)
+        codec.acordar('nodo', codec.mensaje_hola()['versiones'])
+        for accion in ACCIONES_JSON:
+            datos = codec.codificar({'action': accion, 'inventario': {'A1': {'Inv1': 3}}}, 'nodo')
+            self.assertFalse(es_binario(datos))
+            self.assertEqual(decodificar(datos)['action'], accion)
+
+    def test_secuencia_por_nodo(self):
+        codec = Codec(3)
+        for peer in ('a', 'b'):
+            codec.acordar(peer, codec.mensaje_hola()['versiones'])
+        seqs = [decodificar_binario(codec.codificar({'action': 'heartbeat'}, p))[2] for p in ('a', 'a', 'b')]
+        self.assertEqual(seqs, [1, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from unittest import mock
+
+import despachador
+from codec import Codec, codificar_binario, codificar_json
+from despachador import Despachador, accion
+
+# Pruebas del despachador: las acciones de mucho trafico se enrutan con la cabecera, sin pasar
+# por la decodificacion completa del mensaje
+
+
+class NodoPrueba:
+    node_id = 1
+
+    def __init__(self):
+        self.recibidos = []
+
+    @accion('ack_confiable')
+    def handle_ack(self, message, direccion):
+        self.recibidos.append(message)
+
+    @accion('swim_ping')
+    def handle_ping(self, message, direccion):
+        self.recibidos.append(message)
+
+    @accion('buy_item')
+    def handle_buy(self, message, direccion):
+        self.recibidos.append(message)
+
+
+def sin_decodificar(datos):
+    raise AssertionError("decodificacion completa")
+
+
+class PruebaDespachador(unittest.TestCase):
+    def setUp(self):
+        self.nodo = NodoPrueba()
+        self.despachador = Despachador(self.nodo)
+        self.vistos = []
+        self.despachador.observador = lambda mensaje, direccion: self.vistos.append(mensaje)
+        self.ack = {'action': 'ack_confiable', 'epoca': 7, 'acumulado': 12, 'selectivos': [14, 15]}
+
+    def formatos(self, mensaje):
+        # Binario y JSON con la cabecera compacta (lo que manda Codec antes de acordar el binario)
+        return codificar_binario(mensaje, node_id=2, seq=5), Codec(2).codificar(mensaje, 'nodo')
+
+    def test_enruta_por_cabecera(self):
+        ping = {'action': 'swim_ping', 'seq': 3, 'node_id': 2, 'actualizaciones': [['10.0.0.2', 2, 'vivo', 0]]}
+        with mock.patch.object(despachador, 'decodificar', sin_decodificar):
+            for mensaje in (self.ack, ping):
+                for datos in self.formatos(mensaje):
+                    self.despachador.despachar(datos, ('10.0.0.2', 5000))
+        self.assertEqual(self.nodo.recibidos, [self.ack, self.ack, ping, ping])
+        # El diario solo ve la cabecera
+        self.assertEqual(self.vistos, [{'action': 'ack_confiable'}] * 2 + [{'action': 'swim_ping'}] * 2)
+        self.assertEqual(self.despachador.metricas()['acciones']['ack_confiable']['llamadas'], 2)
+
+    def test_sin_manejador_no_decodifica_el_cuerpo(self):
+        cuerpo = mock.Mock(side_effect=AssertionError("cuerpo decodificado"))
+        with mock.patch.object(despachador, 'decodificar', sin_decodificar), \
+                mock.patch.object(despachador, 'decodificar_cuerpo', cuerpo):
+            for datos in self.formatos({'action': 'swim_ack', 'seq': 3}):
+                self.despachador.despachar(datos, ('10.0.0.2', 5000))
+        cuerpo.assert_not_called()
+        self.assertEqual(self.despachador.metricas()['desconocidas'], {'swim_ack': 2})
+        self.assertEqual(self.vistos, [])
+
+    def test_las_demas_se_decodifican_completas(self):
+        compra = {'action': 'buy_item', 'item': 'A1', 'delta': -1}
+        for datos in (codificar_binario(compra, node_id=2), codificar_json(compra)):
+            self.despachador.despachar(datos, ('10.0.0.2', 5000))
+        self.assertEqual([m['item'] for m in self.nodo.recibidos], ['A1', 'A1'])
+        self.assertEqual([m['action'] for m in self.vistos], ['buy_item', 'buy_item'])
+
+    def test_cabecera_compacta_invalida(self):
+        self.despachador.despachar(b"@ack_confiable", ('10.0.0.2', 5000))
+        self.despachador.despachar(b"@ack_confiable\n{no es json", ('10.0.0.2', 5000))
+        self.assertEqual(self.despachador.metricas()['invalidos'], 2)
+        self.assertEqual(self.nodo.recibidos, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
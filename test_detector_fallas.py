@@ -0,0 +1,93 @@
+import time
+import unittest
+
+from detector_fallas import DetectorPhi, RuedaTemporizadores
+from membresia import Membresia, SOSPECHOSO, VIVO
+
+# Pruebas del detector phi-accrual y de su uso como fuente de sospecha en la membresia
+
+
+def alimentar(detector, nodo, intervalos, inicio=0.0):
+    ahora = inicio
+    detector.latido(nodo, ahora)
+    for intervalo in intervalos:
+        ahora += intervalo
+        detector.latido(nodo, ahora)
+    return ahora
+
+
+class PruebaDetectorPhi(unittest.TestCase):
+    def setUp(self):
+        self.caidos = []
+        self.detector = DetectorPhi(self.caidos.append, rueda=RuedaTemporizadores())
+
+    def test_phi_crece_con_el_silencio(self):
+        ultimo = alimentar(self.detector, 'a', [1.0] * 20)
+        niveles = [self.detector.sospecha('a', ultimo + t) for t in (0.5, 1.0, 1.5, 2.0, 3.0)]
+        self.assertEqual(niveles, sorted(niveles))
+        self.assertLess(niveles[0], 1.0)
+        self.assertGreater(niveles[-1], 8.0)
+
+    def test_enlace_irregular_es_mas_tolerante(self):
+        estable = alimentar(self.detector, 'estable', [1.0] * 40)
+        irregular = alimentar(self.detector, 'irregular', [0.2, 1.8] * 20)
+        self.assertLess(self.detector.sospecha('irregular', irregular + 2.0),
+                        self.detector.sospecha('estable', estable + 2.0))
+
+    def test_avisa_al_pasar_el_umbral(self):
+        alimentar(self.detector, 'a', [1.0] * 20)
+        ventana = self.detector.ventanas['a']
+        # Sin latidos nuevos; la revision programada encuentra phi por encima del umbral
+        ventana.ultimo -= 10
+        self.detector.revisar(('phi', 'a'))
+        self.detector.revisar(('phi', 'a'))
+        self.assertEqual(self.caidos, ['a'])
+        self.assertEqual(self.detector.activos(), [])
+        self.detector.latido('a')
+        self.assertEqual(self.detector.activos(), ['a'])
+
+    def test_sin_muestras_suficientes_no_avisa(self):
+        detector = DetectorPhi(self.caidos.append, rueda=RuedaTemporizadores(), min_muestras=5)
+        alimentar(detector, 'a', [1.0] * 2)
+        detector.ventanas['a'].ultimo -= 10
+        detector.revisar(('phi', 'a'))
+        self.assertEqual(self.caidos, [])
+
+    def test_umbral_configurable(self):
+        tolerante = DetectorPhi(self.caidos.append, umbral=16.0, rueda=RuedaTemporizadores())
+        # revisar mide contra el reloj real: el ultimo latido queda hace 1.6 s, con intervalos
+        # de 1 s eso da phi entre 8 y 16
+        inicio = time.monotonic() - 21.6
+        alimentar(tolerante, 'a', [1.0] * 20, inicio)
+        alimentar(self.detector, 'a', [1.0] * 20, inicio)
+        for detector in (tolerante, self.detector):
+            self.assertTrue(8.0 < detector.sospecha('a') < 16.0)
+            detector.revisar(('phi', 'a'))
+        self.assertEqual(self.caidos, ['a'])
+
+
+class PruebaMembresiaPhi(unittest.TestCase):
+    def crear(self, umbral_phi):
+        membresia = Membresia(1, '10.0.0.1', lambda ip, mensaje: None, umbral_phi=umbral_phi)
+        membresia.aplicar([['10.0.0.2', 2, VIVO, 0]])
+        for seq in range(20):
+            membresia.recibir({'action': 'swim_ack', 'seq': seq}, '10.0.0.2')
+        return membresia
+
+    def test_phi_marca_sospechoso(self):
+        membresia = self.crear(8.0)
+        membresia.detector.ventanas['10.0.0.2'].ultimo -= 30
+        membresia.detector.revisar(('phi', '10.0.0.2'))
+        self.assertEqual(membresia.estados()['10.0.0.2'][1], SOSPECHOSO)
+        metricas = membresia.metricas()
+        self.assertEqual(metricas['sospechas_phi'], 1)
+        self.assertGreater(metricas['phi']['10.0.0.2'], 8.0)
+
+    def test_sin_umbral_solo_pings(self):
+        membresia = self.crear(None)
+        self.assertIsNone(membresia.detector)
+        self.assertEqual(membresia.niveles(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
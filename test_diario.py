@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from diario import DiarioMensajes, consultar
+
+# Pruebas del diario: lo que se anota es el mensaje como estaba al registrarlo y un lote con
+# error no detiene al escritor
+
+
+class PruebaDiario(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp()
+        self.diario = DiarioMensajes(os.path.join(self.carpeta, "diario.jsonl")).iniciar()
+
+    def tearDown(self):
+        self.diario.detener()
+        shutil.rmtree(self.carpeta)
+
+    def leer(self):
+        return list(consultar(self.diario.ruta, 0, time.time() + 1))
+
+    def test_mensaje_copiado_al_registrar(self):
+        mensaje = {'action': 'buy_item', 'item': 'A1'}
+        self.diario.registrar_evento('RECIBIDO', '10.0.0.2', mensaje)
+        # El despachador y los manejadores siguen usando el mismo dict
+        mensaje['time'] = 'despues'
+        del mensaje['item']
+        self.diario.detener()
+        registros = self.leer()
+        self.assertEqual([r['mensaje'] for r in registros], [{'action': 'buy_item', 'item': 'A1'}])
+        self.assertEqual(registros[0]['par'], '10.0.0.2')
+
+    def test_escritor_sobrevive_a_un_error(self):
+        original = self.diario.escribir
+        llamadas = []
+
+        def escribir(lote):
+            llamadas.append(lote)
+            if len(llamadas) == 1:
+                raise OSError("disco lleno")
+            original(lote)
+
+        self.diario.escribir = escribir
+        self.diario.registrar_evento('ENVIADO', '10.0.0.3', {'action': 'token'})
+        time.sleep(0.2)
+        self.diario.registrar_evento('ENVIADO', '10.0.0.3', {'action': 'release_access'})
+        self.diario.detener()
+        self.assertEqual(self.diario.metricas()['errores'], 1)
+        self.assertEqual([r['mensaje']['action'] for r in self.leer()], ['release_access'])
+
+
+if __name__ == '__main__':
+    unittest.main()
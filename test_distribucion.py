@@ -0,0 +1,80 @@
+import random
+import unittest
+
+import distribucion
+from distribucion import prorratear, repartir
+
+# Pruebas del reparto: las sumas por articulo son exactas y ninguna sucursal pasa de su espacio libre
+
+
+class PruebaProrratear(unittest.TestCase):
+    def test_suma_exacta(self):
+        azar = random.Random(1)
+        for _ in range(500):
+            pesos = [azar.randint(0, 50) for _ in range(azar.randint(1, 8))] + [azar.randint(1, 50)]
+            total = azar.randint(0, 1000)
+            partes = prorratear(total, pesos)
+            self.assertEqual(sum(partes), total)
+            for p, w in zip(partes, pesos):
+                # Mayor residuo: cada parte queda a menos de una unidad de la proporcional
+                self.assertLess(abs(p - total * w / sum(pesos)), 1)
+
+    def test_sin_pesos(self):
+        self.assertEqual(prorratear(10, [0, 0]), [0, 0])
+        self.assertEqual(prorratear(0, [1, 2]), [0, 0])
+
+
+class PruebaRepartir(unittest.TestCase):
+    def revisar(self, pendientes, ocupado, capacidades, funcion=repartir):
+        asignacion, sin_espacio = funcion(pendientes, ocupado, capacidades)
+        libre = [max(0, c - o) for c, o in zip(capacidades, ocupado)]
+        self.assertEqual(len(asignacion), len(pendientes))
+        for fila, pendiente, sobra in zip(asignacion, pendientes, sin_espacio):
+            self.assertTrue(all(x >= 0 for x in fila))
+            self.assertGreaterEqual(sobra, 0)
+            self.assertEqual(sum(fila) + sobra, pendiente)
+        for j, espacio in enumerate(libre):
+            self.assertLessEqual(sum(fila[j] for fila in asignacion), espacio)
+        # Solo sobra algo cuando ya no hay espacio
+        self.assertEqual(sum(map(sum, asignacion)), min(sum(pendientes), sum(libre)))
+        return asignacion, sin_espacio
+
+    def test_cabe_todo(self):
+        asignacion, sin_espacio = self.revisar([10, 5], [0, 0, 0], [20, 10, 10])
+        self.assertEqual(sin_espacio, [0, 0])
+        # En proporcion al espacio libre (20:10:10)
+        self.assertEqual([sum(c) for c in zip(*asignacion)], prorratear(15, [20, 10, 10]))
+
+    def test_no_cabe(self):
+        _, sin_espacio = self.revisar([30, 30], [5, 0], [10, 10])
+        self.assertEqual(sum(sin_espacio), 45)
+
+    def test_sucursal_llena_o_caida(self):
+        asignacion, _ = self.revisar([7, 9], [10, 3, 0], [10, 8, 0])
+        self.assertEqual([fila[0] for fila in asignacion], [0, 0])
+        self.assertEqual([fila[2] for fila in asignacion], [0, 0])
+
+    def test_vacio(self):
+        self.assertEqual(repartir([], [0], [10]), ([], []))
+
+    def test_al_azar(self):
+        azar = random.Random(7)
+        for _ in range(300):
+            sucursales = azar.randint(1, 6)
+            capacidades = [azar.choice((0, azar.randint(1, 200))) for _ in range(sucursales)]
+            ocupado = [azar.randint(0, c + 5) for c in capacidades]
+            pendientes = [azar.randint(0, 80) for _ in range(azar.randint(1, 12))]
+            self.revisar(pendientes, ocupado, capacidades)
+
+    @unittest.skipIf(distribucion.np is None, "sin numpy")
+    def test_numpy_igual_que_python(self):
+        azar = random.Random(3)
+        for _ in range(100):
+            libre = [azar.randint(0, 100) for _ in range(azar.randint(1, 5))]
+            pendientes = [azar.randint(0, 60) for _ in range(azar.randint(1, 10))]
+            self.assertEqual(distribucion._repartir_numpy(pendientes, libre),
+                             distribucion._repartir_python(pendientes, libre))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from almacen import AlmacenInventario
+from coalescedor import resolver_compras
+from gestor_tokens import GestorTokens, Cerca
+from optimista import OK, CONFLICTO
+from sincronizacion import VersionesInventario
+
+# Pruebas de la compra optimista (compare-and-set) en el maestro: una version vieja da conflicto
+# y la sucursal repite por la via con token con el mismo id_compra, sin cobrar dos veces
+
+
+def compra(id_compra, delta=-1, **campos):
+    return dict({'action': 'buy_item', 'item': 'A1', 'sucursal': 1, 'delta': delta, 'id_compra': id_compra}, **campos)
+
+
+class PruebaCompraOptimista(unittest.TestCase):
+    def setUp(self):
+        self.inventario = AlmacenInventario({'A1': {'articulo': 'Pan', 'Inv1': 10}})
+        self.versiones = VersionesInventario(self.inventario, 1)
+        self.gestor = GestorTokens(lambda *args: None)
+        self.cerca = Cerca()
+        self.hechas = {}
+
+    def resolver(self, *compras):
+        # Lo que hace el maestro con un lote: decidir, aplicar y recordar los id_compra aplicados
+        entradas, resultados = resolver_compras(list(compras), self.inventario, self.versiones,
+                                                self.gestor, self.cerca, self.hechas)
+        self.versiones.aplicar(entradas)
+        for entrada in entradas:
+            for id_compra in entrada.get('compras', ()):
+                self.hechas[id_compra] = {'resultado': OK, 'entrada': entrada}
+        return resultados
+
+    def existencia(self):
+        return self.inventario.existencia('A1', 1)
+
+    def version(self):
+        return self.versiones.version('A1', 'Inv1')
+
+    def test_conflicto_y_respaldo_con_token(self):
+        vista = self.version()
+        # Otra venta de la sucursal cambia la columna antes que la nuestra
+        self.assertEqual(self.resolver(compra('1-0-1', version=vista))[0]['resultado'], OK)
+        self.assertEqual(self.existencia(), 9)
+        # La nuestra trae la version vieja: conflicto y no se cobra
+        self.assertEqual(self.resolver(compra('1-0-2', version=vista))[0]['resultado'], CONFLICTO)
+        self.assertEqual(self.existencia(), 9)
+        # Se repite con token y el mismo id_compra. Mientras se tiene el token, la via optimista
+        # de ese articulo tambien da conflicto aunque traiga la version vigente
+        token = self.gestor.solicitar(1, ['A1'])
+        self.assertIsNotNone(token)
+        self.assertEqual(self.resolver(compra('1-0-3', version=self.version()))[0]['resultado'], CONFLICTO)
+        respuesta = self.resolver(compra('1-0-2', token=token))[0]
+        self.assertEqual(respuesta['resultado'], OK)
+        self.assertEqual(self.existencia(), 8)
+        # Un reenvio de la compra con token recibe el mismo resultado y no cobra otra vez
+        self.assertEqual(self.resolver(compra('1-0-2', token=token))[0], respuesta)
+        self.assertTrue(self.gestor.liberar(1, token))
+        self.assertEqual(self.existencia(), 8)
+
+    def test_optimista_aplicado_sin_respuesta(self):
+        # La optimista si se aplico pero la respuesta no llego: la sucursal pasa a la via con token
+        # con el mismo id_compra y recibe el resultado de la primera, sin cobrar dos veces
+        primera = self.resolver(compra('1-0-1', version=self.version()))[0]
+        self.assertEqual(self.existencia(), 9)
+        token = self.gestor.solicitar(1, ['A1'])
+        segunda = self.resolver(compra('1-0-1', token=token))[0]
+        self.assertEqual(segunda, primera)
+        self.assertEqual(self.existencia(), 9)
+
+    def test_mismo_id_en_el_lote(self):
+        # Las dos vias llegan en el mismo lote: se cobra una vez y ambas reciben ese resultado
+        token = self.gestor.solicitar(1, ['A1'])
+        resultados = self.resolver(compra('1-0-1', token=token), compra('1-0-1', token=token))
+        self.assertEqual(resultados[0], resultados[1])
+        self.assertEqual(self.existencia(), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from collections import Counter, deque
+
+from gestor_tokens import Solicitud
+from planificador import CLASE_GLOBAL, CLASE_REABASTO, CLASE_VENTA, Planificador
+
+# Pruebas del orden de concesion: prioridad por clase, reparto justo por sucursal (DRR) y reserva
+# de fragmentos para que un reabasto grande no espere para siempre detras de las ventas
+
+SIN_URGENCIA = 1e9
+
+
+def solicitud(node_id, fragmentos, clase=CLASE_VENTA, solicitado=0.0):
+    return Solicitud(node_id, None, tuple(fragmentos), solicitado, clase)
+
+
+def siempre_libre(fragmentos):
+    return True
+
+
+class PruebaPlanificador(unittest.TestCase):
+    def conceder(self, planificador, veces, libre=siempre_libre, ahora=0.0):
+        concedidas = []
+        for _ in range(veces):
+            s = planificador.elegir(libre, ahora)
+            if s is None:
+                break
+            planificador.quitar(s)
+            concedidas.append(s)
+        return concedidas
+
+    def test_ventas_antes_que_reabastos(self):
+        p = Planificador(espera_maxima=SIN_URGENCIA)
+        p.agregar(solicitud(1, [0], CLASE_GLOBAL))
+        p.agregar(solicitud(1, [0], CLASE_REABASTO))
+        p.agregar(solicitud(2, [0], CLASE_VENTA))
+        clases = [s.clase for s in self.conceder(p, 3)]
+        self.assertEqual(clases, [CLASE_VENTA, CLASE_REABASTO, CLASE_GLOBAL])
+
+    def test_sucursal_con_muchas_peticiones_no_acapara(self):
+        p = Planificador(quantum=4, espera_maxima=SIN_URGENCIA)
+        for i in range(100):
+            p.agregar(solicitud(1, [i % 8]))
+        for i in range(10):
+            p.agregar(solicitud(2, [i % 8]))
+            p.agregar(solicitud(3, [i % 8]))
+        # Mientras las tres tienen pendientes, ninguna lleva mas de un quantum de ventaja
+        cuenta = Counter()
+        for s in self.conceder(p, 32):
+            cuenta[s.node_id] += 1
+            self.assertLessEqual(max(cuenta.values()) - min(cuenta[n] for n in (1, 2, 3)), 4)
+        self.assertEqual(cuenta[2], 10)
+        self.assertEqual(cuenta[3], 10)
+
+    def test_costo_por_fragmentos(self):
+        # Una sucursal pide 4 fragmentos a la vez y otra 1: reciben los mismos fragmentos, no las mismas concesiones
+        p = Planificador(quantum=4, espera_maxima=SIN_URGENCIA)
+        for _ in range(40):
+            p.agregar(solicitud(1, range(4)))
+            p.agregar(solicitud(2, [0]))
+        fragmentos = Counter()
+        for s in self.conceder(p, 40):
+            fragmentos[s.node_id] += len(s.fragmentos)
+        self.assertLessEqual(abs(fragmentos[1] - fragmentos[2]), 4)
+
+    def test_reabasto_grande_entre_chicos(self):
+        # Reabastos chicos continuos sobre los fragmentos 0-3 que duran dos pasos, asi siempre hay
+        # uno ocupado; el grande necesita los cuatro libres a la vez y sin la reserva nunca los encontraria
+        p = Planificador(quantum=4, espera_maxima=SIN_URGENCIA)
+        reabasto = solicitud(9, range(4), CLASE_REABASTO)
+        ocupados = Counter()
+        en_curso = deque()  # (paso en que se libera, solicitud)
+
+        def libre(fragmentos):
+            return not any(ocupados[f] for f in fragmentos)
+
+        for paso in range(200):
+            if paso == 5:
+                p.agregar(reabasto)  # Cuando ya hay chicos en curso
+            for sucursal in (1, 2, 3, 4):
+                p.agregar(solicitud(sucursal, [(paso + sucursal) % 4], CLASE_REABASTO))
+            while en_curso and en_curso[0][0] <= paso:
+                for f in en_curso.popleft()[1].fragmentos:
+                    ocupados[f] -= 1
+            s = p.elegir(libre, 0.0)
+            if s is None:
+                continue
+            p.quitar(s)
+            if s is reabasto:
+                break
+            ocupados.update(s.fragmentos)
+            en_curso.append((paso + 2, s))
+        else:
+            self.fail("el reabasto nunca se concedio")
+        self.assertEqual(p.urgentes, 0)
+
+    def test_urgente_pasa_primero(self):
+        p = Planificador(espera_maxima=0.5)
+        vieja = solicitud(2, [1], CLASE_GLOBAL, solicitado=0.0)
+        p.agregar(vieja)
+        p.agregar(solicitud(1, [0], CLASE_VENTA, solicitado=1.0))
+        self.assertIs(p.elegir(siempre_libre, 1.2), vieja)
+        self.assertEqual(p.urgentes, 1)
+
+    def test_quitar_libera_la_reserva(self):
+        p = Planificador(quantum=4, espera_maxima=SIN_URGENCIA)
+        grande = solicitud(1, range(4), CLASE_REABASTO)
+        p.agregar(grande)
+        self.assertIsNone(p.elegir(lambda fragmentos: False, 0.0))
+        self.assertIs(p.reserva, grande)
+        p.quitar(grande)
+        self.assertIsNone(p.reserva)
+        self.assertEqual(len(p), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
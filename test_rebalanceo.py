@@ -0,0 +1,58 @@
+import unittest
+
+from rebalanceo import Rebalanceador
+
+# Pruebas del rebalanceo: la devolucion se limita a lo que el destino aun tiene y lo que no
+# alcanza a moverse se sigue recordando en lugar de contarse como fusionado
+
+
+class PruebaDevolucion(unittest.TestCase):
+    def setUp(self):
+        self.existencias = {('A1', 2): 10, ('A1', 3): 5}
+        self.falla = False
+        self.pedidos = []
+        self.rebalanceo = Rebalanceador(lambda sucursal: [('A1', sucursal, 2, 10), ('A1', sucursal, 3, 5)],
+                                        self.mover, lambda item_id, sucursal: self.existencias.get((item_id, sucursal), 0),
+                                        pausa=0)
+
+    def mover(self, movimientos):
+        self.pedidos.append(list(movimientos))
+        return [] if self.falla else list(movimientos)
+
+    def caer_y_regresar(self, falla_devolucion=False):
+        self.rebalanceo.caidas.add(1)
+        self.rebalanceo._redistribuir(1)
+        self.falla = falla_devolucion
+        self.rebalanceo.caidas.discard(1)
+        self.rebalanceo._devolver(1)
+
+    def test_devuelve_todo(self):
+        self.caer_y_regresar()
+        metricas = self.rebalanceo.metricas()
+        self.assertEqual(metricas['unidades_devueltas'], 15)
+        self.assertEqual(metricas['unidades_fusionadas'], 0)
+        self.assertEqual(self.rebalanceo.movidos, {})
+
+    def test_limita_a_lo_que_tiene_el_destino(self):
+        self.existencias[('A1', 2)] = 4  # El destino vendio 6 de las 10 que recibio
+        self.caer_y_regresar()
+        self.assertEqual(self.pedidos[-1], [('A1', 2, 1, 4), ('A1', 3, 1, 5)])
+        metricas = self.rebalanceo.metricas()
+        self.assertEqual(metricas['unidades_devueltas'], 9)
+        self.assertEqual(metricas['unidades_fusionadas'], 6)
+
+    def test_lo_no_movido_se_recuerda(self):
+        self.caer_y_regresar(falla_devolucion=True)  # La mayoria no confirma la devolucion
+        metricas = self.rebalanceo.metricas()
+        self.assertEqual(metricas['unidades_devueltas'], 0)
+        self.assertEqual(metricas['unidades_fusionadas'], 0)
+        self.assertEqual(metricas['por_devolver'], {1: 15})
+        # Cuando vuelve a intentarse se devuelve lo que faltaba
+        self.falla = False
+        self.rebalanceo._devolver(1)
+        self.assertEqual(self.rebalanceo.metricas()['unidades_devueltas'], 15)
+        self.assertEqual(self.rebalanceo.movidos, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
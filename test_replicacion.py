@@ -0,0 +1,176 @@
+import time
+import unittest
+from unittest import mock
+
+from replicacion import Replicacion, CAMBIOS_POR_ENTRADA, ESPERA_INSTALACION
+
+# Pruebas del log replicado con tres nodos en el mismo proceso. Los mensajes se guardan en una
+# lista y se entregan a mano (entregar), asi cada prueba decide que llega y a quien
+
+
+class Red:
+    def __init__(self, ips):
+        self.ips = ips
+        self.pendientes = []
+        self.caidos = set()
+        self.terminos = {ip: 1 for ip in ips}
+        self.lider = ips[0]
+        self.aplicados = {ip: [] for ip in ips}
+        self.nodos = {ip: self.crear(ip) for ip in ips}
+
+    def crear(self, ip):
+        return Replicacion(ip,
+                           lambda destino, mensaje: self.pendientes.append((ip, destino, mensaje)),
+                           lambda: self.ips,
+                           lambda: self.terminos[ip],
+                           lambda: self.lider == ip,
+                           self.aplicados[ip].extend,
+                           instantanea=lambda: list(self.aplicados[ip]),
+                           adoptar_termino=lambda termino: self.terminos.__setitem__(ip, termino))
+
+    def entregar(self):
+        while self.pendientes:
+            origen, destino, mensaje = self.pendientes.pop(0)
+            if origen in self.caidos or destino in self.caidos:
+                continue
+            self.nodos[destino].recibir(mensaje, origen)
+
+    def nuevo_lider(self, ip):
+        for otro in self.ips:
+            self.terminos[otro] += 1
+        self.lider = ip
+        self.nodos[ip].al_ser_lider()
+
+
+def cambio(n):
+    return {'item': f"A{n}", 'campo': 'Inv1', 'valor': n, 'version': (n << 8) | 1}
+
+
+class PruebaReplicacion(unittest.TestCase):
+    def setUp(self):
+        self.red = Red(['a', 'b', 'c'])
+        self.lider = self.red.nodos['a']
+        self.lider.al_ser_lider()
+        self.red.entregar()
+
+    def test_compromete_con_la_mayoria_y_en_orden(self):
+        indices = [self.lider.proponer([cambio(n)]) for n in range(1, 6)]
+        # Nadie aplica nada hasta que la mayoria tiene las entradas, ni siquiera el maestro
+        self.assertEqual(self.lider.comprometido, 1)
+        self.assertEqual(self.red.aplicados['a'], [])
+        self.red.entregar()
+        self.assertTrue(self.lider.esperar(indices[-1], timeout=0))
+        esperado = [cambio(n) for n in range(1, 6)]
+        self.assertEqual(self.red.aplicados['a'], esperado)
+        # Los seguidores aplican cuando el siguiente mensaje les trae el indice comprometido
+        self.lider.proponer([])
+        self.red.entregar()
+        for ip in ('b', 'c'):
+            self.assertEqual(self.red.aplicados[ip], esperado)
+
+    def test_entrada_grande_se_divide(self):
+        cambios = [cambio(n) for n in range(100)]
+        indice = self.lider.proponer(cambios)
+        self.red.entregar()
+        self.assertTrue(self.lider.esperar(indice, timeout=0))
+        self.assertEqual(self.red.aplicados['a'], cambios)
+
+    def test_un_seguidor_caido(self):
+        self.red.caidos.add('c')
+        indice = self.lider.proponer([cambio(1)])
+        self.red.entregar()
+        self.assertTrue(self.lider.esperar(indice, timeout=0))
+        # Al volver se pone al dia con los reenvios
+        self.red.caidos.clear()
+        self.lider.proponer([cambio(2)])
+        self.lider.proponer([])
+        self.red.entregar()
+        self.assertEqual(self.red.aplicados['c'], [cambio(1), cambio(2)])
+
+    def test_sin_mayoria_no_compromete(self):
+        self.red.caidos.update(('b', 'c'))
+        indice = self.lider.proponer([cambio(1)])
+        self.red.entregar()
+        self.assertFalse(self.lider.esperar(indice, timeout=0.01))
+        self.assertEqual(self.red.aplicados['a'], [])
+        self.assertEqual(self.lider.metricas()['sin_quorum'], 1)
+
+    def test_maestro_nuevo_descarta_lo_no_comprometido(self):
+        # El maestro viejo agrega una entrada que no llega a nadie y se cae
+        self.red.caidos.update(('b', 'c'))
+        self.lider.proponer([cambio(9)])
+        self.red.entregar()
+        self.red.caidos = {'a'}
+        self.red.nuevo_lider('b')
+        nuevo = self.red.nodos['b']
+        indice = nuevo.proponer([cambio(2)])
+        self.red.entregar()
+        self.assertTrue(nuevo.esperar(indice, timeout=0))
+        # Al volver, el viejo cambia su entrada por la del termino nuevo y nunca aplica la suya
+        self.red.caidos.clear()
+        nuevo.proponer([])
+        self.red.entregar()
+        for ip in ('a', 'b', 'c'):
+            self.assertEqual(self.red.aplicados[ip], [cambio(2)])
+
+    def test_instantanea_confirmada_antes_de_avanzar(self):
+        lider, atrasado = self.lider, self.red.nodos['c']
+        self.red.caidos.add('c')
+        with mock.patch('replicacion.MAX_LOG', 4):
+            for n in range(1, CAMBIOS_POR_ENTRADA + 11):
+                lider.proponer([cambio(n)])
+                self.red.entregar()
+        self.red.caidos.clear()
+        self.assertGreater(lider.base, 1)
+        # Lo que le falta a c ya se compacto. La instantanea que se le mando caido se perdio:
+        # al vencerse la espera se le vuelve a mandar el inventario, en dos partes
+        lider._replicar_a('c')
+        self.assertEqual(self.red.pendientes, [])
+        lider.instalando['c'] = (lider.instalando['c'][0], time.monotonic() - ESPERA_INSTALACION)
+        lider._replicar_a('c')
+        partes = [mensaje for _, _, mensaje in self.red.pendientes]
+        self.red.pendientes = []
+        self.assertEqual([m['action'] for m in partes], ['instalar', 'instalar'])
+        indice = partes[0]['indice']
+        # Con una sola parte no se instala ni se mueve nada
+        atrasado.recibir(partes[1], 'a')
+        self.assertEqual((atrasado.base, atrasado.aplicado), (0, 0))
+        self.assertEqual(self.red.pendientes, [])
+        atrasado.recibir(partes[0], 'a')
+        self.assertEqual((atrasado.base, atrasado.aplicado), (indice, indice))
+        self.assertEqual(self.red.aplicados['c'], self.red.aplicados['a'])
+        # Sin la confirmacion el maestro no avanza ni le manda entradas
+        self.assertLess(lider.coincide.get('c', 0), indice)
+        respuesta = self.red.pendientes.pop()
+        lider._replicar_a('c')
+        self.assertEqual(self.red.pendientes, [])
+        self.red.pendientes.append(respuesta)
+        self.red.entregar()
+        self.assertEqual(lider.coincide['c'], indice)
+        self.assertEqual(lider.metricas()['instalando'], [])
+        # Y de ahi sigue con el log
+        lider.proponer([cambio(99)])
+        lider.proponer([])
+        self.red.entregar()
+        self.assertEqual(self.red.aplicados['c'][-1], cambio(99))
+
+    def test_seguidor_adopta_termino_mayor(self):
+        # b y c no vieron la eleccion del termino 3; la replicacion del maestro se los trae
+        self.red.terminos['a'] = 3
+        self.lider.al_ser_lider()
+        indice = self.lider.proponer([cambio(1)])
+        self.red.entregar()
+        self.assertEqual(self.red.terminos, {'a': 3, 'b': 3, 'c': 3})
+        self.assertTrue(self.lider.esperar(indice, timeout=0))
+
+    def test_voto_solo_a_logs_completos(self):
+        self.red.caidos.add('c')
+        self.lider.proponer([cambio(1)])
+        self.red.entregar()
+        atrasado = self.red.nodos['c'].datos_voto()
+        self.assertFalse(self.red.nodos['b'].puede_votar(atrasado, 'c'))
+        self.assertTrue(self.red.nodos['c'].puede_votar(self.red.nodos['b'].datos_voto(), 'b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
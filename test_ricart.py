@@ -0,0 +1,39 @@
+import threading
+import time
+import unittest
+
+from ricart import RicartAgrawala, LIBRE
+
+# Pruebas de Ricart-Agrawala: un error dentro de la seccion critica libera las ventas del
+# lote y la seccion se suelta igual
+
+
+def fallar(ventas):
+    raise RuntimeError("disco lleno")
+
+
+class PruebaRicart(unittest.TestCase):
+    def setUp(self):
+        self.mandados = []
+        self.ricart = RicartAgrawala(1, lambda: [1, 2], lambda node_id, mensaje: self.mandados.append(mensaje),
+                                     fallar, lambda cambios: None)
+        threading.Thread(target=self.ricart.correr, daemon=True).start()
+
+    def dar_permiso(self):
+        # Contesta por la sucursal 2 en cuanto llegue la peticion
+        while not self.mandados:
+            time.sleep(0.01)
+        self.ricart.recibir({'action': 'ra_reply', 'lamport': 1}, 2)
+
+    def test_error_al_aplicar_no_cuelga_la_venta(self):
+        threading.Thread(target=self.dar_permiso, daemon=True).start()
+        inicio = time.monotonic()
+        self.assertIsNone(self.ricart.ajustar('A1', -1, timeout=3.0))
+        self.assertLess(time.monotonic() - inicio, 1.0)
+        # La seccion se solto: otra sucursal ya no queda diferida
+        time.sleep(0.05)
+        self.assertEqual(self.ricart.estado, LIBRE)
+
+
+if __name__ == '__main__':
+    unittest.main()